@@ -0,0 +1,113 @@
+"""
+تحلیل موازی ارزها در چند پردازه (دور زدن GIL برای دتکتورها)
+کندلهای هر دسته به صورت یک ماتریس پیوسته (5, rows) + زمانها + offset ها فرستاده میشوند، نه DataFrame
+نتیجهها به همان ترتیب ورودی برمیگردند
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import numpy as np
+from candles import Candles
+from indicators import TechnicalIndicators
+from signals import signal_generator
+
+def pack(candles_list):
+    """چند Candles -> (timestamps, values, offsets) پیوسته"""
+    lengths = [len(candles) for candles in candles_list]
+    offsets = np.zeros(len(candles_list) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    timestamps = np.zeros(offsets[-1], dtype=np.int64)
+    values = np.empty((5, offsets[-1]))
+    has_time = np.zeros(len(candles_list), dtype=bool)
+    for k, candles in enumerate(candles_list):
+        rows = slice(offsets[k], offsets[k + 1])
+        if candles.timestamp is not None:
+            timestamps[rows] = candles.timestamp
+            has_time[k] = True
+        for j, name in enumerate(('open', 'high', 'low', 'close', 'volume')):
+            values[j, rows] = getattr(candles, name)
+    return timestamps, values, offsets, has_time
+
+def unpack(symbols, timestamps, values, offsets, has_time):
+    """برعکس pack؛ ستونهای هر ارز view های پیوسته روی همان ماتریس هستند (بدون کپی)"""
+    candles_list = []
+    for k, symbol in enumerate(symbols):
+        rows = slice(offsets[k], offsets[k + 1])
+        candles_list.append(Candles(timestamps[rows] if has_time[k] else None,
+                                    *(column[rows] for column in values), symbol=symbol))
+    return candles_list
+
+def _analyze_chunk(symbols, timestamps, values, offsets, has_time, config):
+    """اجرا در پردازه کارگر: تنظیمات دتکتورها، محاسبه دستهای اندیکاتورها و تحلیل"""
+    registry = signal_generator.registry
+    for name, (enabled, params) in config.items():
+        registry.set_enabled(name, enabled)
+        registry.set_params(name, **params)
+    registry.reset_stats()
+
+    candles_list = unpack(symbols, timestamps, values, offsets, has_time)
+    TechnicalIndicators.prefill(candles_list, signal_generator.required_columns())
+    results = [signal_generator.analyze(candles, symbol, enrich=False)
+               for symbol, candles in zip(symbols, candles_list)]
+    return results, registry.snapshot()
+
+class AnalysisExecutor:
+    """
+    workers=0: تحلیل در همین پردازه (رفتار قبلی)
+    کارگرها با fork ساخته میشوند؛ start() را قبل از شروع thread ها صدا بزنید
+    """
+
+    def __init__(self, workers=0, chunk_size=25):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.pool = None
+
+    def start(self):
+        if self.workers > 0 and self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+            # با fork همه کارگرها در اولین submit ساخته میشوند
+            self.pool.submit(os.getpid).result()
+        return self
+
+    def analyze(self, items):
+        """
+        items: لیست (symbol, candles)؛ خروجی لیست سیگنالهای هر ارز به همان ترتیب
+        آمار دتکتورهای کارگرها به registry همین پردازه اضافه میشود
+        """
+        if not items:
+            return []
+        if self.workers <= 0:
+            TechnicalIndicators.prefill([candles for _, candles in items], signal_generator.required_columns())
+            return [signal_generator.analyze(candles, symbol) for symbol, candles in items]
+
+        self.start()
+        registry = signal_generator.registry
+        config = {detector.name: (detector.enabled, detector.params) for detector in registry.ordered()}
+
+        # تقسیم برابر بین کارگرها (حداکثر chunk_size ارز در هر تکه)
+        size = max(1, min(self.chunk_size, -(-len(items) // self.workers)))
+        futures = []
+        for start in range(0, len(items), size):
+            chunk = items[start:start + size]
+            symbols = [symbol for symbol, _ in chunk]
+            payload = pack([candles for _, candles in chunk])
+            futures.append(self.pool.submit(_analyze_chunk, symbols, *payload, config))
+
+        results = []
+        for future in futures:
+            signals, stats = future.result()
+            registry.merge(stats)
+            results.extend(signals)
+        # کش مشتقات کارگرها از زمان fork به روز نشده است
+        for (symbol, _), signals in zip(items, results):
+            signal_generator.enrich(signals, symbol)
+        return results
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+# نمونه گلوبال (ANALYSIS_WORKERS=0 یعنی بدون پردازه جدا)
+analysis_executor = AnalysisExecutor(int(os.environ.get('ANALYSIS_WORKERS', 0)))
@@ -3,21 +3,53 @@
 """
 from flask import Flask, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
-from datetime import datetime, timedelta
+from datetime import datetime
 import threading
 import time
-import json
+import os
+import ccxt
 
 from database import signal_db
-from data_fetcher import exchange_manager
+from data_fetcher import exchange_manager, PRIORITY_INTERACTIVE, PRIORITY_VALIDATION
 from signals import signal_generator
-from indicators import TechnicalIndicators
+from detector_registry import detector_registry
+from analysis_pool import analysis_executor
+from ticker_screener import ticker_screener
+from indicators import TechnicalIndicators, IndicatorContext
+from streaming_indicators import indicator_states
 from signal_validator import validator
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'crypto_futures_secret_2024'
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
+# حالت دریافت داده: rest (اسکن دورهای) یا stream (وبسوکت)
+INGESTION_MODE = os.environ.get('INGESTION_MODE', 'rest')
+STREAM_URL = os.environ.get('STREAM_URL')
+# تایم فریم اسکن؛ با BASE_TIMEFRAME تایم فریمهای بالاتر بدون درخواست اضافه ساخته میشوند
+SCAN_TIMEFRAME = os.environ.get('SCAN_TIMEFRAME', '15m')
+# تعداد ارزهایی که اندیکاتورهایشان با هم (ماتریسی) محاسبه میشود
+SCAN_BATCH_SIZE = int(os.environ.get('SCAN_BATCH_SIZE', 50))
+# فاصله اسکرینر تیکر کل بازار (ثانیه)؛ 0 یعنی غیرفعال
+SCREENER_INTERVAL = float(os.environ.get('SCREENER_INTERVAL', 5))
+# فاصله poll دفتر سفارش ارزهای ORDER_BOOK_SYMBOLS در حالت rest (ثانیه)
+ORDER_BOOK_INTERVAL = float(os.environ.get('ORDER_BOOK_INTERVAL', 2))
+# فاصله به روزرسانی funding / open interest از endpoint های دستهای (ثانیه)؛ 0 یعنی غیرفعال
+DERIVATIVES_INTERVAL = float(os.environ.get('DERIVATIVES_INTERVAL', 300))
+
+# وقتی از تحلیل قبلی کندل جدیدی بسته نشده، فقط دتکتورهای کندل در حال تشکیل اجرا میشوند
+LIVE_DETECTORS = ('pump', 'dump')
+
+# آخرین کندل بسته شدهای که برای هر (symbol, timeframe) تحلیل کامل شده
+analyzed_closes = {}
+analyzed_lock = threading.Lock()
+
+# آمار آخرین دور اسکن
+scan_metrics = {}
+
+# سیگنالها funding / تغییرات OI را از کش (بدون درخواست شبکه) میگیرند
+signal_generator.set_derivatives(exchange_manager.derivatives.lookup)
+
 # ذخیره داده ها
 cache = {
     'signals': [],
@@ -26,63 +58,253 @@ cache = {
     'last_update': None
 }
 
+def candle_timestamp(candles, sig):
+    """زمان کندل سیگنال (میلیثانیه)؛ سیگنالهای بدون index روی آخرین کندل محاسبه شدهاند"""
+    if candles.timestamp is None or candles.empty:
+        return None
+    index = sig.get('index', len(candles) - 1)
+    return int(candles.timestamp[index])
+
+def last_closed_timestamp(candles, timeframe):
+    """زمان آخرین کندل بسته شده (کندل آخر اگر هنوز در حال تشکیل باشد حساب نمیشود)"""
+    if candles.timestamp is None or candles.empty:
+        return None
+    timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+    if candles.timestamp[-1] + timeframe_ms <= time.time() * 1000:
+        return int(candles.timestamp[-1])
+    return int(candles.timestamp[-2]) if len(candles) > 1 else None
+
+def closed_candle_changed(symbol, candles, timeframe=SCAN_TIMEFRAME):
+    """آیا از آخرین تحلیل کامل این ارز کندل جدیدی بسته شده؟"""
+    closed = last_closed_timestamp(candles, timeframe)
+    with analyzed_lock:
+        return closed is None or analyzed_closes.get((symbol, timeframe)) != closed
+
+def process_symbol(symbol, candles, timeframe=SCAN_TIMEFRAME, top_n=3, detectors=None, analyzed=None):
+    """
+    تحلیل یک ارز، ذخیره و ارسال سیگنالهای جدید (سیگنالهای تکراری اسکنهای قبلی کنار گذاشته میشوند)
+    analyzed: سیگنالهایی که قبلا (مثلا در analysis_executor) تحلیل شدهاند
+    """
+    signals = []
+    pump_dump_alerts = []
+
+    # به ترتیب قدرت؛ تا top_n سیگنال جدید
+    if analyzed is None:
+        analyzed = signal_generator.analyze(candles, symbol, detectors)
+    analyzed = sorted(analyzed, key=lambda x: x.get('strength', 0), reverse=True)
+
+    for sig in analyzed:
+        sig['exchange'] = exchange_manager.exchange_id
+        sig['timeframe'] = timeframe
+        sig['candle_ts'] = candle_timestamp(candles, sig)
+
+        # ذخیره در دیتابیس (upsert روی کلید طبیعی)
+        if signal_db.save_signal(sig) is None:
+            continue
+
+        sig['detected_at'] = datetime.utcnow().isoformat()
+        signals.append(sig)
+
+        # پامپ و دامپ
+        if 'PUMP' in sig.get('type', '') or 'DUMP' in sig.get('type', ''):
+            pump_dump_alerts.append(sig)
+            signal_db.save_pump_dump(sig)
+
+        if len(signals) >= top_n:
+            break
+
+    # ارسال به کلاینت
+    if signals:
+        socketio.emit('new_signals', signals)
+
+    return signals, pump_dump_alerts
+
+def scan_symbol(symbol, candles, timeframe=SCAN_TIMEFRAME, changed=None, analyzed=None):
+    """
+    تحلیل کامل فقط اگر کندل بسته شده جدیدی آمده باشد؛ در غیر این صورت نتیجه دتکتورهای کامل
+    همان قبلی است (و تکراری حساب میشود) و فقط LIVE_DETECTORS روی کندل در حال تشکیل اجرا میشوند
+    """
+    if changed is None:
+        changed = closed_candle_changed(symbol, candles, timeframe)
+
+    signals, alerts = process_symbol(symbol, candles, timeframe, detectors=None if changed else LIVE_DETECTORS,
+                                     analyzed=analyzed if changed else None)
+
+    if changed:
+        with analyzed_lock:
+            analyzed_closes[(symbol, timeframe)] = last_closed_timestamp(candles, timeframe)
+    return signals, alerts, changed
+
+def update_market_cache():
+    """بروزرسانی movers و ارسال کش"""
+    cache['movers'] = exchange_manager.get_top_movers(20)
+    cache['last_update'] = datetime.utcnow().isoformat()
+    socketio.emit('cache_update', cache)
+
+def run_scan_cycle():
+    """یک دور اسکن کامل روی همه ارزهای بارگذاری شده"""
+    all_signals = []
+    pump_dump_alerts = []
+    counts = {'symbols': 0, 'analyzed': 0, 'skipped': 0, 'errors': 0}
+    started = time.time()
+
+    def process_batch(batch):
+        changed = [closed_candle_changed(symbol, candles) for symbol, candles in batch]
+        # تحلیل کامل (محاسبه دستهای اندیکاتورها + دتکتورها) در analysis_executor؛ نتیجهها به همان ترتیب
+        results = iter(analysis_executor.analyze([item for item, full in zip(batch, changed) if full]))
+        for (symbol, candles), full in zip(batch, changed):
+            counts['symbols'] += 1
+            analyzed = next(results) if full else None
+            try:
+                signals, alerts, _ = scan_symbol(symbol, candles, changed=full, analyzed=analyzed)
+                all_signals.extend(signals)
+                pump_dump_alerts.extend(alerts)
+                counts['analyzed' if full else 'skipped'] += 1
+            except Exception as e:
+                counts['errors'] += 1
+                print(f"Error analyzing {symbol}: {e}")
+
+    # دریافت همزمان؛ هر دسته به محض کامل شدن تحلیل میشود
+    batch = []
+    for symbol, candles in exchange_manager.iter_ohlcv(exchange_manager.symbols, SCAN_TIMEFRAME, 200):
+        if candles.empty:
+            continue
+        batch.append((symbol, candles))
+        if len(batch) >= SCAN_BATCH_SIZE:
+            process_batch(batch)
+            batch = []
+
+    if batch:
+        process_batch(batch)
+
+    # بروزرسانی کش
+    # فقط سیگنالهای جدید برگشتهاند؛ سیگنالهای اسکنهای قبلی در کش میمانند
+    cache['signals'] = (cache['signals'] + all_signals)[-100:]
+    cache['pump_dump'] = (cache['pump_dump'] + pump_dump_alerts)[-50:]
+    update_market_cache()
+
+    scan_metrics.update(counts, signals=len(all_signals), seconds=round(time.time() - started, 3),
+                        finished_at=datetime.utcnow().isoformat())
+    print(f"✅ Scan complete: {len(all_signals)} new signals found in {time.time() - started:.1f}s "
+          f"({counts['analyzed']} analyzed, {counts['skipped']} skipped: no new closed candle)")
+
 def scan_all_symbols():
     """اسکن همه ارزها"""
-    global cache
-
     while True:
         try:
-            all_signals = []
-            pump_dump_alerts = []
-
-            symbols = exchange_manager.symbols[:100]  # 100 تا اول
-
-            for i, symbol in enumerate(symbols):
-                try:
-                    df = exchange_manager.fetch_ohlcv(symbol, '15m', 200)
-                    if df.empty:
-                        continue
-
-                    # تولید سیگنال
-                    signals = signal_generator.get_best_signals(df, symbol, 3)
-
-                    for sig in signals:
-                        sig['detected_at'] = datetime.utcnow().isoformat()
-                        all_signals.append(sig)
-
-                        # ذخیره در دیتابیس
-                        signal_db.save_signal(sig)
-
-                        # پامپ و دامپ
-                        if 'PUMP' in sig.get('type', '') or 'DUMP' in sig.get('type', ''):
-                            pump_dump_alerts.append(sig)
-                            signal_db.save_pump_dump(sig)
-
-                    # ارسال به کلاینت
-                    if signals:
-                        socketio.emit('new_signals', signals)
-
-                    time.sleep(0.3)
+            run_scan_cycle()
+            time.sleep(60)  # هر 1 دقیقه
 
-                except Exception as e:
-                    continue
+        except Exception as e:
+            print(f"Scan error: {e}")
+            time.sleep(30)
 
-            # بروزرسانی کش
-            cache['signals'] = all_signals[-100:]
-            cache['pump_dump'] = pump_dump_alerts[-50:]
-            cache['movers'] = exchange_manager.get_top_movers(20)
-            cache['last_update'] = datetime.utcnow().isoformat()
+def stream_all_symbols():
+    """حالت استریم: تحلیل بعد از بسته شدن کندل یا عبور قیمت از آستانه"""
+    # گرم کردن کش کندلها با یک اسکن REST
+    run_scan_cycle()
 
-            # ارسال بروزرسانی
-            socketio.emit('cache_update', cache)
+    # استریم فقط تایم فریم پایه را میگیرد؛ تایم فریم اسکن از آن ساخته میشود
+    stream_timeframe = SCAN_TIMEFRAME
+    if exchange_manager.is_derived(SCAN_TIMEFRAME):
+        stream_timeframe = exchange_manager.base_timeframe
+    stream = exchange_manager.start_stream(exchange_manager.symbols, stream_timeframe, url=STREAM_URL)
+    last_update = time.time()
 
-            print(f"✅ Scan complete: {len(all_signals)} signals found")
+    while True:
+        try:
+            trigger = stream.next_trigger(timeout=5)
+            if trigger:
+                reason, symbol, _ = trigger
+                candles = exchange_manager.cached_candles(symbol, SCAN_TIMEFRAME, 200)
+                if not candles.empty:
+                    signals, alerts, _ = scan_symbol(symbol, candles)
+                    cache['signals'] = (cache['signals'] + signals)[-100:]
+                    cache['pump_dump'] = (cache['pump_dump'] + alerts)[-50:]
+
+            if time.time() - last_update >= 60:
+                update_market_cache()
+                last_update = time.time()
 
-            time.sleep(60)  # هر 1 دقیقه
+        except Exception as e:
+            print(f"Stream analysis error: {e}")
+
+def handle_screener_alerts(alerts):
+    """ذخیره و ارسال فوری هشدارهای اسکرینر؛ فقط ارزهای علامت خورده تحلیل کامل کندلی میشوند"""
+    new_alerts = []
+    for alert in alerts:
+        alert['exchange'] = exchange_manager.exchange_id
+        alert['detected_at'] = datetime.utcnow().isoformat()
+        if signal_db.save_signal(alert) is None:
+            continue
+        signal_db.save_pump_dump(alert)
+        new_alerts.append(alert)
+
+    if not new_alerts:
+        return
+
+    socketio.emit('new_signals', new_alerts)
+    cache['pump_dump'] = (cache['pump_dump'] + new_alerts)[-50:]
+
+    for symbol in dict.fromkeys(alert['symbol'] for alert in new_alerts):
+        candles = exchange_manager.fetch_candles(symbol, SCAN_TIMEFRAME, 200, priority=PRIORITY_VALIDATION)
+        if not candles.empty:
+            signals, alerts, _ = scan_symbol(symbol, candles, changed=True)
+            cache['signals'] = (cache['signals'] + signals)[-100:]
+            cache['pump_dump'] = (cache['pump_dump'] + alerts)[-50:]
+
+def screen_market():
+    """اسکرینر تیکر: یک درخواست fetch_tickers برای کل بازار در هر SCREENER_INTERVAL ثانیه"""
+    if not exchange_manager.supports_bulk_tickers():
+        print(f"⚠️ Screener disabled: {exchange_manager.exchange_id} has no bulk ticker endpoint")
+        return
+    while True:
+        started = time.time()
+        try:
+            tickers = exchange_manager.get_all_tickers()
+            if tickers:
+                handle_screener_alerts(ticker_screener.update(started, tickers, exchange_manager.symbols))
+        except Exception as e:
+            print(f"Screener error: {e}")
+        time.sleep(max(SCREENER_INTERVAL - (time.time() - started), 0))
+
+def handle_book_events(events):
+    """ذخیره و ارسال رویدادهای دیوار/عدم تعادل دفتر سفارش"""
+    new_events = []
+    for event in events:
+        event['exchange'] = exchange_manager.exchange_id
+        event['detected_at'] = datetime.utcnow().isoformat()
+        if signal_db.save_signal(event) is not None:
+            new_events.append(event)
+
+    if new_events:
+        socketio.emit('new_signals', new_events)
+        cache['signals'] = (cache['signals'] + new_events)[-100:]
+
+def refresh_derivatives():
+    """کش مشتقات: چند درخواست دستهای در هر DERIVATIVES_INTERVAL ثانیه (تیکرهای اسکرینر دوباره استفاده میشوند)"""
+    while True:
+        started = time.time()
+        try:
+            exchange_manager.refresh_derivatives(max_ticker_age=max(SCREENER_INTERVAL * 2, 60))
+        except Exception as e:
+            print(f"Derivatives error: {e}")
+        time.sleep(max(DERIVATIVES_INTERVAL - (time.time() - started), 0))
 
+def watch_order_books():
+    """دفتر سفارش ارزهای hot: در حالت rest با poll و در حالت stream از پیامهای استریم"""
+    while True:
+        started = time.time()
+        try:
+            if INGESTION_MODE != 'stream':
+                exchange_manager.poll_order_books()
+            else:
+                # دفترهایی که هنوز snapshot ندارند یا در استریم شکاف nonce داشتهاند
+                exchange_manager.poll_order_books(exchange_manager.order_books.needs_snapshot())
+            handle_book_events(exchange_manager.order_books.drain())
         except Exception as e:
-            print(f"Scan error: {e}")
-            time.sleep(30)
+            print(f"Order book error: {e}")
+        time.sleep(max(ORDER_BOOK_INTERVAL - (time.time() - started), 0))
 
 @app.route('/')
 def index():
@@ -129,6 +351,7 @@ def change_exchange():
     success = exchange_manager.change_exchange(new_exchange)
     if success:
         exchange_manager.load_symbols()
+        ticker_screener.reset()
         return jsonify({'success': True, 'exchange': new_exchange})
     return jsonify({'success': False})
 
@@ -146,20 +369,81 @@ def get_symbols():
         'symbols': exchange_manager.symbols[:50]
     })
 
+@app.route('/api/scheduler')
+def get_scheduler_stats():
+    return jsonify(exchange_manager.scheduler.stats())
+
+@app.route('/api/detectors')
+def get_detectors():
+    """زمان کل، تعداد اجرا و خطای هر دتکتور"""
+    return jsonify(detector_registry.stats())
+
+@app.route('/api/detectors/<name>', methods=['POST'])
+def update_detector(name):
+    data = request.json or {}
+    try:
+        if 'enabled' in data:
+            detector_registry.set_enabled(name, data['enabled'])
+        if data.get('params'):
+            detector_registry.set_params(name, **data['params'])
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'Unknown detector or param: {e}'})
+    return jsonify({'success': True, 'detector': detector_registry.get(name).info()})
+
+@app.route('/api/detectors/reset', methods=['POST'])
+def reset_detector_stats():
+    detector_registry.reset_stats()
+    return jsonify({'success': True})
+
+@app.route('/api/orderbooks')
+def get_order_books():
+    books = exchange_manager.order_books
+    return jsonify({**books.stats(), 'books': [books.summary(symbol) for symbol in sorted(books.hot)]})
+
+@app.route('/api/orderbooks/hot', methods=['POST'])
+def set_order_book_symbols():
+    data = request.json or {}
+    exchange_manager.order_books.set_hot(data.get('symbols', []))
+    return jsonify({'success': True, 'hot': sorted(exchange_manager.order_books.hot)})
+
+@app.route('/api/derivatives')
+def get_derivatives():
+    return jsonify(exchange_manager.derivatives.stats())
+
+@app.route('/api/derivatives/<path:symbol>')
+def get_symbol_derivatives(symbol):
+    return jsonify(exchange_manager.derivatives.lookup(symbol) or {})
+
+@app.route('/api/screener')
+def get_screener_stats():
+    return jsonify(ticker_screener.stats())
+
+@app.route('/api/scan/metrics')
+def get_scan_metrics():
+    return jsonify(scan_metrics)
+
+@app.route('/api/indicators/cache')
+def get_indicator_cache_stats():
+    return jsonify(IndicatorContext.stats())
+
 @app.route('/api/analyze/<symbol>')
 def analyze_symbol(symbol):
     try:
         symbol = symbol.replace('_', '/')
-        df = exchange_manager.fetch_ohlcv(symbol, '15m', 200)
+        timeframe = request.args.get('timeframe', SCAN_TIMEFRAME)
+        candles = exchange_manager.fetch_candles(symbol, timeframe, 200, priority=PRIORITY_INTERACTIVE)
 
-        if df.empty:
+        if candles.empty:
             return jsonify({'error': 'No data'})
 
-        signals = signal_generator.analyze(df, symbol)
-        indicators = TechnicalIndicators.get_indicator_summary(df)
+        signals = signal_generator.analyze(candles, symbol)
+        # خلاصه از وضعیت افزایشی: در حالت استریم با هر کندل جلو رفته، وگرنه فقط با کندلهای جدید
+        state = indicator_states.sync((exchange_manager.exchange_id, symbol, timeframe), candles)
+        indicators = TechnicalIndicators.summarize(state)
 
         return jsonify({
             'symbol': symbol,
+            'timeframe': timeframe,
             'signals': signals,
             'indicators': indicators,
             'timestamp': datetime.utcnow().isoformat()
@@ -180,6 +464,9 @@ def handle_subscribe(data):
 if __name__ == '__main__':
     print("🚀 Starting Crypto Futures Signal System...")
 
+    # کارگرهای تحلیل قبل از شروع thread ها fork میشوند
+    analysis_executor.start()
+
     # بارگذاری ارزها
     exchange_manager.load_symbols(250)
 
@@ -187,8 +474,20 @@ if __name__ == '__main__':
     validator.start()
 
     # شروع اسکنر
-    scanner_thread = threading.Thread(target=scan_all_symbols, daemon=True)
+    scanner = stream_all_symbols if INGESTION_MODE == 'stream' else scan_all_symbols
+    scanner_thread = threading.Thread(target=scanner, daemon=True)
     scanner_thread.start()
 
+    # اسکرینر تیکر کل بازار
+    if SCREENER_INTERVAL > 0:
+        threading.Thread(target=screen_market, daemon=True).start()
+
+    # funding / open interest برای سیگنالها
+    if DERIVATIVES_INTERVAL > 0:
+        threading.Thread(target=refresh_derivatives, daemon=True).start()
+
+    # دفتر سفارش ارزهای hot (هم با poll و هم با استریم؛ ارزها با /api/orderbooks/hot قابل تغییرند)
+    threading.Thread(target=watch_order_books, daemon=True).start()
+
     print("📊 Server running on http://localhost:5000")
     socketio.run(app, host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,140 @@
+"""
+کش کندلها در حافظه
+فقط کندلهای جدید از صرافی گرفته میشوند و بقیه از این کش خوانده میشوند
+"""
+from collections import OrderedDict
+import threading
+import numpy as np
+
+class CandleBuffer:
+    """بافر حلقوی با طول ثابت برای کندلهای یک ارز/تایم فریم"""
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, 5), dtype=np.float64)  # open, high, low, close, volume
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.values.nbytes
+
+    @property
+    def last_timestamp(self):
+        if self.count == 0:
+            return None
+        return int(self.timestamps[(self.start + self.count - 1) % self.capacity])
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+    def merge(self, ohlcv):
+        """
+        اضافه کردن کندلهای جدید
+        کندل هم زمان با آخرین کندل (کندل در حال تشکیل) جایگزین میشود
+        """
+        for row in ohlcv:
+            ts = int(row[0])
+            last = self.last_timestamp
+
+            if last is not None and ts < last:
+                continue
+
+            if last is not None and ts == last:
+                pos = (self.start + self.count - 1) % self.capacity
+            elif self.count < self.capacity:
+                pos = (self.start + self.count) % self.capacity
+                self.count += 1
+            else:
+                # بافر پر است؛ قدیمیترین کندل حذف میشود
+                pos = self.start
+                self.start = (self.start + 1) % self.capacity
+
+            self.timestamps[pos] = ts
+            self.values[pos] = row[1:6]
+
+    def tail(self, limit=None):
+        """آخرین کندلها به ترتیب زمانی (کپی)"""
+        n = self.count if limit is None else min(limit, self.count)
+        idx = (self.start + self.count - n + np.arange(n)) % self.capacity
+        return self.timestamps[idx], self.values[idx]
+
+
+class CandleCache:
+    """
+    کش کندل با کلید (exchange, symbol, timeframe)
+    حجم کل محدود است و کم استفادهترین بافرها (LRU) حذف میشوند
+    """
+
+    def __init__(self, capacity=500, max_bytes=128 * 1024 * 1024):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.buffers = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is not None:
+                self.buffers.move_to_end(key)
+            return buffer
+
+    def last_timestamp(self, key):
+        with self.lock:
+            buffer = self.buffers.get(key)
+            return buffer.last_timestamp if buffer is not None else None
+
+    def update(self, key, ohlcv, replace=False, min_capacity=0):
+        """ادغام کندلهای دریافتی در بافر"""
+        with self.lock:
+            buffer = self.buffers.get(key)
+            capacity = max(self.capacity, min_capacity)
+
+            if buffer is None or buffer.capacity < capacity:
+                if buffer is not None:
+                    self.total_bytes -= buffer.nbytes
+                buffer = CandleBuffer(capacity)
+                self.buffers[key] = buffer
+                self.total_bytes += buffer.nbytes
+            elif replace:
+                buffer.clear()
+
+            buffer.merge(ohlcv)
+            self.buffers.move_to_end(key)
+            self._evict()
+            return buffer
+
+    def tail(self, key, limit=None):
+        with self.lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                return None
+            return buffer.tail(limit)
+
+    def remove(self, key):
+        with self.lock:
+            buffer = self.buffers.pop(key, None)
+            if buffer is not None:
+                self.total_bytes -= buffer.nbytes
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.buffers) > 1:
+            _, buffer = self.buffers.popitem(last=False)
+            self.total_bytes -= buffer.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.buffers),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
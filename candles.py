@@ -0,0 +1,104 @@
+"""
+نگهداری کندلها به صورت آرایههای پیوسته numpy
+fetcher، اندیکاتورها و دتکتورها همین آرایهها را بدون کپی استفاده میکنند
+DataFrame فقط وقتی لازم باشد ساخته میشود
+"""
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+def _readonly(array, dtype):
+    """view فقط خواندنی (آرایه اصلی مثلا داخل DataFrame دست نمیخورد)"""
+    array = np.ascontiguousarray(array, dtype=dtype).view()
+    array.flags.writeable = False
+    return array
+
+class Candles:
+    """کندلهای یک ارز (timestamp به میلیثانیه int64، بقیه float64، فقط خواندنی)"""
+
+    __slots__ = ('symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', '_series', '_frame', '_context')
+
+    def __init__(self, timestamp, open, high, low, close, volume, symbol=None):
+        self.symbol = symbol
+        self.timestamp = _readonly(timestamp, np.int64) if timestamp is not None else None
+        self.open = _readonly(open, np.float64)
+        self.high = _readonly(high, np.float64)
+        self.low = _readonly(low, np.float64)
+        self.close = _readonly(close, np.float64)
+        self.volume = _readonly(volume, np.float64)
+        self._series = {}
+        self._frame = None
+        self._context = None  # IndicatorContext همین snapshot
+
+    @classmethod
+    def from_arrays(cls, timestamps, values, symbol=None):
+        """از آرایه زمان و ماتریس (n, 5) مقادیر"""
+        columns = np.ascontiguousarray(np.asarray(values, dtype=np.float64).reshape(-1, 5).T)
+        return cls(timestamps, *columns, symbol=symbol)
+
+    @classmethod
+    def from_ohlcv(cls, ohlcv, symbol=None):
+        """از خروجی خام fetch_ohlcv"""
+        rows = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        return cls.from_arrays(rows[:, 0].astype(np.int64), rows[:, 1:], symbol)
+
+    @classmethod
+    def from_frame(cls, df):
+        """از DataFrame با ستونهای open/high/low/close/volume (و اختیاری timestamp)"""
+        timestamp = None
+        if 'timestamp' in df.columns:
+            timestamp = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        symbol = df['symbol'].iloc[0] if 'symbol' in df.columns and len(df) else None
+        candles = cls(timestamp, *(df[name].to_numpy() for name in COLUMNS), symbol=symbol)
+        candles._frame = df
+        return candles
+
+    def __len__(self):
+        return len(self.close)
+
+    @property
+    def empty(self):
+        return len(self.close) == 0
+
+    def series(self, name):
+        """pd.Series روی همان آرایه (بدون کپی) برای کتابخانه ta"""
+        series = self._series.get(name)
+        if series is None:
+            series = pd.Series(getattr(self, name), copy=False)
+            self._series[name] = series
+        return series
+
+    def time_at(self, i):
+        """زمان کندل i (اگر زمان نداریم، زمان فعلی)"""
+        if self.timestamp is None:
+            return datetime.utcnow()
+        return pd.Timestamp(int(self.timestamp[i]), unit='ms')
+
+    def tail(self, n):
+        """آخرین n کندل (view بدون کپی)"""
+        start = max(len(self) - n, 0)
+        timestamp = self.timestamp[start:] if self.timestamp is not None else None
+        return Candles(timestamp, self.open[start:], self.high[start:], self.low[start:],
+                       self.close[start:], self.volume[start:], symbol=self.symbol)
+
+    def to_frame(self):
+        """ساخت DataFrame (یک بار و فقط در صورت نیاز)"""
+        if self._frame is None:
+            data = {}
+            if self.timestamp is not None:
+                data['timestamp'] = pd.to_datetime(self.timestamp, unit='ms')
+            for name in COLUMNS:
+                data[name] = getattr(self, name)
+            df = pd.DataFrame(data)
+            if self.symbol is not None:
+                df['symbol'] = self.symbol
+            self._frame = df
+        return self._frame
+
+def as_candles(data):
+    """Candles یا DataFrame را به Candles تبدیل میکند"""
+    if isinstance(data, Candles):
+        return data
+    return Candles.from_frame(data)
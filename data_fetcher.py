@@ -3,10 +3,337 @@
 KuCoin, Bybit, OKX, Gate.io, MEXC
 """
 import ccxt
+import ccxt.async_support as ccxt_async
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import time
 import asyncio
+import os
+import heapq
+import itertools
+import queue
+import threading
+from candle_cache import CandleCache
+from ohlcv_store import OHLCVStore
+from market_stream import MarketStream, CcxtProSource, WebSocketSource
+from replay_exchange import ReplayExchange, AsyncReplayExchange
+from candles import Candles
+from resampler import TimeframeResampler
+from order_book import OrderBookManager
+from streaming_indicators import indicator_states
+
+# کلاسهای اولویت درخواست (عدد کمتر = اولویت بالاتر)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_VALIDATION = 1
+PRIORITY_SCAN = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_VALIDATION: 'validation',
+    PRIORITY_SCAN: 'scan'
+}
+
+class RequestScheduler:
+    """
+    بودجه مشترک درخواستها
+    هر صرافی یک token bucket دارد و درخواستهای منتظر به ترتیب اولویت توکن میگیرند
+    اسکن پسزمینه بخشی از ظرفیت (scan_reserve) را برای درخواستهای کاربر خالی میگذارد
+    """
+
+    def __init__(self, scan_reserve=0.2, penalty=5.0):
+        self.scan_reserve = scan_reserve
+        self.penalty = penalty
+        self.buckets = {}
+        self.waiting = {}
+        self.cond = threading.Condition()
+        self.counter = itertools.count()
+        self.priority_stats = {
+            priority: {'requests': 0, 'total_wait': 0.0, 'max_wait': 0.0, 'throttled': 0}
+            for priority in PRIORITY_NAMES
+        }
+
+    def configure(self, exchange_id, rate, burst=None):
+        """تنظیم نرخ (درخواست در ثانیه) برای یک صرافی"""
+        with self.cond:
+            burst = burst or max(rate, 1.0)
+            self.buckets[exchange_id] = {
+                'rate': rate,
+                'burst': burst,
+                'tokens': burst,
+                'updated': time.monotonic(),
+                'blocked_until': 0.0
+            }
+            self.waiting.setdefault(exchange_id, [])
+
+    def _bucket(self, exchange_id):
+        if exchange_id not in self.buckets:
+            self.configure(exchange_id, 10.0)
+        return self.buckets[exchange_id]
+
+    def _try_take(self, exchange_id, ticket):
+        """None یعنی توکن گرفته شد؛ در غیر این صورت مدت انتظار پیشنهادی (ثانیه)"""
+        bucket = self._bucket(exchange_id)
+        now = time.monotonic()
+        bucket['tokens'] = min(bucket['burst'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+        bucket['updated'] = now
+
+        if now < bucket['blocked_until']:
+            return bucket['blocked_until'] - now
+
+        waiting = self.waiting[exchange_id]
+        if waiting[0] != ticket:
+            return 0.05
+
+        needed = 1.0
+        if ticket[0] == PRIORITY_SCAN:
+            needed = min(1.0 + bucket['burst'] * self.scan_reserve, bucket['burst'])
+        if bucket['tokens'] < needed:
+            return (needed - bucket['tokens']) / bucket['rate']
+
+        bucket['tokens'] -= 1.0
+        heapq.heappop(waiting)
+        return None
+
+    def _enqueue(self, exchange_id, priority):
+        ticket = (priority, next(self.counter))
+        self._bucket(exchange_id)
+        heapq.heappush(self.waiting[exchange_id], ticket)
+        return ticket
+
+    def _cancel(self, exchange_id, ticket):
+        waiting = self.waiting[exchange_id]
+        if ticket in waiting:
+            waiting.remove(ticket)
+            heapq.heapify(waiting)
+        self.cond.notify_all()
+
+    def _granted(self, priority, waited):
+        stats = self.priority_stats[priority]
+        stats['requests'] += 1
+        stats['total_wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+        self.cond.notify_all()
+
+    def acquire(self, exchange_id, priority=PRIORITY_SCAN):
+        """انتظار تا گرفتن یک توکن"""
+        started = time.monotonic()
+        with self.cond:
+            ticket = self._enqueue(exchange_id, priority)
+            try:
+                while True:
+                    wait = self._try_take(exchange_id, ticket)
+                    if wait is None:
+                        break
+                    self.cond.wait(min(wait, 1.0))
+            except BaseException:
+                self._cancel(exchange_id, ticket)
+                raise
+            self._granted(priority, time.monotonic() - started)
+
+    async def acquire_async(self, exchange_id, priority=PRIORITY_SCAN):
+        """نسخه async از acquire برای حلقه اسکن"""
+        started = time.monotonic()
+        with self.cond:
+            ticket = self._enqueue(exchange_id, priority)
+        try:
+            while True:
+                with self.cond:
+                    wait = self._try_take(exchange_id, ticket)
+                    if wait is None:
+                        self._granted(priority, time.monotonic() - started)
+                        return
+                await asyncio.sleep(min(wait, 1.0))
+        except BaseException:
+            with self.cond:
+                self._cancel(exchange_id, ticket)
+            raise
+
+    def penalize(self, exchange_id, priority, seconds=None):
+        """بعد از خطای 429 همه درخواستهای این صرافی کمی متوقف میشوند"""
+        with self.cond:
+            bucket = self._bucket(exchange_id)
+            bucket['tokens'] = 0.0
+            bucket['blocked_until'] = time.monotonic() + (seconds or self.penalty)
+            self.priority_stats[priority]['throttled'] += 1
+
+    def stats(self):
+        """عمق صفها و زمانهای انتظار"""
+        with self.cond:
+            queues = {}
+            for exchange_id, waiting in self.waiting.items():
+                depth = {name: 0 for name in PRIORITY_NAMES.values()}
+                for priority, _ in waiting:
+                    depth[PRIORITY_NAMES[priority]] += 1
+                queues[exchange_id] = {
+                    'depth': depth,
+                    'tokens': round(self.buckets[exchange_id]['tokens'], 2),
+                    'rate': self.buckets[exchange_id]['rate']
+                }
+
+            priorities = {}
+            for priority, stats in self.priority_stats.items():
+                count = stats['requests']
+                priorities[PRIORITY_NAMES[priority]] = {
+                    'requests': count,
+                    'avg_wait_ms': round(stats['total_wait'] / count * 1000, 1) if count else 0,
+                    'max_wait_ms': round(stats['max_wait'] * 1000, 1),
+                    'throttled': stats['throttled']
+                }
+
+            return {'queues': queues, 'priorities': priorities}
+
+# زمانبند مشترک همه بخشها
+request_scheduler = RequestScheduler()
+
+# نام فیلدهای funding و open interest در info خام تیکر/مارکت صرافیها
+# (bybit / bitget / mexc / gate / kucoin)
+FUNDING_FIELDS = ('fundingRate', 'funding_rate', 'fundingFeeRate', 'lastFundingRate')
+OPEN_INTEREST_FIELDS = ('openInterest', 'open_interest', 'holdingAmount', 'holdVol', 'total_size')
+# قیمت و حجم دلاری 24 ساعته در info قراردادها (صرافیهای بدون fetch_tickers مثل کوکوین فیوچرز)
+LAST_PRICE_FIELDS = ('lastTradePrice', 'lastPrice', 'last')
+QUOTE_VOLUME_FIELDS = ('turnoverOf24h', 'turnover24h', 'quoteVolume')
+
+def _info_number(info, fields):
+    """اولین فیلد عددی موجود در info"""
+    for field in fields:
+        value = info.get(field)
+        if value not in (None, ''):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+class DerivativesCache:
+    """
+    تاریخچه funding rate و open interest همه ارزها در بافر حلقوی (زمان × ارز)
+    فقط از endpoint های دستهای و با فاصله زیاد پر میشود؛ lookup برای دتکتورها O(1) است
+    تغییرات نسبت به آخرین snapshot در زمان now - lookback (یا قدیمیترین snapshot) حساب میشوند
+    """
+
+    def __init__(self, capacity=288, lookback=3600):
+        self.capacity = capacity
+        self.lookback = lookback
+
+        self.columns = {}   # symbol -> ستون
+        self.symbols = []
+        self.times = np.zeros(capacity)
+        self.funding = np.full((capacity, 0), np.nan)
+        self.open_interest = np.full((capacity, 0), np.nan)
+        self.start = 0
+        self.count = 0
+
+        self.latest = {}    # symbol -> معیارهای آخرین snapshot
+        self.lock = threading.Lock()
+        self.refreshes = 0
+        self.requests = 0
+        self.lookups = 0
+        self.misses = 0
+
+    def _grow(self, symbols):
+        """اضافه کردن ستون برای ارزهای جدید (ظرفیت ستونها دو برابر میشود)"""
+        for symbol in symbols:
+            self.columns[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+
+        width = self.funding.shape[1]
+        if len(self.symbols) > width:
+            extra = max(len(self.symbols), 2 * width) - width
+            pad = np.full((self.capacity, extra), np.nan)
+            self.funding = np.hstack([self.funding, pad])
+            self.open_interest = np.hstack([self.open_interest, pad])
+
+    def update(self, timestamp, rows):
+        """
+        افزودن یک snapshot (timestamp به ثانیه)
+        rows: {symbol: (funding_rate, open_interest)}؛ مقدار نامعلوم None
+        """
+        with self.lock:
+            new = [symbol for symbol in rows if symbol not in self.columns]
+            if new:
+                self._grow(new)
+
+            if self.count < self.capacity:
+                pos = (self.start + self.count) % self.capacity
+                self.count += 1
+            else:
+                pos = self.start
+                self.start = (self.start + 1) % self.capacity
+
+            columns = np.fromiter((self.columns[s] for s in rows), dtype=np.int64, count=len(rows))
+            self.times[pos] = timestamp
+            self.funding[pos] = np.nan
+            self.open_interest[pos] = np.nan
+            self.funding[pos, columns] = np.fromiter(
+                (np.nan if f is None else f for f, _ in rows.values()), dtype=np.float64, count=len(rows))
+            self.open_interest[pos, columns] = np.fromiter(
+                (np.nan if oi is None else oi for _, oi in rows.values()), dtype=np.float64, count=len(rows))
+            self.refreshes += 1
+            self.latest = self._metrics()
+
+    def _metrics(self):
+        """معیارهای همه ارزها با عملیات برداری؛ خروجی دیکشنری برای lookup"""
+        order = (self.start + np.arange(self.count)) % self.capacity
+        times = self.times[order]
+        now = order[-1]
+        width = len(self.symbols)
+
+        back = np.searchsorted(times, times[-1] - self.lookback, side='right') - 1
+        then = order[max(back, 0)]
+        funding = self.funding[now, :width]
+        open_interest = self.open_interest[now, :width]
+        if then == now:
+            # هنوز snapshot قبلی نیست
+            funding_delta = oi_change = np.full(width, np.nan)
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                funding_delta = funding - self.funding[then, :width]
+                oi_then = self.open_interest[then, :width]
+                oi_change = (open_interest - oi_then) / oi_then * 100
+        span = times[-1] - self.times[then]
+
+        def value(x, digits):
+            return round(float(x), digits) if np.isfinite(x) else None
+
+        latest = {}
+        updated = float(times[-1])
+        for symbol, column in self.columns.items():
+            if np.isnan(funding[column]) and np.isnan(open_interest[column]):
+                continue
+            latest[symbol] = {
+                'funding_rate': value(funding[column], 8),
+                'funding_delta': value(funding_delta[column], 8),
+                'open_interest': value(open_interest[column], 4),
+                'oi_change_pct': value(oi_change[column], 3),
+                'span': int(span),
+                'updated': updated
+            }
+        return latest
+
+    def lookup(self, symbol):
+        """آخرین معیارهای ارز (None اگر داده ندارد)"""
+        self.lookups += 1
+        metrics = self.latest.get(symbol)
+        if metrics is None:
+            self.misses += 1
+        return metrics
+
+    def reset(self):
+        with self.lock:
+            self.columns = {}
+            self.symbols = []
+            self.funding = np.full((self.capacity, 0), np.nan)
+            self.open_interest = np.full((self.capacity, 0), np.nan)
+            self.start = 0
+            self.count = 0
+            self.latest = {}
+
+    def stats(self):
+        with self.lock:
+            updated = float(self.times[(self.start + self.count - 1) % self.capacity]) if self.count else None
+            return {'symbols': len(self.latest), 'snapshots': self.count, 'refreshes': self.refreshes,
+                    'requests': self.requests, 'lookups': self.lookups, 'misses': self.misses,
+                    'age': round(time.time() - updated, 1) if updated else None, 'lookback': self.lookback}
 
 class ExchangeManager:
     """مدیریت صرافیها"""
@@ -15,37 +342,72 @@ class ExchangeManager:
         'kucoin': {
             'name': 'KuCoin',
             'class': ccxt.kucoinfutures,
+            'async_class': ccxt_async.kucoinfutures,
             'sanctioned': False
         },
         'bybit': {
             'name': 'Bybit',
             'class': ccxt.bybit,
+            'async_class': ccxt_async.bybit,
             'sanctioned': False
         },
         'okx': {
             'name': 'OKX',
             'class': ccxt.okx,
+            'async_class': ccxt_async.okx,
             'sanctioned': False
         },
         'gate': {
             'name': 'Gate.io',
             'class': ccxt.gateio,
+            'async_class': ccxt_async.gateio,
             'sanctioned': False
         },
         'mexc': {
             'name': 'MEXC',
             'class': ccxt.mexc,
+            'async_class': ccxt_async.mexc,
             'sanctioned': False
         },
         'bitget': {
             'name': 'Bitget',
             'class': ccxt.bitget,
+            'async_class': ccxt_async.bitget,
+            'sanctioned': False
+        },
+        'replay': {
+            'name': 'Replay (offline)',
+            'class': ReplayExchange,
+            'async_class': AsyncReplayExchange,
             'sanctioned': False
         }
     }
 
-    def __init__(self, exchange_id='kucoin'):
+    def __init__(self, exchange_id='kucoin', max_concurrency=10, store_dir='data/ohlcv',
+                 scheduler=None, max_retries=2, exchange_options=None, base_timeframe=None,
+                 order_book_symbols=None):
         self.exchange_id = exchange_id
+        self.exchange_options = exchange_options or {}
+        self.max_concurrency = max_concurrency
+        self.scheduler = scheduler or request_scheduler
+        self.max_retries = max_retries
+        self.tickers = {}
+        self.stream = None
+        self.ticker_max_age = 10
+        self.candle_cache = CandleCache()
+        self.store = OHLCVStore(store_dir)
+        # تایم فریم پایه؛ تایم فریمهای بالاتر (مضرب آن) به صورت محلی ساخته میشوند
+        self.base_timeframe = base_timeframe
+        self.resampler = TimeframeResampler()
+        # تعداد کندل پایهای که تاریخچهاش یک بار کامل گرفته شده: (exchange, symbol, base) -> count
+        self.base_depth = {}
+        # دفتر سفارش L2 فقط برای ارزهای منتخب (hot set)
+        self.order_books = OrderBookManager(order_book_symbols)
+        # funding / open interest همه ارزها (فقط از endpoint های دستهای)
+        self.derivatives = DerivativesCache()
+        # آخرین پاسخ fetch_tickers (مثلا از اسکرینر) برای استفاده دوباره
+        self.bulk_tickers = {}
+        self.bulk_tickers_time = 0.0
         self.exchange = None
         self.symbols = []
         self.init_exchange()
@@ -57,21 +419,48 @@ class ExchangeManager:
 
         try:
             exchange_info = self.SUPPORTED_EXCHANGES[self.exchange_id]
+            # محدودیت نرخ توسط RequestScheduler اعمال میشود نه ccxt
             self.exchange = exchange_info['class']({
-                'enableRateLimit': True,
-                'options': {'defaultType': 'swap'}
+                'enableRateLimit': False,
+                'options': {'defaultType': 'swap', **self.exchange_options}
             })
             print(f"✅ Connected to {exchange_info['name']}")
         except Exception as e:
             print(f"❌ Error connecting: {e}")
             # Fallback to KuCoin
-            self.exchange = ccxt.kucoinfutures({'enableRateLimit': True})
+            self.exchange = ccxt.kucoinfutures({'enableRateLimit': False})
+
+        self.scheduler.configure(self.exchange_id, 1000.0 / self.exchange.rateLimit)
+
+    def _request(self, priority, method, *args, **kwargs):
+        """ارسال درخواست از طریق زمانبند مشترک (با تلاش دوباره بعد از 429)"""
+        for attempt in range(self.max_retries + 1):
+            self.scheduler.acquire(self.exchange_id, priority)
+            try:
+                return getattr(self.exchange, method)(*args, **kwargs)
+            except ccxt.DDoSProtection:
+                self.scheduler.penalize(self.exchange_id, priority)
+                if attempt == self.max_retries:
+                    raise
+
+    async def _request_async(self, exchange, priority, method, *args, **kwargs):
+        """نسخه async از _request"""
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire_async(self.exchange_id, priority)
+            try:
+                return await getattr(exchange, method)(*args, **kwargs)
+            except ccxt.DDoSProtection:
+                self.scheduler.penalize(self.exchange_id, priority)
+                if attempt == self.max_retries:
+                    raise
 
     def change_exchange(self, new_exchange_id):
         """تغییر صرافی"""
         if new_exchange_id in self.SUPPORTED_EXCHANGES:
             self.exchange_id = new_exchange_id
             self.init_exchange()
+            self.derivatives.reset()
+            self.bulk_tickers = {}
             self.load_symbols()
             return True
         return False
@@ -79,7 +468,7 @@ class ExchangeManager:
     def load_symbols(self, limit=250):
         """بارگذاری لیست ارزها"""
         try:
-            self.exchange.load_markets()
+            self._request(PRIORITY_INTERACTIVE, 'load_markets')
 
             futures_symbols = []
             for symbol, market in self.exchange.markets.items():
@@ -96,24 +485,377 @@ class ExchangeManager:
             self.symbols = ['BTC/USDT:USDT', 'ETH/USDT:USDT']
             return self.symbols
 
-    def fetch_ohlcv(self, symbol, timeframe='15m', limit=200):
-        """دریافت کندلها"""
+    def _since(self, symbol, timeframe, limit):
+        """
+        زمان شروع درخواست افزایشی
+        None یعنی کش کافی یا تازه نیست و باید همه کندلها گرفته شوند
+        """
+        key = (self.exchange_id, symbol, timeframe)
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        buffer = self.candle_cache.get(key)
+        if buffer is None:
+            buffer = self._load_from_store(symbol, timeframe, limit, timeframe_ms)
+        # کندل در حال تشکیل روی دیسک نیست و با همین درخواست گرفته میشود
+        if buffer is None or len(buffer) < limit - 1:
+            return None
+
+        last = buffer.last_timestamp
+        if time.time() * 1000 - last > timeframe_ms * (limit - 1):
+            return None
+        return last
+
+    def _load_from_store(self, symbol, timeframe, limit, timeframe_ms):
+        """پر کردن کش از فایل دیسک (شروع گرم بعد از ریاستارت)"""
+        stored = self.store.read(self.exchange_id, symbol, timeframe, limit, timeframe_ms)
+        if stored is None or len(stored[0]) == 0:
+            return None
+
+        timestamps, values = stored
+        key = (self.exchange_id, symbol, timeframe)
+        return self.candle_cache.update(key, np.column_stack([timestamps, values]),
+                                        replace=True, min_capacity=limit)
+
+    def _store(self, symbol, timeframe, ohlcv, since, limit):
+        """ذخیره کندلهای جدید در کش و برگرداندن آخرین کندلها (Candles)"""
+        key = (self.exchange_id, symbol, timeframe)
+        self.candle_cache.update(key, ohlcv, replace=since is None, min_capacity=limit)
+
+        # فقط کندلهای بسته شده روی دیسک نوشته میشوند
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        now = time.time() * 1000
+        closed = [row for row in ohlcv if row[0] + timeframe_ms <= now]
+        if closed:
+            self.store.append(self.exchange_id, symbol, timeframe, closed)
+
+        if timeframe == self.base_timeframe and len(ohlcv):
+            self._update_resampled(symbol, int(ohlcv[0][0]))
+
+        timestamps, values = self.candle_cache.tail(key, limit)
+        return Candles.from_arrays(timestamps, values, symbol)
+
+    # --- تایم فریمهای ساخته شده از تایم فریم پایه ---
+
+    def is_derived(self, timeframe):
+        """آیا timeframe از تایم فریم پایه ساخته میشود (مضرب آن و کوچکتر از یک هفته)"""
+        if not self.base_timeframe or timeframe == self.base_timeframe:
+            return False
+        base_ms = ccxt.Exchange.parse_timeframe(self.base_timeframe) * 1000
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        # کندل هفتگی صرافیها از دوشنبه شروع میشود نه از epoch
+        return timeframe_ms > base_ms and timeframe_ms % base_ms == 0 and timeframe_ms < 7 * 86400 * 1000
+
+    def _base_fresh(self, symbol):
+        """کندل جاری تایم فریم پایه در کش هست (مثلا با اسکن یا استریم)"""
+        last = self.candle_cache.last_timestamp((self.exchange_id, symbol, self.base_timeframe))
+        base_ms = ccxt.Exchange.parse_timeframe(self.base_timeframe) * 1000
+        return last is not None and time.time() * 1000 - last < base_ms
+
+    def _base_history(self, symbol, count):
+        """آخرین count کندل پایه: کندلهای بسته شده از دیسک + کندلهای کش"""
+        base_ms = ccxt.Exchange.parse_timeframe(self.base_timeframe) * 1000
+        cached = self.candle_cache.tail((self.exchange_id, symbol, self.base_timeframe), count)
+        if cached is not None and len(cached[0]) >= count:
+            return cached
+
+        stored = self.store.read(self.exchange_id, symbol, self.base_timeframe, count, base_ms)
+        if stored is None or len(stored[0]) == 0:
+            return cached
+        if cached is None or len(cached[0]) == 0:
+            return stored
+
+        older = stored[0] < cached[0][0]
+        return (np.concatenate([stored[0][older], cached[0]]),
+                np.concatenate([stored[1][older], cached[1]]))
+
+    def _base_count(self, timeframe, limit):
+        """تعداد کندل پایه لازم برای limit کندل تایم فریم بالاتر (یک بازه اضافه برای بازه ناقص ابتدا)"""
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        base_ms = ccxt.Exchange.parse_timeframe(self.base_timeframe) * 1000
+        return (limit + 1) * (timeframe_ms // base_ms)
+
+    def _ensure_base_history(self, symbol, count, priority=PRIORITY_SCAN, page_limit=1000):
+        """
+        اگر تاریخچه پایه محلی کوتاهتر از count باشد، یک بار صفحه به صفحه از صرافی گرفته میشود
+        True یعنی تاریخچه دریافت شد؛ ارز تازه لیست شده با تاریخچه کوتاه دوباره درخواست نمیشود
+        """
+        key = (self.exchange_id, symbol, self.base_timeframe)
+        if self.base_depth.get(key, 0) >= count:
+            return False
+        history = self._base_history(symbol, count)
+        if history is not None and len(history[0]) >= count:
+            self.base_depth[key] = count
+            return False
+
+        base_ms = ccxt.Exchange.parse_timeframe(self.base_timeframe) * 1000
+        now = time.time() * 1000
+        cursor = int(now // base_ms * base_ms - (count - 1) * base_ms)
+        rows = []
         try:
-            ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+            while cursor <= now:
+                ohlcv = self._request(priority, 'fetch_ohlcv', symbol, self.base_timeframe,
+                                      since=cursor, limit=page_limit)
+                new = [row for row in ohlcv if row[0] >= cursor]
+                if not new:
+                    break
+                rows.extend(new)
+                cursor = new[-1][0] + base_ms
+        except Exception as e:
+            print(f"❌ Error fetching history {symbol}: {e}")
+            return False
+
+        self.base_depth[key] = count
+        if not rows:
+            return False
+        self.candle_cache.update(key, rows, replace=True, min_capacity=count)
+        closed = [row for row in rows if row[0] + base_ms <= now]
+        if closed:
+            self.store.append(self.exchange_id, symbol, self.base_timeframe, closed)
+        # تایم فریمهای ساخته شده از تاریخچه کوتاه قبلی دوباره ساخته میشوند
+        for resampled in self.resampler.keys_for(self.exchange_id, symbol):
+            self.resampler.remove(resampled)
+        return True
+
+    def resampled_candles(self, symbol, timeframe, limit=200):
+        """کندلهای تایم فریم بالاتر از داده محلی تایم فریم پایه (بدون درخواست شبکه)"""
+        key = (self.exchange_id, symbol, timeframe)
+        data = self.resampler.get(key, limit)
+        if data is None:
+            timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+            base = self._base_history(symbol, self._base_count(timeframe, limit))
+            if base is None:
+                return Candles.from_ohlcv([], symbol)
+            data = self.resampler.build(key, base[0], base[1], timeframe_ms, limit)
+        return Candles.from_arrays(data[0], data[1], symbol)
+
+    def _update_resampled(self, symbol, since):
+        """بروزرسانی فقط کندلهای تایم فریم بالاتر که کندلهای پایه از since به بعد در آنها هستند"""
+        base_key = (self.exchange_id, symbol, self.base_timeframe)
+        base_ms = ccxt.Exchange.parse_timeframe(self.base_timeframe) * 1000
+        last = self.candle_cache.last_timestamp(base_key)
+        if last is None:
+            return
 
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df['symbol'] = symbol
+        for key in self.resampler.keys_for(self.exchange_id, symbol):
+            timeframe_ms = ccxt.Exchange.parse_timeframe(key[2]) * 1000
+            start = max(since, last - 2 * timeframe_ms) // timeframe_ms * timeframe_ms
+            timestamps, values = self.candle_cache.tail(base_key, (last - start) // base_ms + 1)
+            if len(timestamps) and timestamps[0] > start:
+                # ابتدای این بازه در کش نیست؛ کندل ناقص ساخته نمیشود
+                start += timeframe_ms
+            inside = timestamps >= start
+            self.resampler.update(key, timestamps[inside], values[inside], timeframe_ms)
 
-            return df
+    def fetch_candles(self, symbol, timeframe='15m', limit=200, priority=PRIORITY_INTERACTIVE):
+        """دریافت کندلها به صورت Candles (فقط کندلهای جدید از صرافی گرفته میشوند)"""
+        if self.is_derived(timeframe):
+            # فقط تایم فریم پایه (اگر کش آن تازه نباشد) از صرافی گرفته میشود
+            fetched = self._ensure_base_history(symbol, self._base_count(timeframe, limit), priority)
+            if not fetched and not self._base_fresh(symbol):
+                self.fetch_candles(symbol, self.base_timeframe, limit, priority)
+            return self.resampled_candles(symbol, timeframe, limit)
+
+        try:
+            since = self._since(symbol, timeframe, limit)
+            ohlcv = self._request(priority, 'fetch_ohlcv', symbol, timeframe, since=since, limit=limit)
+            return self._store(symbol, timeframe, ohlcv, since, limit)
         except Exception as e:
             print(f"❌ Error fetching {symbol}: {e}")
+            return Candles.from_ohlcv([], symbol)
+
+    def fetch_ohlcv(self, symbol, timeframe='15m', limit=200, priority=PRIORITY_INTERACTIVE):
+        """دریافت کندلها به صورت DataFrame"""
+        candles = self.fetch_candles(symbol, timeframe, limit, priority)
+        if candles.empty:
             return pd.DataFrame()
+        return candles.to_frame()
+
+    def _create_async_exchange(self):
+        """ساخت نسخه async صرافی با همان بازارهای بارگذاری شده"""
+        exchange_info = self.SUPPORTED_EXCHANGES[self.exchange_id]
+        exchange = exchange_info['async_class']({
+            'enableRateLimit': False,
+            'options': {'defaultType': 'swap', **self.exchange_options}
+        })
+        if self.exchange is not None and self.exchange.markets:
+            # جلوگیری از load_markets دوباره در هر اسکن
+            exchange.set_markets(self.exchange.markets, self.exchange.currencies)
+        return exchange
+
+    async def _fetch_many_async(self, symbols, timeframe, limit, results, concurrency, priority):
+        """دریافت همزمان کندلها با تعداد درخواست محدود"""
+        exchange = self._create_async_exchange()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_one(symbol):
+            async with semaphore:
+                try:
+                    since = self._since(symbol, timeframe, limit)
+                    ohlcv = await self._request_async(exchange, priority, 'fetch_ohlcv',
+                                                      symbol, timeframe, since=since, limit=limit)
+                    candles = self._store(symbol, timeframe, ohlcv, since, limit)
+                except Exception as e:
+                    print(f"❌ Error fetching {symbol}: {e}")
+                    candles = Candles.from_ohlcv([], symbol)
+            results.put((symbol, candles))
+
+        try:
+            await asyncio.gather(*(fetch_one(symbol) for symbol in symbols))
+        finally:
+            await exchange.close()
+            results.put(None)
+
+    def iter_ohlcv(self, symbols, timeframe='15m', limit=200, concurrency=None, priority=PRIORITY_SCAN):
+        """
+        دریافت همزمان کندلهای چند ارز
+        هر (symbol, candles) به محض رسیدن برگردانده میشود تا تحلیل منتظر کل اسکن نماند
+        """
+        if self.is_derived(timeframe):
+            # فقط تایم فریم پایه دریافت و تایم فریم خواسته شده محلی ساخته میشود
+            count = self._base_count(timeframe, limit)
+            for symbol, candles in self.iter_ohlcv(symbols, self.base_timeframe, limit, concurrency, priority):
+                if candles.empty:
+                    yield symbol, candles
+                    continue
+                self._ensure_base_history(symbol, count, priority)
+                yield symbol, self.resampled_candles(symbol, timeframe, limit)
+            return
+
+        results = queue.Queue()
+        concurrency = concurrency or self.max_concurrency
+
+        def run():
+            try:
+                asyncio.run(self._fetch_many_async(symbols, timeframe, limit, results, concurrency, priority))
+            except Exception as e:
+                print(f"❌ Async fetch error: {e}")
+                results.put(None)
+
+        threading.Thread(target=run, daemon=True).start()
+
+        while True:
+            item = results.get()
+            if item is None:
+                break
+            yield item
+
+    async def _backfill_async(self, symbols, timeframe, since, concurrency, page_limit):
+        """دانلود صفحه به صفحه تاریخچه و نوشتن روی دیسک"""
+        exchange = self._create_async_exchange()
+        semaphore = asyncio.Semaphore(concurrency)
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        total = 0
 
-    def get_ticker(self, symbol):
+        async def backfill_one(symbol):
+            nonlocal total
+            async with semaphore:
+                last = self.store.last_timestamp(self.exchange_id, symbol, timeframe)
+                cursor = since if last is None else max(since, last + timeframe_ms)
+
+                while True:
+                    try:
+                        ohlcv = await self._request_async(exchange, PRIORITY_SCAN, 'fetch_ohlcv',
+                                                          symbol, timeframe, since=cursor, limit=page_limit)
+                    except Exception as e:
+                        print(f"❌ Error backfilling {symbol}: {e}")
+                        break
+
+                    now = time.time() * 1000
+                    closed = [row for row in ohlcv if row[0] >= cursor and row[0] + timeframe_ms <= now]
+                    if not closed:
+                        break
+
+                    total += self.store.append(self.exchange_id, symbol, timeframe, closed)
+                    cursor = closed[-1][0] + timeframe_ms
+
+        try:
+            await asyncio.gather(*(backfill_one(symbol) for symbol in symbols))
+        finally:
+            await exchange.close()
+
+        return total
+
+    def backfill(self, symbols, timeframe='15m', since=None, concurrency=5, page_limit=1000):
+        """دانلود همزمان تاریخچه عمیق (ادامه از آخرین کندل ذخیره شده)"""
+        if since is None:
+            since = int((time.time() - 30 * 86400) * 1000)
+        return asyncio.run(self._backfill_async(symbols, timeframe, since, concurrency, page_limit))
+
+    def cached_candles(self, symbol, timeframe='15m', limit=200):
+        """کندلهای موجود در کش بدون درخواست شبکه (حالت استریم)"""
+        if self.is_derived(timeframe):
+            return self.resampled_candles(symbol, timeframe, limit)
+        data = self.candle_cache.tail((self.exchange_id, symbol, timeframe), limit)
+        if data is None:
+            return Candles.from_ohlcv([], symbol)
+        return Candles.from_arrays(data[0], data[1], symbol)
+
+    def apply_candle(self, symbol, timeframe, candle):
+        """
+        اعمال یک کندل دریافتی از استریم
+        True یعنی کندل جدیدی شروع شده و کندل قبلی بسته شده است
+        """
+        key = (self.exchange_id, symbol, timeframe)
+        last = self.candle_cache.last_timestamp(key)
+        if last is not None and candle[0] < last:
+            return False
+
+        closed = last is not None and candle[0] > last
+        if closed:
+            timestamps, values = self.candle_cache.tail(key, 1)
+            self.store.append(self.exchange_id, symbol, timeframe, [[timestamps[0], *values[0]]])
+
+        self.candle_cache.update(key, [candle])
+        # اندیکاتورهای افزایشی همین کندل (خلاصه /api/analyze)
+        indicator_states.apply(key, candle, ccxt.Exchange.parse_timeframe(timeframe) * 1000)
+        if timeframe == self.base_timeframe:
+            self._update_resampled(symbol, int(candle[0]))
+        return closed
+
+    def apply_ticker(self, symbol, ticker):
+        """ذخیره آخرین تیکر دریافتی از استریم"""
+        self.tickers[symbol] = dict(ticker, updated=time.time())
+
+    def apply_order_book(self, message):
+        """اعمال snapshot / diff دفتر سفارش (از استریم یا poll)؛ رویدادهای دتکتور دیوار/عدم تعادل"""
+        return self.order_books.apply(message)
+
+    def poll_order_books(self, symbols=None, limit=50, priority=PRIORITY_SCAN):
+        """
+        snapshot دفتر ارزهای hot (یا symbols)؛ هر snapshot به صورت diff با دفتر فعلی اعمال میشود
+        """
+        events = []
+        for symbol in sorted(self.order_books.hot if symbols is None else symbols):
+            try:
+                book = self._request(priority, 'fetch_order_book', symbol, limit)
+            except Exception as e:
+                print(f"❌ Error fetching order book {symbol}: {e}")
+                continue
+            events.extend(self.apply_order_book({
+                'type': 'book_snapshot',
+                'symbol': symbol,
+                'bids': [level[:2] for level in book.get('bids', [])],
+                'asks': [level[:2] for level in book.get('asks', [])],
+                'nonce': book.get('nonce'),
+                'timestamp': book.get('timestamp')
+            }))
+        return events
+
+    def start_stream(self, symbols, timeframe='15m', url=None, price_threshold=1.0, record_path=None):
+        """
+        شروع حالت استریم
+        بدون url از وبسوکت صرافی (ccxt.pro) و با url از یک وبسوکت هم فرمت (مثلا replay) میخواند
+        """
+        source = WebSocketSource(url) if url else CcxtProSource(self, symbols, timeframe)
+        self.stream = MarketStream(self, source, price_threshold, record_path)
+        self.stream.start()
+        return self.stream
+
+    def get_ticker(self, symbol, priority=PRIORITY_INTERACTIVE):
         """دریافت قیمت لحظهای"""
         try:
-            ticker = self.exchange.fetch_ticker(symbol)
+            ticker = self.tickers.get(symbol)
+            if ticker is None or time.time() - ticker['updated'] > self.ticker_max_age:
+                ticker = self._request(priority, 'fetch_ticker', symbol)
             return {
                 'symbol': symbol,
                 'price': ticker.get('last', 0),
@@ -125,14 +867,88 @@ class ExchangeManager:
         except:
             return None
 
-    def get_all_tickers(self):
-        """دریافت همه قیمتها"""
+    def supports_bulk_tickers(self):
+        """تیکر همه ارزها با یک درخواست (fetch_tickers یا لیست قراردادها) ممکن است"""
+        if self.exchange.has.get('fetchTickers'):
+            return True
+        return any(_info_number(market.get('info') or {}, LAST_PRICE_FIELDS) is not None
+                   for market in (self.exchange.markets or {}).values())
+
+    def _market_tickers(self, priority):
+        """تیکر همه ارزها از لیست قراردادها در یک درخواست (برای صرافیهای بدون fetch_tickers)"""
+        self._request(priority, 'load_markets', True)
+        tickers = {}
+        for symbol, market in self.exchange.markets.items():
+            info = market.get('info') or {}
+            last = _info_number(info, LAST_PRICE_FIELDS)
+            if last is None:
+                continue
+            change = _info_number(info, ('priceChgPct',))
+            tickers[symbol] = {
+                'symbol': symbol,
+                'last': last,
+                'quoteVolume': _info_number(info, QUOTE_VOLUME_FIELDS),
+                'percentage': change * 100 if change is not None else None,
+                'info': info
+            }
+        return tickers
+
+    def get_all_tickers(self, priority=PRIORITY_SCAN):
+        """دریافت همه قیمتها (یک درخواست)"""
         try:
-            tickers = self.exchange.fetch_tickers()
+            if self.exchange.has.get('fetchTickers'):
+                tickers = self._request(priority, 'fetch_tickers')
+            else:
+                tickers = self._market_tickers(priority)
+            self.bulk_tickers = tickers
+            self.bulk_tickers_time = time.time()
             return tickers
-        except:
+        except Exception as e:
+            print(f"❌ Error fetching tickers: {e}")
             return {}
 
+    def refresh_derivatives(self, symbols=None, max_ticker_age=60, priority=PRIORITY_SCAN):
+        """
+        یک snapshot از funding / open interest همه ارزها با حداکثر دو درخواست دستهای:
+        fetch_funding_rates (در صورت پشتیبانی) و info تیکرها (اگر پاسخ تازه اسکرینر نباشد؛
+        در صرافیهای بدون fetch_tickers از لیست قراردادها)؛ هیچ درخواست تک ارزی ارسال نمیشود
+        """
+        symbols = symbols or self.symbols
+        allowed = set(symbols)
+        funding, open_interest = {}, {}
+        requests = 0
+        has = getattr(self.exchange, 'has', {})
+
+        if has.get('fetchFundingRates'):
+            try:
+                requests += 1
+                for symbol, rate in self._request(priority, 'fetch_funding_rates', symbols).items():
+                    if symbol in allowed:
+                        funding[symbol] = rate.get('fundingRate')
+                        open_interest[symbol] = _info_number(rate.get('info') or {}, OPEN_INTEREST_FIELDS)
+            except Exception as e:
+                print(f"❌ Error fetching funding rates: {e}")
+
+        # info تیکرها (یا قراردادها در صرافیهای بدون fetch_tickers)؛ پاسخ تازه اسکرینر دوباره استفاده میشود
+        tickers = self.bulk_tickers
+        if time.time() - self.bulk_tickers_time > max_ticker_age:
+            requests += 1
+            tickers = self.get_all_tickers(priority)
+        for symbol, ticker in tickers.items():
+            if symbol in allowed:
+                info = ticker.get('info') or {}
+                if funding.get(symbol) is None:
+                    funding[symbol] = _info_number(info, FUNDING_FIELDS)
+                if open_interest.get(symbol) is None:
+                    open_interest[symbol] = _info_number(info, OPEN_INTEREST_FIELDS)
+
+        rows = {symbol: (funding.get(symbol), open_interest.get(symbol))
+                for symbol in allowed & (funding.keys() | open_interest.keys())}
+        self.derivatives.requests += requests
+        if rows:
+            self.derivatives.update(time.time(), rows)
+        return len(rows)
+
     def get_top_movers(self, limit=20):
         """برترین تغییرات قیمت"""
         try:
@@ -158,4 +974,8 @@ class ExchangeManager:
             return {'gainers': [], 'losers': []}
 
 # نمونه گلوبال
-exchange_manager = ExchangeManager('kucoin')
+exchange_manager = ExchangeManager(
+    'kucoin',
+    base_timeframe=os.environ.get('BASE_TIMEFRAME'),
+    order_book_symbols=[s for s in os.environ.get('ORDER_BOOK_SYMBOLS', '').split(',') if s]
+)
@@ -3,13 +3,296 @@
 """
 import sqlite3
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import atexit
 import json
+import queue
 import threading
+import time
+
+# کلید طبیعی سیگنال: (exchange, symbol, timeframe, type, candle_ts)
+# یک سیگنال روی یک کندل در اسکنهای بعدی دوباره ذخیره یا ارسال نمیشود
+SIGNAL_KEY_INDEXES = {
+    'signals': ('idx_signals_natural_key', 'signal_type'),
+    'pump_dump_alerts': ('idx_pump_dump_natural_key', 'alert_type')
+}
+
+def signal_key(signal_data):
+    """کلید طبیعی یک سیگنال یا هشدار پامپ/دامپ"""
+    return (
+        signal_data.get('exchange'),
+        signal_data.get('symbol'),
+        signal_data.get('timeframe'),
+        signal_data.get('type') or signal_data.get('alert_type'),
+        signal_data.get('candle_ts')
+    )
+
+class SeenKeys:
+    """مجموعه کلیدهای دیده شده با اندازه محدود (قدیمیترین کلیدها حذف میشوند)"""
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.keys
+
+    def add(self, key):
+        with self.lock:
+            self.keys[key] = None
+            self.keys.move_to_end(key)
+            while len(self.keys) > self.capacity:
+                self.keys.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.keys.pop(key, None)
+
+    def claim(self, key):
+        """اضافه کردن کلید؛ False اگر قبلا بوده (بررسی و افزودن اتمیک)"""
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.keys[key] = None
+            while len(self.keys) > self.capacity:
+                self.keys.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self.keys)
+
+INSERT_SQL = {
+    'signals': '''
+        INSERT INTO signals
+        (symbol, signal_type, direction, entry_price, target_price,
+         stop_loss, strength, reason, indicator_data,
+         exchange, timeframe, candle_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
+    ''',
+    'pump_dump_alerts': '''
+        INSERT INTO pump_dump_alerts
+        (symbol, alert_type, price_at_alert, volume_change,
+         price_change, strength, exchange, timeframe, candle_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
+    '''
+}
+
+class SignalWriter:
+    """
+    نوشتن با تاخیر (write-behind): ردیفها در صف و یک thread نویسنده آنها را
+    هر batch_size ردیف یا هر interval ثانیه با executemany در یک تراکنش مینویسد
+    صف پر: put تا put_timeout ثانیه منتظر میماند (backpressure) و بعد ردیف دور ریخته میشود
+    کلید ردیفهای دور ریخته یا ناموفق از SeenKeys حذف میشود تا در اسکن بعدی دوباره ذخیره شوند
+    """
+
+    def __init__(self, db, max_queue=20000, batch_size=1000, interval=0.5, put_timeout=5.0):
+        self.db = db
+        self.queue = queue.Queue(max_queue)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.put_timeout = put_timeout
+        self.thread = None
+        self.start_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.running = False
+        self.registered = False
+
+        self.queued = 0
+        self.written = 0
+        self.conflicts = 0
+        self.dropped = 0
+        self.batches = 0
+        self.blocked = 0
+        self.flush_seconds = 0.0
+        self.errors = 0
+        self.failed = 0
+        self.last_error = None
+
+    def start(self):
+        with self.start_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.running = True
+                self.thread = threading.Thread(target=self._run, name='signal-writer', daemon=True)
+                self.thread.start()
+                if not self.registered:
+                    atexit.register(self.stop)
+                    self.registered = True
+        return self
+
+    def put(self, table, key, row):
+        """اضافه کردن یک ردیف با کلید طبیعی آن؛ False اگر صف تا put_timeout پر ماند"""
+        if self.thread is None or not self.thread.is_alive():
+            self.start()
+        item = (table, key, row)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self.lock:
+                self.blocked += 1
+            try:
+                self.queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                with self.lock:
+                    self.dropped += 1
+                self.db.seen[table].discard(key)
+                print(f"⚠️ Signal writer queue full, dropped {table} row")
+                return False
+        with self.lock:
+            self.queued += 1
+        return True
+
+    def _collect(self):
+        """انتظار برای اولین ردیف و جمع کردن بقیه تا batch_size یا پایان interval"""
+        try:
+            batch = [self.queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _insert(self, batch):
+        """
+        درج batch در یک تراکنش (یک executemany برای هر جدول)
+        اگر یک ردیف خراب باشد batch ردیف به ردیف دوباره درج میشود؛ در sqlite خطای
+        یک دستور فقط همان دستور را برمیگرداند پس بقیه ردیفها در همان تراکنش میمانند
+        خطای قفل یا دیسک (OperationalError) به ردیف مربوط نیست و بالا فرستاده میشود
+        خروجی: (تعداد ردیفهای درج شده، لیست (item, خطا) ردیفهای خراب)
+        """
+        tables = {}
+        for table, _, row in batch:
+            tables.setdefault(table, []).append(row)
+
+        with self.db.lock:
+            conn = self.db.get_connection()
+            try:
+                before = conn.total_changes
+                try:
+                    with conn:
+                        for table, rows in tables.items():
+                            conn.executemany(INSERT_SQL[table], rows)
+                    return conn.total_changes - before, []
+                except sqlite3.OperationalError:
+                    raise
+                except sqlite3.Error:
+                    pass
+
+                failed = []
+                before = conn.total_changes
+                with conn:
+                    for item in batch:
+                        try:
+                            conn.execute(INSERT_SQL[item[0]], item[2])
+                        except sqlite3.OperationalError:
+                            raise
+                        except sqlite3.Error as e:
+                            failed.append((item, e))
+                return conn.total_changes - before, failed
+            finally:
+                conn.close()
+
+    def _write(self, batch):
+        """نوشتن یک batch؛ خطای قفل/دیسک یک بار دیگر امتحان میشود"""
+        started = time.perf_counter()
+        inserted, failed, error = 0, [], None
+        try:
+            for attempt in range(2):
+                try:
+                    inserted, failed = self._insert(batch)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                    if attempt == 0:
+                        time.sleep(self.interval)
+
+            if error is not None:
+                print(f"❌ Signal writer error ({len(batch)} rows): {error}")
+                failed = [(item, error) for item in batch]
+            for item, e in failed:
+                if error is None:
+                    print(f"❌ Signal writer rejected {item[0]} row {item[1]}: {e}")
+                # ردیف ذخیره نشده؛ این سیگنال دوباره قابل ذخیره است
+                self.db.seen[item[0]].discard(item[1])
+        finally:
+            with self.lock:
+                if failed:
+                    self.errors += 1
+                    last = error if error is not None else failed[-1][1]
+                    self.last_error = f"{type(last).__name__}: {last}"
+                    self.failed += len(failed)
+                # کلیدهایی که در دیتابیس بودند ولی در کش حافظه نه
+                self.conflicts += len(batch) - len(failed) - inserted
+                self.written += inserted
+                self.batches += 1
+                self.flush_seconds += time.perf_counter() - started
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self):
+        """انتظار تا نوشته شدن همه ردیفهای صف"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def stop(self):
+        """توقف thread و نوشتن باقیمانده صف (در خروج برنامه هم صدا زده میشود)"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+
+    def stats(self):
+        with self.lock:
+            return {
+                'queue': self.queue.qsize(),
+                'queued': self.queued,
+                'written': self.written,
+                'conflicts': self.conflicts,
+                'dropped': self.dropped,
+                'blocked': self.blocked,
+                'batches': self.batches,
+                'avg_batch_ms': round(self.flush_seconds * 1000 / self.batches, 2) if self.batches else 0,
+                'errors': self.errors,
+                'failed': self.failed,
+                'last_error': self.last_error
+            }
 
 class SignalDatabase:
     def __init__(self, db_path='signals.db'):
         self.db_path = db_path
         self.lock = threading.Lock()
+        self.seen = {table: SeenKeys() for table in SIGNAL_KEY_INDEXES}
+        self.duplicates = 0
+        # سیگنالها و هشدارها با تاخیر و دستهای نوشته میشوند
+        self.writer = SignalWriter(self)
         self.init_db()
 
     def get_connection(self):
@@ -18,9 +301,13 @@ class SignalDatabase:
         return conn
 
     def init_db(self):
+        # ردیفهای صف شده مال دیتابیس قبلی هستند
+        self.writer.flush()
         with self.lock:
             conn = self.get_connection()
             cursor = conn.cursor()
+            # خوانندهها نویسنده را متوقف نمیکنند
+            cursor.execute('PRAGMA journal_mode=WAL')
 
             # جدول سیگنالها
             cursor.execute('''
@@ -41,7 +328,10 @@ class SignalDatabase:
                     validation_result TEXT,
                     final_price REAL,
                     profit_loss REAL,
-                    closed_at TIMESTAMP
+                    closed_at TIMESTAMP,
+                    exchange TEXT,
+                    timeframe TEXT,
+                    candle_ts INTEGER
                 )
             ''')
 
@@ -73,7 +363,10 @@ class SignalDatabase:
                     validated INTEGER DEFAULT 0,
                     validation_data TEXT,
                     peak_price REAL,
-                    final_move REAL
+                    final_move REAL,
+                    exchange TEXT,
+                    timeframe TEXT,
+                    candle_ts INTEGER
                 )
             ''')
 
@@ -90,59 +383,107 @@ class SignalDatabase:
                 )
             ''')
 
+            self._migrate_natural_keys(cursor)
+            self._load_seen(cursor)
+
             conn.commit()
             conn.close()
 
-    def save_signal(self, signal_data):
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+    def _migrate_natural_keys(self, cursor):
+        """افزودن ستونهای کلید طبیعی به دیتابیسهای قدیمی و ساخت ایندکس یکتا"""
+        for table, (index, type_column) in SIGNAL_KEY_INDEXES.items():
+            columns = {row['name'] for row in cursor.execute(f'PRAGMA table_info({table})')}
+            for column, column_type in (('exchange', 'TEXT'), ('timeframe', 'TEXT'), ('candle_ts', 'INTEGER')):
+                if column not in columns:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
+            # ردیفهای قدیمی candle_ts ندارند (NULL در ایندکس یکتا تکراری حساب نمیشود)
+            cursor.execute(f'''
+                CREATE UNIQUE INDEX IF NOT EXISTS {index}
+                ON {table} (exchange, symbol, timeframe, {type_column}, candle_ts)
+            ''')
 
-            cursor.execute('''
-                INSERT INTO signals
-                (symbol, signal_type, direction, entry_price, target_price,
-                 stop_loss, strength, reason, indicator_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                signal_data.get('symbol'),
-                signal_data.get('type', 'UNKNOWN'),
-                signal_data.get('signal', 'NEUTRAL'),
-                signal_data.get('price', 0),
-                signal_data.get('target'),
-                signal_data.get('stop_loss'),
-                signal_data.get('strength', 50),
-                signal_data.get('reason', ''),
-                json.dumps(signal_data.get('indicators', {}))
-            ))
-
-            signal_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return signal_id
+    def _load_seen(self, cursor):
+        """کلیدهای آخرین ردیفهای دیتابیس؛ تشخیص تکراری بعد از ری استارت هم بدون خواندن دیسک"""
+        for table, (_, type_column) in SIGNAL_KEY_INDEXES.items():
+            seen = self.seen[table] = SeenKeys(self.seen[table].capacity)
+            rows = cursor.execute(f'''
+                SELECT exchange, symbol, timeframe, {type_column}, candle_ts FROM {table}
+                WHERE candle_ts IS NOT NULL ORDER BY id DESC LIMIT ?
+            ''', (seen.capacity,)).fetchall()
+            for row in reversed(rows):
+                seen.add(tuple(row))
+
+    def _claim(self, table, signal_data):
+        """
+        کلید طبیعی اگر سیگنال جدید است؛ None برای تکراری
+        بدون candle_ts تکراری حساب نمیشود (مثل NULL در ایندکس یکتا)
+        """
+        key = signal_key(signal_data)
+        if key[-1] is None:
+            return key
+        if not self.seen[table].claim(key):
+            self.duplicates += 1
+            return None
+        return key
+
+    @staticmethod
+    def _indicator_data(signal_data):
+        """اندیکاتورها به همراه معیارهای مشتقات (funding / OI) در صورت وجود"""
+        data = signal_data.get('indicators', {})
+        if signal_data.get('derivatives'):
+            data = {**data, 'derivatives': signal_data['derivatives']}
+        return data
 
-    def save_pump_dump(self, alert_data):
-        with self.lock:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+    def save_signal(self, signal_data):
+        """
+        صف کردن سیگنال برای نوشتن دستهای (بدون انتظار برای دیسک)
+        خروجی: کلید طبیعی signal_key یعنی تاپل (exchange, symbol, timeframe, type, candle_ts) اگر در صف رفت؛
+        None اگر همین سیگنال روی همین کندل قبلا ذخیره شده باشد یا صف پر بماند
+        (قبلا id ردیف برگردانده میشد؛ ردیف بعدا نوشته میشود پس id در این لحظه وجود ندارد)
+        """
+        key = self._claim('signals', signal_data)
+        if key is None:
+            return None
+
+        stored = self.writer.put('signals', key, (
+            signal_data.get('symbol'),
+            signal_data.get('type') or signal_data.get('alert_type') or 'UNKNOWN',
+            signal_data.get('signal', 'NEUTRAL'),
+            signal_data.get('price', 0),
+            signal_data.get('target'),
+            signal_data.get('stop_loss'),
+            signal_data.get('strength', 50),
+            signal_data.get('reason', ''),
+            json.dumps(self._indicator_data(signal_data)),
+            signal_data.get('exchange'),
+            signal_data.get('timeframe'),
+            signal_data.get('candle_ts')
+        ))
+        return key if stored else None
 
-            cursor.execute('''
-                INSERT INTO pump_dump_alerts
-                (symbol, alert_type, price_at_alert, volume_change,
-                 price_change, strength)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                alert_data.get('symbol'),
-                alert_data.get('alert_type'),
-                alert_data.get('price', 0),
-                alert_data.get('volume_change', 0),
-                alert_data.get('price_change', 0),
-                alert_data.get('strength', 50)
-            ))
-
-            alert_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return alert_id
+    def save_pump_dump(self, alert_data):
+        """صف کردن هشدار پامپ/دامپ؛ خروجی مثل save_signal: کلید طبیعی، یا None اگر تکراری یا دور ریخته شد"""
+        key = self._claim('pump_dump_alerts', alert_data)
+        if key is None:
+            return None
+
+        stored = self.writer.put('pump_dump_alerts', key, (
+            alert_data.get('symbol'),
+            alert_data.get('alert_type'),
+            alert_data.get('price', 0),
+            alert_data.get('volume_change', 0),
+            alert_data.get('price_change', 0),
+            alert_data.get('strength', 50),
+            alert_data.get('exchange'),
+            alert_data.get('timeframe'),
+            alert_data.get('candle_ts')
+        ))
+        return key if stored else None
+
+    def flush(self):
+        """انتظار تا نوشته شدن سیگنالهای صف شده"""
+        self.writer.flush()
 
     def get_active_signals(self, limit=100):
         conn = self.get_connection()
@@ -250,6 +591,9 @@ class SignalDatabase:
         ''', (today,))
 
         stats['today_signals'] = cursor.fetchone()['today_signals']
+        stats['writer'] = self.writer.stats()
+        # تکراری در کش حافظه + تکراری که فقط دیتابیس میشناخت
+        stats['duplicates_skipped'] = self.duplicates + stats['writer']['conflicts']
 
         conn.close()
         return stats
@@ -0,0 +1,159 @@
+"""
+ثبت دتکتورهای سیگنال (signals.py و indicators.py) با نام، ورودیها و پارامترهای پیشفرض
+هر دتکتور جدا زمانگیری و اجرا میشود؛ خطای یک دتکتور بقیه سیگنالهای ارز را از بین نمیبرد
+"""
+import inspect
+import threading
+import time
+
+class Detector:
+    """یک دتکتور ثبت شده و آمار اجرای آن"""
+
+    __slots__ = ('name', 'fn', 'inputs', 'params', 'symbol', 'order', 'enabled',
+                 'calls', 'errors', 'signals', 'seconds', 'last_error')
+
+    def __init__(self, name, fn, inputs, params, symbol, order):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)   # ستونهای اندیکاتور لازم (برای محاسبه دستهای)
+        self.params = params          # پارامترهای پیشفرض (قابل تغییر در زمان اجرا)
+        self.symbol = symbol          # دتکتور symbol را به عنوان ورودی دوم میگیرد
+        self.order = order
+        self.enabled = True
+        self.calls = 0
+        self.errors = 0
+        self.signals = 0
+        self.seconds = 0.0
+        self.last_error = None
+
+    def info(self):
+        return {
+            'name': self.name,
+            'enabled': self.enabled,
+            'inputs': list(self.inputs),
+            'params': dict(self.params),
+            'calls': self.calls,
+            'errors': self.errors,
+            'signals': self.signals,
+            'total_ms': round(self.seconds * 1000, 3),
+            'avg_ms': round(self.seconds * 1000 / self.calls, 4) if self.calls else 0,
+            'last_error': self.last_error
+        }
+
+
+class DetectorRegistry:
+    """
+    دتکتورها به ترتیب order (و سپس ترتیب ثبت) اجرا میشوند
+    ثبت با دکوراتور register؛ inputs اگر داده نشود از @requires خوانده میشود
+    """
+
+    def __init__(self):
+        self.detectors = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, inputs=None, params=None, symbol=False, order=100):
+        """دکوراتور ثبت؛ پارامترهای پیشفرض از امضای تابع (و params) گرفته میشوند"""
+        def decorator(fn):
+            defaults = {
+                key: parameter.default
+                for key, parameter in inspect.signature(fn).parameters.items()
+                if parameter.default is not inspect.Parameter.empty
+            }
+            defaults.update(params or {})
+            detector = Detector(name, fn, inputs if inputs is not None else getattr(fn, 'requires', ()),
+                                defaults, symbol, order)
+            with self.lock:
+                self.detectors[name] = detector
+            return fn
+        return decorator
+
+    def get(self, name):
+        detector = self.detectors.get(name)
+        if detector is None:
+            raise KeyError(name)
+        return detector
+
+    def ordered(self):
+        with self.lock:
+            detectors = list(self.detectors.values())
+        # sorted پایدار است؛ ترتیب ثبت برای order برابر حفظ میشود
+        return sorted(detectors, key=lambda detector: detector.order)
+
+    def set_enabled(self, name, enabled=True):
+        self.get(name).enabled = bool(enabled)
+
+    def set_params(self, name, **params):
+        """تغییر پارامترها (فقط پارامترهایی که دتکتور دارد)"""
+        detector = self.get(name)
+        unknown = set(params) - set(detector.params)
+        if unknown:
+            raise KeyError(', '.join(sorted(unknown)))
+        with self.lock:
+            detector.params = {**detector.params, **params}
+
+    def required_columns(self, names=None):
+        """ستونهای اندیکاتور لازم برای دتکتورهای فعال"""
+        columns = []
+        for detector in self.ordered():
+            if detector.enabled and (names is None or detector.name in names):
+                columns.extend(c for c in detector.inputs if c not in columns)
+        return columns
+
+    def run(self, detector, candles, symbol):
+        """اجرای یک دتکتور با زمانگیری؛ در صورت خطا لیست خالی"""
+        started = time.perf_counter()
+        error = None
+        try:
+            if detector.symbol:
+                signals = detector.fn(candles, symbol, **detector.params)
+            else:
+                signals = detector.fn(candles, **detector.params)
+        except Exception as e:
+            signals = []
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            detector.calls += 1
+            detector.seconds += elapsed
+            detector.signals += len(signals)
+            if error is not None:
+                detector.errors += 1
+                # هر خطای تازه یک بار چاپ میشود
+                if error != detector.last_error:
+                    print(f"Error in detector {detector.name} ({symbol}): {error}")
+                detector.last_error = error
+        return signals
+
+    def stats(self):
+        return [detector.info() for detector in self.ordered()]
+
+    def snapshot(self):
+        """آمار خام برای ارسال از پردازه کارگر"""
+        with self.lock:
+            return {name: (d.calls, d.errors, d.signals, d.seconds, d.last_error)
+                    for name, d in self.detectors.items()}
+
+    def merge(self, snapshot):
+        """افزودن آمار یک پردازه کارگر"""
+        with self.lock:
+            for name, (calls, errors, signals, seconds, last_error) in snapshot.items():
+                detector = self.detectors.get(name)
+                if detector is None:
+                    continue
+                detector.calls += calls
+                detector.errors += errors
+                detector.signals += signals
+                detector.seconds += seconds
+                if last_error is not None:
+                    detector.last_error = last_error
+
+    def reset_stats(self):
+        with self.lock:
+            for detector in self.detectors.values():
+                detector.calls = detector.errors = detector.signals = 0
+                detector.seconds = 0.0
+                detector.last_error = None
+
+# نمونه گلوبال
+detector_registry = DetectorRegistry()
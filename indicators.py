@@ -2,232 +2,891 @@
 محاسبه اندیکاتورهای تکنیکال
 MA, EMA, RSI, MACD, Bollinger Bands, ATR, UT Bot Alert
 """
+import threading
 import pandas as pd
 import numpy as np
-from ta.trend import EMAIndicator, SMAIndicator, MACD
-from ta.momentum import RSIIndicator, StochasticOscillator
-from ta.volatility import BollingerBands, AverageTrueRange
+from candles import Candles, as_candles
+from detector_registry import detector_registry
+
+# جفت خطهای تقاطع: golden/death = (type, signal, strength, reason)
+CROSS_PAIRS = [
+    {
+        'fast': 'ema_9', 'slow': 'ema_21',
+        'golden': ('EMA_GOLDEN_CROSS', 'BUY', 75, '🔀 EMA 9/21 Golden Cross (BUY)'),
+        'death': ('EMA_DEATH_CROSS', 'SELL', 75, '🔀 EMA 9/21 Death Cross (SELL)')
+    },
+    {
+        'fast': 'ma_20', 'slow': 'ma_50',
+        'golden': ('MA_GOLDEN_CROSS', 'BUY', 85, '🌟 MA 20/50 Golden Cross (Strong BUY)'),
+        'death': ('MA_DEATH_CROSS', 'SELL', 85, '💀 MA 20/50 Death Cross (Strong SELL)')
+    }
+]
+
+def requires(*columns):
+    """اعلام ستونهای لازم یک دتکتور (از COLUMNS)؛ فقط همین زیرگراف محاسبه میشود"""
+    def decorate(fn):
+        fn.requires = columns
+        return fn
+    return decorate
 
 class TechnicalIndicators:
     """محاسبه تمام اندیکاتورها"""
 
     @staticmethod
-    def calculate_all(df):
-        """محاسبه همه اندیکاتورها"""
-        if len(df) < 50:
-            return df
+    def calculate_all(df, columns=None):
+        """
+        افزودن ستونهای اندیکاتور به DataFrame
+        columns: فقط همین ستونها (پیشفرض CALCULATE_ALL_COLUMNS)؛ مقدار تا پر شدن پنجره هر اندیکاتور NaN است
+        """
+        context = IndicatorContext.of(df)
+        if isinstance(df, Candles):
+            df = df.to_frame()
 
         df = df.copy()
 
-        # Moving Averages
-        df['ma_7'] = SMAIndicator(df['close'], window=7).sma_indicator()
-        df['ma_20'] = SMAIndicator(df['close'], window=20).sma_indicator()
-        df['ma_50'] = SMAIndicator(df['close'], window=50).sma_indicator()
-        df['ma_100'] = SMAIndicator(df['close'], window=100).sma_indicator()
-        df['ma_200'] = SMAIndicator(df['close'], window=200).sma_indicator()
-
-        # EMA
-        df['ema_9'] = EMAIndicator(df['close'], window=9).ema_indicator()
-        df['ema_12'] = EMAIndicator(df['close'], window=12).ema_indicator()
-        df['ema_21'] = EMAIndicator(df['close'], window=21).ema_indicator()
-        df['ema_26'] = EMAIndicator(df['close'], window=26).ema_indicator()
-        df['ema_50'] = EMAIndicator(df['close'], window=50).ema_indicator()
-
-        # RSI
-        df['rsi'] = RSIIndicator(df['close'], window=14).rsi()
-        df['rsi_7'] = RSIIndicator(df['close'], window=7).rsi()
-
-        # MACD
-        macd = MACD(df['close'])
-        df['macd'] = macd.macd()
-        df['macd_signal'] = macd.macd_signal()
-        df['macd_histogram'] = macd.macd_diff()
-
-        # Bollinger Bands
-        bb = BollingerBands(df['close'], window=20, window_dev=2)
-        df['bb_upper'] = bb.bollinger_hband()
-        df['bb_middle'] = bb.bollinger_mavg()
-        df['bb_lower'] = bb.bollinger_lband()
-        df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['bb_middle']
-
-        # ATR
-        atr = AverageTrueRange(df['high'], df['low'], df['close'], window=14)
-        df['atr'] = atr.average_true_range()
-        df['atr_percent'] = (df['atr'] / df['close']) * 100
-
-        # Stochastic
-        stoch = StochasticOscillator(df['high'], df['low'], df['close'])
-        df['stoch_k'] = stoch.stoch()
-        df['stoch_d'] = stoch.stoch_signal()
+        for name, values in context.require(columns or CALCULATE_ALL_COLUMNS).items():
+            df[name] = values
 
         return df
 
     @staticmethod
-    def ut_bot_alert(df, sensitivity=1, atr_period=10):
+    def true_range(high, low, close):
+        """True Range روی آرایهها (کندل اول: high - low)"""
+        prev_close = np.concatenate([[np.nan], close[:-1]])
+        return np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+    @staticmethod
+    def average_true_range(high, low, close, window=14):
+        """ATR وایلدر روی آرایهها؛ خروجی دقیقا برابر ta.AverageTrueRange"""
+        if len(close) < window:
+            return np.zeros(len(close))
+
+        true_range = TechnicalIndicators.true_range(high, low, close)
+        atr = [0.0] * len(close)
+        tr = true_range.tolist()
+        prev = atr[window - 1] = true_range[0:window].mean()
+        for i in range(window, len(tr)):
+            prev = atr[i] = (prev * (window - 1) + tr[i]) / float(window)
+
+        return np.array(atr, dtype=np.float64)
+
+    @staticmethod
+    def average_true_range_batch(high, low, close, window=14):
+        """ATR برای ماتریس (candles × symbols)؛ هر ستون برابر average_true_range همان ارز"""
+        if len(close) < window:
+            return np.zeros(close.shape)
+
+        prev_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+        true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+        atr = np.zeros(close.shape)
+        # میانگین روی محور پیوسته تا ترتیب جمع مثل حالت یک ارزی باشد
+        prev = atr[window - 1] = np.ascontiguousarray(true_range[:window].T).mean(axis=1)
+        for i in range(window, len(close)):
+            prev = atr[i] = (prev * (window - 1) + true_range[i]) / float(window)
+
+        return atr
+
+    @staticmethod
+    def leading_nan_rows(values):
         """
-        UT Bot Alert - مشابه تریدینگ ویو
+        تعداد سطرهای تمام NaN ابتدای ماتریس اگر NaN فقط همانجا باشد (مثلا ورودی macd_signal یا stoch_d)، وگرنه 0
+        pandas مقدار NaN را در پنجره و ewm نادیده میگیرد پس نتیجه بقیه سطرها همان مسیر سریع بدون NaN است
         """
-        if len(df) < atr_period + 10:
-            return df, []
+        missing = np.isnan(values)
+        if not missing.any():
+            return 0
+        full = missing.all(axis=1)
+        skip = len(full) if full.all() else int(np.argmin(full))
+        if skip == 0 or skip == len(values) or missing[skip:].any():
+            return 0
+        return skip
 
-        df = df.copy()
+    @staticmethod
+    def rolling_mean_batch(values, window):
+        """
+        rolling(window).mean() برای هر ستون ماتریس (candles × symbols)
+        همان الگوریتم pandas (جمع Kahan با حذف/اضافه) تا خروجی بیت به بیت یکسان باشد
+        """
+        skip = TechnicalIndicators.leading_nan_rows(values)
+        if skip:
+            out = np.full(values.shape, np.nan)
+            out[skip:] = TechnicalIndicators.rolling_mean_batch(values[skip:], window)
+            return out
+
+        n, m = values.shape
+        out = np.full((n, m), np.nan)
+        sum_x, comp_add, comp_remove = np.zeros(m), np.zeros(m), np.zeros(m)
+        nobs = np.zeros(m, dtype=np.int64)
+        neg_ct = np.zeros(m, dtype=np.int64)
+        same = np.zeros(m, dtype=np.int64)
+        prev_value = values[0].copy() if n else np.zeros(m)
+
+        if n and not np.isnan(values).any():
+            # مسیر سریع بدون NaN: فقط جمع Kahan در حلقه؛ شمارش منفیها و مقدار تکراری بعد از حلقه برداری
+            sums = np.empty((n, m))
+            for i in range(n):
+                if i >= window:
+                    y = -values[i - window] - comp_remove
+                    t = sum_x + y
+                    comp_remove = t - sum_x - y
+                    sum_x = t
+
+                y = values[i] - comp_add
+                t = sum_x + y
+                comp_add = t - sum_x - y
+                sum_x = t
+                sums[i] = sum_x
+
+            if n >= window:
+                negative = np.cumsum(np.signbit(values), axis=0)
+                neg_ct = negative[window - 1:].copy()
+                neg_ct[1:] -= negative[:n - window]
+                current = values[window - 1:]
+                result = sums[window - 1:] / window
+                result = np.where(TechnicalIndicators.run_length(values)[window - 1:] >= window, current,
+                                  np.where((neg_ct == 0) & (result < 0), 0.0,
+                                           np.where((neg_ct == window) & (result > 0), 0.0, result)))
+                out[window - 1:] = result
+            return out
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for i in range(n):
+                if i >= window:
+                    old = values[i - window]
+                    ok = ~np.isnan(old)
+                    nobs -= ok
+                    y = np.where(ok, -old - comp_remove, 0.0)
+                    t = sum_x + y
+                    comp_remove = np.where(ok, t - sum_x - y, comp_remove)
+                    sum_x = np.where(ok, t, sum_x)
+                    neg_ct -= ok & np.signbit(old)
+
+                val = values[i]
+                ok = ~np.isnan(val)
+                nobs += ok
+                y = np.where(ok, val - comp_add, 0.0)
+                t = sum_x + y
+                comp_add = np.where(ok, t - sum_x - y, comp_add)
+                sum_x = np.where(ok, t, sum_x)
+                neg_ct += ok & np.signbit(val)
+                same = np.where(ok, np.where(val == prev_value, same + 1, 1), same)
+                prev_value = np.where(ok, val, prev_value)
+
+                result = sum_x / nobs
+                result = np.where(same >= nobs, prev_value,
+                                  np.where((neg_ct == 0) & (result < 0), 0.0,
+                                           np.where((neg_ct == nobs) & (result > 0), 0.0, result)))
+                out[i] = np.where(nobs >= window, result, np.nan)
+
+        return out
 
-        # محاسبه ATR
-        atr = AverageTrueRange(df['high'], df['low'], df['close'], window=atr_period)
-        df['ut_atr'] = atr.average_true_range()
-        df['ut_nLoss'] = sensitivity * df['ut_atr']
-
-        # محاسبه Trailing Stop
-        df['ut_xATRTrailingStop'] = 0.0
-
-        for i in range(1, len(df)):
-            nLoss = df['ut_nLoss'].iloc[i]
-            prev_stop = df['ut_xATRTrailingStop'].iloc[i-1]
-            close = df['close'].iloc[i]
-            prev_close = df['close'].iloc[i-1]
-
-            if close > prev_stop and prev_close > prev_stop:
-                df.loc[df.index[i], 'ut_xATRTrailingStop'] = max(prev_stop, close - nLoss)
-            elif close < prev_stop and prev_close < prev_stop:
-                df.loc[df.index[i], 'ut_xATRTrailingStop'] = min(prev_stop, close + nLoss)
-            elif close > prev_stop:
-                df.loc[df.index[i], 'ut_xATRTrailingStop'] = close - nLoss
+    @staticmethod
+    def run_length(values):
+        """طول دنباله مقدار برابر تا هر سطر (برای هر ستون)؛ همان شمارنده same در pandas"""
+        n = len(values)
+        index = np.arange(n).reshape((n,) + (1,) * (values.ndim - 1))
+        start = np.zeros(values.shape, dtype=np.int64)
+        start[1:] = np.where(values[1:] != values[:-1], index[1:], 0)
+        np.maximum.accumulate(start, axis=0, out=start)
+        return index - start + 1
+
+    @staticmethod
+    def rolling_std_batch(values, window, ddof=0):
+        """rolling(window).std(ddof) برای هر ستون (Welford با جمع Kahan مثل pandas)"""
+        skip = TechnicalIndicators.leading_nan_rows(values)
+        if skip:
+            out = np.full(values.shape, np.nan)
+            out[skip:] = TechnicalIndicators.rolling_std_batch(values[skip:], window, ddof)
+            return out
+
+        n, m = values.shape
+        out = np.full((n, m), np.nan)
+        mean_x, ssqdm_x = np.zeros(m), np.zeros(m)
+        comp_add, comp_remove = np.zeros(m), np.zeros(m)
+
+        if n and window >= 2 and not np.isnan(values).any():
+            # مسیر سریع بدون NaN: nobs یکسان و اسکالر؛ شرط مقدار تکراری بعد از حلقه برداری
+            ssq = np.empty((n, m))
+            for i in range(n):
+                if i >= window:
+                    old = values[i - window]
+                    nobs = float(window - 1)
+                    prev_mean = mean_x - comp_remove
+                    y = old - comp_remove
+                    t = y - mean_x
+                    new_mean = mean_x - t / nobs
+                    ssqdm_x = ssqdm_x - (old - prev_mean) * (old - new_mean)
+                    comp_remove = t + mean_x - y
+                    mean_x = new_mean
+
+                val = values[i]
+                nobs = float(min(i + 1, window))
+                prev_mean = mean_x - comp_add
+                y = val - comp_add
+                t = y - mean_x
+                new_mean = mean_x + t / nobs
+                ssqdm_x = ssqdm_x + (val - prev_mean) * (val - new_mean)
+                comp_add = t + mean_x - y
+                mean_x = new_mean
+                ssq[i] = ssqdm_x
+
+            if n >= window and window > ddof:
+                variance = np.where(TechnicalIndicators.run_length(values)[window - 1:] >= window, 0.0,
+                                    ssq[window - 1:] / (window - ddof))
+                out[window - 1:] = np.sqrt(np.maximum(variance, 0.0))
+            return out
+
+        nobs = np.zeros(m)
+        same = np.zeros(m, dtype=np.int64)
+        prev_value = values[0].copy() if n else np.zeros(m)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for i in range(n):
+                if i >= window:
+                    old = values[i - window]
+                    ok = ~np.isnan(old)
+                    nobs = nobs - ok
+                    keep = ok & (nobs > 0)
+                    prev_mean = mean_x - comp_remove
+                    y = old - comp_remove
+                    t = y - mean_x
+                    new_mean = mean_x - t / nobs
+                    new_ssqdm = ssqdm_x - (old - prev_mean) * (old - new_mean)
+                    comp_remove = np.where(keep, t + mean_x - y, comp_remove)
+                    mean_x = np.where(keep, new_mean, np.where(ok, 0.0, mean_x))
+                    ssqdm_x = np.where(keep, new_ssqdm, np.where(ok, 0.0, ssqdm_x))
+
+                val = values[i]
+                ok = ~np.isnan(val)
+                nobs = nobs + ok
+                same = np.where(ok, np.where(val == prev_value, same + 1, 1), same)
+                prev_value = np.where(ok, val, prev_value)
+                prev_mean = mean_x - comp_add
+                y = val - comp_add
+                t = y - mean_x
+                new_mean = np.where(nobs > 0, mean_x + t / nobs, 0.0)
+                new_ssqdm = ssqdm_x + (val - prev_mean) * (val - new_mean)
+                comp_add = np.where(ok, t + mean_x - y, comp_add)
+                mean_x = np.where(ok, new_mean, mean_x)
+                ssqdm_x = np.where(ok, new_ssqdm, ssqdm_x)
+
+                variance = np.where((same >= nobs) | (nobs == 1), 0.0, ssqdm_x / (nobs - ddof))
+                out[i] = np.where((nobs >= window) & (nobs > ddof), np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+        return out
+
+    @staticmethod
+    def window_extreme(values, window, how='max'):
+        """
+        کمینه/بیشینه هر پنجره window تایی در O(n) (الگوریتم van Herk / Gil-Werman)
+        خروجی j اکسترمم values[j:j + window] است (طول n - window + 1)؛ آرایه دو بعدی روی محور 0
+        """
+        n = len(values)
+        if n < window:
+            return values[:0]
+
+        op = np.maximum if how == 'max' else np.minimum
+        fill = -np.inf if how == 'max' else np.inf
+        padded = np.concatenate([values, np.full(((-n) % window,) + values.shape[1:], fill)])
+        blocks = padded.reshape((-1, window) + values.shape[1:])
+        # بیشینه از ابتدای بلوک تا هر نقطه، و از هر نقطه تا انتهای بلوک
+        prefix = op.accumulate(blocks, axis=1).reshape(padded.shape)
+        suffix = op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+        return op(suffix[:n - window + 1], prefix[window - 1:n])
+
+    @staticmethod
+    def rolling_extreme_batch(values, window, how='min'):
+        """کمینه/بیشینه پنجره متحرک برای هر ستون (هر NaN در پنجره خروجی را NaN میکند)"""
+        out = np.full(values.shape, np.nan)
+        if len(values) >= window:
+            out[window - 1:] = TechnicalIndicators.window_extreme(values, window, how)
+        return out
+
+    @staticmethod
+    def ewm_mean_batch(values, com, min_periods):
+        """ewm(adjust=False).mean() برای هر ستون با همان الگوریتم pandas"""
+        skip = TechnicalIndicators.leading_nan_rows(values)
+        if skip:
+            out = np.full(values.shape, np.nan)
+            out[skip:] = TechnicalIndicators.ewm_mean_batch(values[skip:], com, min_periods)
+            return out
+
+        n, m = values.shape
+        out = np.full((n, m), np.nan)
+        if n == 0:
+            return out
+
+        alpha = 1.0 / (1.0 + com)
+        old_wt_factor = 1.0 - alpha
+        weighted = values[0].copy()
+
+        if not np.isnan(values).any():
+            # مسیر سریع بدون NaN: وزن قبلی همیشه old_wt_factor است
+            denominator = old_wt_factor + alpha
+            if min_periods <= 1:
+                out[0] = weighted
+            for i in range(1, n):
+                cur = values[i]
+                blended = (old_wt_factor * weighted + alpha * cur) / denominator
+                weighted = np.where(weighted != cur, blended, weighted)
+                if i + 1 >= min_periods:
+                    out[i] = weighted
+            return out
+
+        nobs = (~np.isnan(weighted)).astype(np.int64)
+        out[0] = np.where(nobs >= min_periods, weighted, np.nan)
+        old_wt = np.ones(m)
+
+        for i in range(1, n):
+            cur = values[i]
+            observed = ~np.isnan(cur)
+            nobs += observed
+            started = ~np.isnan(weighted)
+            old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+            blended = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+            weighted = np.where(started & observed & (weighted != cur), blended, weighted)
+            old_wt = np.where(started & observed, 1.0, old_wt)
+            weighted = np.where(~started & observed, cur, weighted)
+            out[i] = np.where(nobs >= min_periods, weighted, np.nan)
+
+        return out
+
+    @staticmethod
+    def prefill(candles_list, columns, min_batch=2):
+        """
+        محاسبه دستهای ستونها برای چند ارز (ارزهای هم طول در یک ماتریس)
+        بعد از آن دتکتورهای هر ارز مقادیر را از IndicatorContext خودش میخوانند
+        """
+        groups = {}
+        for candles in candles_list:
+            if not candles.empty:
+                groups.setdefault(len(candles), []).append(candles)
+
+        for members in groups.values():
+            if len(members) >= min_batch:
+                BatchContext(members).distribute(columns)
+
+    @staticmethod
+    def ut_trailing_stop(close, n_loss):
+        """
+        بازگشت ATR Trailing Stop روی آرایهها
+        (همان منطق تریدینگ ویو؛ حلقه روی لیست پایتون به جای iloc)
+        """
+        close = close.tolist()
+        n_loss = n_loss.tolist()
+        stop = [0.0] * len(close)
+        prev_stop = 0.0
+
+        for i in range(1, len(close)):
+            price = close[i]
+            prev_close = close[i-1]
+
+            if price > prev_stop and prev_close > prev_stop:
+                prev_stop = max(prev_stop, price - n_loss[i])
+            elif price < prev_stop and prev_close < prev_stop:
+                prev_stop = min(prev_stop, price + n_loss[i])
+            elif price > prev_stop:
+                prev_stop = price - n_loss[i]
             else:
-                df.loc[df.index[i], 'ut_xATRTrailingStop'] = close + nLoss
+                prev_stop = price + n_loss[i]
 
-        # تشخیص سیگنال
-        df['ut_pos'] = 0
-        df.loc[df['close'] > df['ut_xATRTrailingStop'], 'ut_pos'] = 1
-        df.loc[df['close'] < df['ut_xATRTrailingStop'], 'ut_pos'] = -1
+            stop[i] = prev_stop
 
-        # سیگنالهای ورود
-        df['ut_signal'] = df['ut_pos'].diff()
+        return np.array(stop, dtype=np.float64)
 
+    @staticmethod
+    def _ut_bot(candles, sensitivity, atr_period):
+        """آرایههای UT Bot: ATR، استاپ، موقعیت و اندیس تغییر موقعیت"""
+        atr = IndicatorContext.of(candles).get('atr', window=atr_period)
+        n_loss = sensitivity * atr
+        stop = TechnicalIndicators.ut_trailing_stop(candles.close, n_loss)
+
+        close = candles.close
+        pos = np.where(close > stop, 1, np.where(close < stop, -1, 0))
+        # فقط تغییر کامل 1- به 1 (خرید) یا 1 به 1- (فروش) سیگنال است
+        transitions = np.flatnonzero(np.abs(np.diff(pos)) == 2) + 1
+
+        return atr, n_loss, stop, pos, transitions
+
+    @staticmethod
+    def _ut_bot_alerts(candles, stop, pos, transitions):
         alerts = []
-        for i in range(1, len(df)):
-            if df['ut_signal'].iloc[i] == 2:  # Buy
+        close = candles.close
+
+        for i in transitions[-5:]:
+            i = int(i)
+            if pos[i] > pos[i-1]:  # Buy
                 alerts.append({
                     'index': i,
                     'type': 'UT_BOT_BUY',
                     'signal': 'BUY',
-                    'price': df['close'].iloc[i],
-                    'stop': df['ut_xATRTrailingStop'].iloc[i],
+                    'price': close[i],
+                    'stop': stop[i],
                     'strength': 80,
-                    'reason': f'📈 UT Bot Buy Signal (Stop: {df["ut_xATRTrailingStop"].iloc[i]:.4f})'
+                    'reason': f'📈 UT Bot Buy Signal (Stop: {stop[i]:.4f})'
                 })
-            elif df['ut_signal'].iloc[i] == -2:  # Sell
+            else:  # Sell
                 alerts.append({
                     'index': i,
                     'type': 'UT_BOT_SELL',
                     'signal': 'SELL',
-                    'price': df['close'].iloc[i],
-                    'stop': df['ut_xATRTrailingStop'].iloc[i],
+                    'price': close[i],
+                    'stop': stop[i],
                     'strength': 80,
-                    'reason': f'📉 UT Bot Sell Signal (Stop: {df["ut_xATRTrailingStop"].iloc[i]:.4f})'
+                    'reason': f'📉 UT Bot Sell Signal (Stop: {stop[i]:.4f})'
                 })
 
-        return df, alerts[-5:] if alerts else []
+        return alerts
 
     @staticmethod
-    def detect_ma_ema_cross(df):
-        """تشخیص تقاطع MA و EMA"""
-        if len(df) < 55:
+    @detector_registry.register('ut_bot', order=60)
+    @requires('ut_atr')
+    def ut_bot_signals(df, sensitivity=1, atr_period=10):
+        """فقط سیگنالهای UT Bot (بدون ساخت DataFrame)"""
+        if len(df) < atr_period + 10:
             return []
 
+        candles = as_candles(df)
+        _, _, stop, pos, transitions = TechnicalIndicators._ut_bot(candles, sensitivity, atr_period)
+        return TechnicalIndicators._ut_bot_alerts(candles, stop, pos, transitions)
+
+    @staticmethod
+    def ut_bot_alert(df, sensitivity=1, atr_period=10):
+        """
+        UT Bot Alert - مشابه تریدینگ ویو
+        """
+        if isinstance(df, Candles):
+            df = df.to_frame()
+
+        if len(df) < atr_period + 10:
+            return df, []
+
+        candles = as_candles(df)
+        atr, n_loss, stop, pos, transitions = TechnicalIndicators._ut_bot(candles, sensitivity, atr_period)
+
         df = df.copy()
+        df['ut_atr'] = atr
+        df['ut_nLoss'] = n_loss
+        df['ut_xATRTrailingStop'] = stop
+        df['ut_pos'] = pos.astype(np.int64)
+        df['ut_signal'] = df['ut_pos'].diff()
 
-        if 'ema_9' not in df.columns:
-            df = TechnicalIndicators.calculate_all(df)
+        return df, TechnicalIndicators._ut_bot_alerts(candles, stop, pos, transitions)
 
-        crosses = []
+    @staticmethod
+    def moving_average(candles, name):
+        """محاسبه یک خط ma_N یا ema_N (همان مقادیر calculate_all)"""
+        kind, window = name.rsplit('_', 1)
+        return IndicatorContext.of(candles).get('ema' if kind == 'ema' else 'sma', window=int(window))
 
-        # EMA 9/21 Cross
-        for i in range(1, len(df)):
-            # Golden Cross EMA
-            if (df['ema_9'].iloc[i] > df['ema_21'].iloc[i] and
-                df['ema_9'].iloc[i-1] <= df['ema_21'].iloc[i-1]):
-                crosses.append({
-                    'index': i,
-                    'type': 'EMA_GOLDEN_CROSS',
-                    'signal': 'BUY',
-                    'strength': 75,
-                    'price': df['close'].iloc[i],
-                    'reason': '🔀 EMA 9/21 Golden Cross (BUY)'
-                })
+    @staticmethod
+    def find_crosses(fast, slow, tail=None):
+        """
+        تقاطع دو خط با تغییر علامت fast - slow
+        خروجی: (اندیس golden ها، اندیس death ها)؛ با tail فقط همان چند کندل آخر بررسی میشود
+        """
+        start = 1 if tail is None else max(len(fast) - tail, 1)
+        fast_now, slow_now = fast[start:], slow[start:]
+        fast_prev, slow_prev = fast[start - 1:-1], slow[start - 1:-1]
 
-            # Death Cross EMA
-            elif (df['ema_9'].iloc[i] < df['ema_21'].iloc[i] and
-                  df['ema_9'].iloc[i-1] >= df['ema_21'].iloc[i-1]):
-                crosses.append({
-                    'index': i,
-                    'type': 'EMA_DEATH_CROSS',
-                    'signal': 'SELL',
-                    'strength': 75,
-                    'price': df['close'].iloc[i],
-                    'reason': '🔀 EMA 9/21 Death Cross (SELL)'
-                })
+        golden = (fast_now > slow_now) & (fast_prev <= slow_prev)
+        death = (fast_now < slow_now) & (fast_prev >= slow_prev)
+        return np.flatnonzero(golden) + start, np.flatnonzero(death) + start
+
+    @staticmethod
+    @detector_registry.register('ma_cross', order=70)
+    @requires('ema_9', 'ema_21', 'ma_20', 'ma_50')
+    def detect_ma_ema_cross(df, pairs=None, tail=None, limit=10):
+        """
+        تشخیص تقاطع MA و EMA
+        pairs: لیست جفت خطها (پیشفرض CROSS_PAIRS)؛ tail: فقط تقاطعهای چند کندل آخر
+        """
+        if len(df) < 55:
+            return []
+
+        pairs = pairs or CROSS_PAIRS
+        columns = df.columns if isinstance(df, pd.DataFrame) else ()
+        candles = as_candles(df)
+        close = candles.close
+        lines = {}
+
+        def line(name):
+            if name not in lines:
+                lines[name] = df[name].to_numpy() if name in columns else \
+                    TechnicalIndicators.moving_average(candles, name)
+            return lines[name]
+
+        events = []
+        for order, pair in enumerate(pairs):
+            golden, death = TechnicalIndicators.find_crosses(line(pair['fast']), line(pair['slow']), tail)
+            events.extend((int(i), order, pair['golden']) for i in golden)
+            events.extend((int(i), order, pair['death']) for i in death)
+
+        events.sort(key=lambda event: event[:2])
 
-            # MA 20/50 Cross
-            if pd.notna(df['ma_50'].iloc[i]) and pd.notna(df['ma_50'].iloc[i-1]):
-                if (df['ma_20'].iloc[i] > df['ma_50'].iloc[i] and
-                    df['ma_20'].iloc[i-1] <= df['ma_50'].iloc[i-1]):
-                    crosses.append({
-                        'index': i,
-                        'type': 'MA_GOLDEN_CROSS',
-                        'signal': 'BUY',
-                        'strength': 85,
-                        'price': df['close'].iloc[i],
-                        'reason': '🌟 MA 20/50 Golden Cross (Strong BUY)'
-                    })
-
-                elif (df['ma_20'].iloc[i] < df['ma_50'].iloc[i] and
-                      df['ma_20'].iloc[i-1] >= df['ma_50'].iloc[i-1]):
-                    crosses.append({
-                        'index': i,
-                        'type': 'MA_DEATH_CROSS',
-                        'signal': 'SELL',
-                        'strength': 85,
-                        'price': df['close'].iloc[i],
-                        'reason': '💀 MA 20/50 Death Cross (Strong SELL)'
-                    })
-
-        return crosses[-10:] if crosses else []
-
-    @staticmethod
-    def get_indicator_summary(df):
-        """خلاصه وضعیت اندیکاتورها"""
-        if len(df) < 50:
+        crosses = []
+        for i, _, (cross_type, signal, strength, reason) in events[-limit:]:
+            crosses.append({
+                'index': i,
+                'type': cross_type,
+                'signal': signal,
+                'strength': strength,
+                'price': close[i],
+                'reason': reason
+            })
+
+        return crosses
+
+    @staticmethod
+    def get_indicator_summary(df, fields=None):
+        """خلاصه وضعیت اندیکاتورها (فقط ستونهای لازم fields محاسبه میشوند)"""
+        if len(df) == 0:
             return {}
 
-        df = TechnicalIndicators.calculate_all(df)
-        latest = df.iloc[-1]
-
-        summary = {
-            'price': latest['close'],
-            'rsi': round(latest['rsi'], 2) if pd.notna(latest['rsi']) else None,
-            'macd': round(latest['macd'], 6) if pd.notna(latest['macd']) else None,
-            'macd_signal': round(latest['macd_signal'], 6) if pd.notna(latest['macd_signal']) else None,
-            'bb_position': None,
-            'ma_trend': None,
-            'atr_percent': round(latest['atr_percent'], 2) if pd.notna(latest['atr_percent']) else None
-        }
+        fields = fields or tuple(SUMMARY_FIELDS)
+        columns = {column for field in fields for column in SUMMARY_FIELDS[field]}
+        values = IndicatorContext.of(df).require(columns)
+        latest = {name: series[-1] for name, series in values.items()}
+        return TechnicalIndicators.summarize(latest, fields)
+
+    @staticmethod
+    def summarize(latest, fields=None):
+        """خلاصه از مقادیر آخرین کندل (سطر calculate_all یا IndicatorState.values)"""
+        def rounded(name, digits):
+            return round(latest[name], digits) if pd.notna(latest[name]) else None
+
+        summary = {}
+        for field in fields or SUMMARY_FIELDS:
+            if field == 'price':
+                summary[field] = latest['close']
+            elif field in ('rsi', 'atr_percent'):
+                summary[field] = rounded(field, 2)
+            elif field in ('macd', 'macd_signal'):
+                summary[field] = rounded(field, 6)
+            elif field == 'bb_position':
+                summary[field] = TechnicalIndicators._bb_position(latest)
+            elif field == 'ma_trend':
+                summary[field] = TechnicalIndicators._ma_trend(latest)
+
+        return summary
 
-        # موقعیت در بولینگر
+    @staticmethod
+    def _bb_position(latest):
+        """موقعیت در بولینگر"""
         if pd.notna(latest['bb_upper']) and pd.notna(latest['bb_lower']):
             bb_range = latest['bb_upper'] - latest['bb_lower']
             if bb_range > 0:
                 bb_pos = (latest['close'] - latest['bb_lower']) / bb_range * 100
-                summary['bb_position'] = round(bb_pos, 1)
+                return round(bb_pos, 1)
+        return None
 
-        # ترند MA
+    @staticmethod
+    def _ma_trend(latest):
+        """ترند MA"""
         if pd.notna(latest['ma_20']) and pd.notna(latest['ma_50']):
             if latest['close'] > latest['ma_20'] > latest['ma_50']:
-                summary['ma_trend'] = 'BULLISH'
+                return 'BULLISH'
             elif latest['close'] < latest['ma_20'] < latest['ma_50']:
-                summary['ma_trend'] = 'BEARISH'
+                return 'BEARISH'
             else:
-                summary['ma_trend'] = 'NEUTRAL'
+                return 'NEUTRAL'
+        return None
+
+class IndicatorContext:
+    """
+    کش اندیکاتورهای یک snapshot از کندلها
+    هر سری با کلید (name, params) فقط یک بار محاسبه میشود و بین دتکتورها و خلاصه مشترک است
+    """
+
+    # شمارنده hit/miss به تفکیک اندیکاتور؛ هر thread دیکشنری خودش را دارد (get بدون قفل)
+    # و stats همه را جمع میزند
+    tallies = []
+    tallies_lock = threading.Lock()
+    local = threading.local()
+
+    def __init__(self, candles):
+        self.candles = candles
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def of(cls, data):
+        """context همان Candles (برای DataFrame یک Candles جدید ساخته میشود)"""
+        candles = as_candles(data)
+        if candles._context is None:
+            candles._context = cls(candles)
+        return candles._context
 
-        return summary
+    @staticmethod
+    def key(name, params):
+        return (name, tuple(sorted(params.items())))
+
+    def get(self, name, **params):
+        """سری اندیکاتور (آرایه فقط خواندنی)"""
+        key = self.key(name, params)
+        value = self.values.get(key)
+        hit = value is not None
+
+        if not hit:
+            value = np.asarray(getattr(self, '_' + name)(**params), dtype=np.float64)
+            value.flags.writeable = False
+            self.values[key] = value
+
+        self._count(name, hit)
+        return value
+
+    def column(self, name):
+        """ستون نامدار از COLUMNS (یا ستون خام open/high/low/close/volume)"""
+        if name in COLUMNS:
+            indicator, params = COLUMNS[name]
+            return self.get(indicator, **params)
+        return self._array(name)
+
+    def require(self, columns):
+        """محاسبه فقط ستونهای خواسته شده و وابستگیهایشان"""
+        return {name: self.column(name) for name in columns}
+
+    def _count(self, name, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        tally = getattr(IndicatorContext.local, 'tally', None)
+        if tally is None:
+            tally = IndicatorContext.local.tally = {}
+            with IndicatorContext.tallies_lock:
+                IndicatorContext.tallies.append(tally)
+        counts = tally.get(name)
+        if counts is None:
+            counts = tally[name] = [0, 0]
+        counts[0 if hit else 1] += 1
+
+    @classmethod
+    def stats(cls):
+        """تعداد hit/miss از شروع برنامه (جمع شمارندههای همه thread ها)"""
+        totals = {}
+        with cls.tallies_lock:
+            tallies = list(cls.tallies)
+        for tally in tallies:
+            for name, (h, m) in list(tally.items()):
+                counts = totals.setdefault(name, [0, 0])
+                counts[0] += h
+                counts[1] += m
+        indicators = {name: {'hits': h, 'misses': m} for name, (h, m) in sorted(totals.items())}
+        hits = sum(item['hits'] for item in indicators.values())
+        misses = sum(item['misses'] for item in indicators.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            'indicators': indicators
+        }
+
+    # --- محاسبه (همان فرمولهای کتابخانه ta) ---
+
+    def _array(self, source):
+        return getattr(self.candles, source)
+
+    def _series(self, source):
+        return self.candles.series(source)
+
+    def _wrap(self, values):
+        return pd.Series(values)
+
+    # پنجره متحرک و ewm (BatchContext همین ها را با کرنل ماتریسی جایگزین میکند)
+
+    def _rolling(self, x, window, how, ddof=0):
+        rolling = x.rolling(window, min_periods=window)
+        return rolling.std(ddof=ddof) if how == 'std' else getattr(rolling, how)()
+
+    def _ewm(self, x, min_periods, span=None, alpha=None):
+        return x.ewm(span=span, alpha=alpha, min_periods=min_periods, adjust=False).mean()
+
+    def _sma(self, window, source='close'):
+        return self._rolling(self._series(source), window, 'mean').to_numpy()
+
+    def _std(self, window, source='close', ddof=0):
+        return self._rolling(self._series(source), window, 'std', ddof).to_numpy()
+
+    def _ema(self, window, source='close'):
+        return self._ewm(self._series(source), window, span=window).to_numpy()
+
+    def _pct_change(self, source='close'):
+        return self._series(source).pct_change().to_numpy()
+
+    def _window_change(self, windows, average=100):
+        """
+        برای هر w در windows (روی کندل آخر): [تغییر قیمت از w کندل قبل (%)، تغییر میانگین حجم w کندل آخر
+        نسبت به میانگین average کندل آخر (%)]؛ همه پنجرهها با یک cumsum
+        """
+        close, volume = self._array('close'), self._array('volume')
+        windows = np.asarray(windows)
+        start = close[-windows]
+        recent = np.cumsum(volume[::-1][:windows.max()])[windows - 1] / windows
+        avg_volume = volume[-average:].mean()
+        volume_change = (recent - avg_volume) / avg_volume * 100 if avg_volume > 0 else np.zeros(len(windows))
+        return np.vstack([(close[-1] - start) / start * 100, volume_change])
+
+    def _rsi(self, window=14):
+        diff = self._series('close').diff(1)
+        up_direction = diff.where(diff > 0, 0.0)
+        down_direction = -diff.where(diff < 0, 0.0)
+        emaup = self._ewm(up_direction, window, alpha=1 / window)
+        emadn = self._ewm(down_direction, window, alpha=1 / window)
+        return np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn)))
+
+    def _macd(self, fast=12, slow=26):
+        return self.get('ema', window=fast) - self.get('ema', window=slow)
+
+    def _macd_signal(self, fast=12, slow=26, signal=9):
+        macd = self._wrap(self.get('macd', fast=fast, slow=slow))
+        return self._ewm(macd, signal, span=signal).to_numpy()
+
+    def _macd_histogram(self, fast=12, slow=26, signal=9):
+        return self.get('macd', fast=fast, slow=slow) - \
+            self.get('macd_signal', fast=fast, slow=slow, signal=signal)
+
+    def _bb_upper(self, window=20, dev=2):
+        return self.get('sma', window=window) + dev * self.get('std', window=window)
+
+    def _bb_lower(self, window=20, dev=2):
+        return self.get('sma', window=window) - dev * self.get('std', window=window)
+
+    def _bb_width(self, window=20, dev=2):
+        return (self.get('bb_upper', window=window, dev=dev) -
+                self.get('bb_lower', window=window, dev=dev)) / self.get('sma', window=window)
+
+    def _atr(self, window=14):
+        candles = self.candles
+        return TechnicalIndicators.average_true_range(candles.high, candles.low, candles.close, window)
+
+    def _atr_percent(self, window=14):
+        return self.get('atr', window=window) / self._array('close') * 100
+
+    def _stoch_k(self, window=14):
+        low = self._rolling(self._series('low'), window, 'min')
+        high = self._rolling(self._series('high'), window, 'max')
+        return (100 * (self._series('close') - low) / (high - low)).to_numpy()
+
+    def _stoch_d(self, window=14, smooth=3):
+        stoch_k = self._wrap(self.get('stoch_k', window=window))
+        return self._rolling(stoch_k, smooth, 'mean').to_numpy()
+
+
+class BatchContext(IndicatorContext):
+    """
+    همان گراف اندیکاتورها روی ماتریس (candles × symbols) برای چند ارز هم طول
+    پنجرههای متحرک و ewm با حلقه روی زمان و عملیات برداری روی ارزها محاسبه میشوند
+    (همان الگوریتمهای pandas، خروجی هر ستون دقیقا برابر محاسبه تک ارزی)
+    """
+
+    def __init__(self, members):
+        super().__init__(None)
+        self.members = members
+        self.arrays = {name: np.column_stack([getattr(c, name) for c in members])
+                       for name in ('high', 'low', 'close', 'volume')}
+        self.frames = {}
+
+    def _array(self, source):
+        return self.arrays[source]
+
+    def _series(self, source):
+        frame = self.frames.get(source)
+        if frame is None:
+            frame = self.frames[source] = pd.DataFrame(self.arrays[source], copy=False)
+        return frame
+
+    def _wrap(self, values):
+        return pd.DataFrame(values, copy=False)
+
+    def _rolling(self, x, window, how, ddof=0):
+        values = x.to_numpy(dtype=np.float64)
+        if how == 'mean':
+            result = TechnicalIndicators.rolling_mean_batch(values, window)
+        elif how == 'std':
+            result = TechnicalIndicators.rolling_std_batch(values, window, ddof)
+        else:
+            result = TechnicalIndicators.rolling_extreme_batch(values, window, how)
+        return self._wrap(result)
+
+    def _ewm(self, x, min_periods, span=None, alpha=None):
+        # همان تبدیل pandas به center of mass
+        com = (span - 1) / 2 if span is not None else (1 - alpha) / alpha
+        return self._wrap(TechnicalIndicators.ewm_mean_batch(x.to_numpy(dtype=np.float64), com, min_periods))
+
+    def _atr(self, window=14):
+        return TechnicalIndicators.average_true_range_batch(
+            self.arrays['high'], self.arrays['low'], self.arrays['close'], window)
+
+    def distribute(self, columns):
+        """محاسبه ستونها و قرار دادن ستون هر ارز در IndicatorContext همان ارز"""
+        for name in columns:
+            if name not in COLUMNS:
+                continue
+            indicator, params = COLUMNS[name]
+            key = self.key(indicator, params)
+            # یک کپی ترانهاده؛ ستون هر ارز یک سطر پیوسته (view) از آن است
+            rows = self.get(indicator, **params).T.copy()
+            rows.flags.writeable = False
+
+            for row, candles in zip(rows, self.members):
+                context = IndicatorContext.of(candles)
+                if key not in context.values:
+                    context.values[key] = row
+
+# گراف اندیکاتورها: نام ستون -> (اندیکاتور، پارامترها)
+# وابستگیها (مثلا macd -> ema_12, ema_26) هنگام محاسبه از همان context گرفته میشوند
+COLUMNS = {
+    'ma_7': ('sma', {'window': 7}),
+    'ma_20': ('sma', {'window': 20}),
+    'ma_50': ('sma', {'window': 50}),
+    'ma_100': ('sma', {'window': 100}),
+    'ma_200': ('sma', {'window': 200}),
+    'ema_9': ('ema', {'window': 9}),
+    'ema_12': ('ema', {'window': 12}),
+    'ema_21': ('ema', {'window': 21}),
+    'ema_26': ('ema', {'window': 26}),
+    'ema_50': ('ema', {'window': 50}),
+    'rsi': ('rsi', {'window': 14}),
+    'rsi_7': ('rsi', {'window': 7}),
+    'macd': ('macd', {'fast': 12, 'slow': 26}),
+    'macd_signal': ('macd_signal', {'fast': 12, 'slow': 26, 'signal': 9}),
+    'macd_histogram': ('macd_histogram', {'fast': 12, 'slow': 26, 'signal': 9}),
+    'bb_upper': ('bb_upper', {'window': 20, 'dev': 2}),
+    'bb_middle': ('sma', {'window': 20}),
+    'bb_lower': ('bb_lower', {'window': 20, 'dev': 2}),
+    'bb_width': ('bb_width', {'window': 20, 'dev': 2}),
+    'atr': ('atr', {'window': 14}),
+    'atr_percent': ('atr_percent', {'window': 14}),
+    'stoch_k': ('stoch_k', {'window': 14}),
+    'stoch_d': ('stoch_d', {'window': 14, 'smooth': 3}),
+    'volume_sma_20': ('sma', {'window': 20, 'source': 'volume'}),
+    'price_change': ('pct_change', {'source': 'close'}),
+    'ut_atr': ('atr', {'window': 10}),
+    'volume_mean_50': ('sma', {'window': 50, 'source': 'volume'}),
+    'volume_std_50': ('std', {'window': 50, 'source': 'volume', 'ddof': 1})
+}
+
+# ستونهای خروجی calculate_all
+CALCULATE_ALL_COLUMNS = (
+    'ma_7', 'ma_20', 'ma_50', 'ma_100', 'ma_200',
+    'ema_9', 'ema_12', 'ema_21', 'ema_26', 'ema_50',
+    'rsi', 'rsi_7', 'macd', 'macd_signal', 'macd_histogram',
+    'bb_upper', 'bb_middle', 'bb_lower', 'bb_width',
+    'atr', 'atr_percent', 'stoch_k', 'stoch_d'
+)
+
+# فیلدهای خلاصه -> ستونهای لازم
+SUMMARY_FIELDS = {
+    'price': ('close',),
+    'rsi': ('rsi',),
+    'macd': ('macd',),
+    'macd_signal': ('macd_signal',),
+    'bb_position': ('close', 'bb_upper', 'bb_lower'),
+    'ma_trend': ('close', 'ma_20', 'ma_50'),
+    'atr_percent': ('atr_percent',)
+}
 
 indicators = TechnicalIndicators()
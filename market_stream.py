@@ -0,0 +1,282 @@
+"""
+دریافت استریمی داده بازار از وبسوکت صرافی
+پیامها به فرمت یکسان تبدیل میشوند:
+    {"type": "kline", "symbol": ..., "timeframe": ..., "candle": [ts, o, h, l, c, v]}
+    {"type": "ticker", "symbol": ..., "ticker": {"last": ..., "percentage": ..., ...}}
+    {"type": "book_snapshot" | "book_diff", "symbol": ..., "bids": [...], "asks": [...], "nonce": ..., "timestamp": ...}
+برای تست آفلاین، ReplayServer پیامهای ضبط شده را روی یک وبسوکت محلی پخش میکند
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+import aiohttp
+from aiohttp import web
+import ccxt.pro as ccxt_pro
+
+class CcxtProSource:
+    """منبع زنده: استریم kline و ticker از طریق ccxt.pro"""
+
+    def __init__(self, exchange_manager, symbols, timeframe='15m'):
+        self.exchange_manager = exchange_manager
+        self.symbols = list(symbols)
+        self.timeframe = timeframe
+
+    def _create_exchange(self):
+        exchange_info = self.exchange_manager.SUPPORTED_EXCHANGES[self.exchange_manager.exchange_id]
+        exchange = getattr(ccxt_pro, exchange_info['class'].__name__)({
+            'options': {'defaultType': 'swap'}
+        })
+        if self.exchange_manager.exchange.markets:
+            exchange.set_markets(self.exchange_manager.exchange.markets,
+                                 self.exchange_manager.exchange.currencies)
+        return exchange
+
+    async def messages(self):
+        exchange = self._create_exchange()
+        if not exchange.has.get('watchOHLCV'):
+            await exchange.close()
+            raise RuntimeError(f"{self.exchange_manager.exchange_id} does not support kline streams")
+
+        out = asyncio.Queue()
+
+        async def watch_klines(symbol):
+            while True:
+                try:
+                    candles = await exchange.watch_ohlcv(symbol, self.timeframe)
+                    for candle in candles[-2:]:
+                        await out.put({'type': 'kline', 'symbol': symbol,
+                                       'timeframe': self.timeframe, 'candle': candle})
+                except Exception as e:
+                    print(f"❌ Stream error {symbol}: {e}")
+                    await asyncio.sleep(5)
+
+        async def watch_tickers():
+            while True:
+                try:
+                    tickers = await exchange.watch_tickers(self.symbols)
+                    for symbol, ticker in tickers.items():
+                        await out.put({'type': 'ticker', 'symbol': symbol, 'ticker': {
+                            'last': ticker.get('last'),
+                            'percentage': ticker.get('percentage'),
+                            'quoteVolume': ticker.get('quoteVolume'),
+                            'high': ticker.get('high'),
+                            'low': ticker.get('low')
+                        }})
+                except Exception as e:
+                    print(f"❌ Ticker stream error: {e}")
+                    await asyncio.sleep(5)
+
+        async def watch_book(symbol):
+            # ccxt.pro دفتر کامل را برمیگرداند؛ فقط سطوح تغییر کرده نسبت به نسخه قبلی به صورت diff فرستاده میشود
+            previous = None
+            while True:
+                try:
+                    book = await exchange.watch_order_book(symbol)
+                    current = {side: {price: size for price, size, *_ in book[side]} for side in ('bids', 'asks')}
+                    message = {'symbol': symbol, 'nonce': book.get('nonce'), 'timestamp': book.get('timestamp')}
+                    if previous is None:
+                        message.update(type='book_snapshot',
+                                       bids=list(current['bids'].items()), asks=list(current['asks'].items()))
+                    else:
+                        message['type'] = 'book_diff'
+                        for side in ('bids', 'asks'):
+                            old, new = previous[side], current[side]
+                            message[side] = ([(p, s) for p, s in new.items() if old.get(p) != s] +
+                                             [(p, 0) for p in old if p not in new])
+                    previous = current
+                    await out.put(message)
+                except Exception as e:
+                    print(f"❌ Order book stream error {symbol}: {e}")
+                    previous = None
+                    await asyncio.sleep(5)
+
+        tasks = [asyncio.ensure_future(watch_klines(symbol)) for symbol in self.symbols]
+        if exchange.has.get('watchTickers'):
+            tasks.append(asyncio.ensure_future(watch_tickers()))
+        if exchange.has.get('watchOrderBook'):
+            tasks.extend(asyncio.ensure_future(watch_book(symbol))
+                         for symbol in sorted(self.exchange_manager.order_books.hot))
+
+        try:
+            while True:
+                yield await out.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await exchange.close()
+
+
+class WebSocketSource:
+    """منبع وبسوکت با پیامهای هم فرمت (مثلا ReplayServer)"""
+
+    def __init__(self, url):
+        self.url = url
+
+    async def messages(self):
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(self.url) as ws:
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        yield json.loads(msg.data)
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+
+
+class MarketStream:
+    """
+    نگهداری وضعیت کندل/تیکر از استریم
+    با بسته شدن کندل یا عبور تغییر قیمت از آستانه، ارز در صف تحلیل قرار میگیرد
+    """
+
+    def __init__(self, exchange_manager, source, price_threshold=1.0, record_path=None):
+        self.exchange_manager = exchange_manager
+        self.source = source
+        self.price_threshold = price_threshold
+        self.record_path = record_path
+        self.reference_prices = {}
+        self.triggers = queue.Queue()
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.messages = 0
+        self.running = False
+        self.thread = None
+
+    def _trigger(self, reason, symbol, timeframe=None):
+        with self.pending_lock:
+            if symbol in self.pending:
+                return
+            self.pending.add(symbol)
+        self.triggers.put((reason, symbol, timeframe))
+
+    def next_trigger(self, timeout=None):
+        """(reason, symbol, timeframe) بعدی برای تحلیل"""
+        try:
+            item = self.triggers.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        with self.pending_lock:
+            self.pending.discard(item[1])
+        return item
+
+    def handle(self, message):
+        """اعمال یک پیام روی وضعیت"""
+        self.messages += 1
+        symbol = message.get('symbol')
+
+        if message.get('type') == 'kline':
+            timeframe = message['timeframe']
+            if self.exchange_manager.apply_candle(symbol, timeframe, message['candle']):
+                self._trigger('candle_close', symbol, timeframe)
+
+        elif message.get('type') in ('book_snapshot', 'book_diff'):
+            # رویدادها در صف order_books میمانند و جدا پردازش میشوند
+            self.exchange_manager.apply_order_book(message)
+
+        elif message.get('type') == 'ticker':
+            ticker = message['ticker']
+            self.exchange_manager.apply_ticker(symbol, ticker)
+
+            price = ticker.get('last')
+            if not price:
+                return
+            reference = self.reference_prices.setdefault(symbol, price)
+            change = abs(price - reference) / reference * 100 if reference else 0
+            if change >= self.price_threshold:
+                self.reference_prices[symbol] = price
+                self._trigger('threshold', symbol)
+
+    async def run(self):
+        record = open(self.record_path, 'a') if self.record_path else None
+        try:
+            async for message in self.source.messages():
+                if not self.running:
+                    break
+                if record:
+                    record.write(json.dumps(message) + '\n')
+                self.handle(message)
+        finally:
+            if record:
+                record.close()
+
+    def _run_thread(self):
+        while self.running:
+            try:
+                asyncio.run(self.run())
+            except Exception as e:
+                print(f"❌ Market stream error: {e}")
+            if self.running:
+                time.sleep(5)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run_thread, daemon=True)
+            self.thread.start()
+            print("📡 Market stream started")
+
+    def stop(self):
+        self.running = False
+
+
+class ReplayServer:
+    """وبسوکت محلی که پیامهای ضبط شده (jsonl) را پخش میکند"""
+
+    def __init__(self, path, host='127.0.0.1', port=8765, interval=0.0, loop_forever=False):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.loop_forever = loop_forever
+
+    def load(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    async def handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        messages = self.load()
+
+        while True:
+            for message in messages:
+                await ws.send_str(json.dumps(message))
+                if self.interval:
+                    await asyncio.sleep(self.interval)
+            if not self.loop_forever:
+                break
+
+        await ws.close()
+        return ws
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/ws', self.handler)
+        return app
+
+    async def start(self):
+        """اجرا داخل یک حلقه asyncio موجود؛ runner برای بستن برگردانده میشود"""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        return runner
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/ws"
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay recorded market stream messages over a local websocket')
+    parser.add_argument('path', help='jsonl file of recorded messages')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--interval', type=float, default=0.0, help='seconds between messages')
+    parser.add_argument('--loop', action='store_true', help='replay the file forever')
+    args = parser.parse_args()
+
+    server = ReplayServer(args.path, port=args.port, interval=args.interval, loop_forever=args.loop)
+    print(f"📼 Replaying {args.path} on {server.url}")
+    web.run_app(server.app(), host=server.host, port=server.port)
@@ -0,0 +1,199 @@
+"""
+ذخیره دائمی کندلها روی دیسک (memory-mapped)
+هر ارز/تایم فریم یک فایل ستونی append-only دارد:
+هدر + ستون timestamp (int64) + ستونهای open, high, low, close, volume (float64)
+"""
+import os
+import re
+import threading
+import numpy as np
+
+MAGIC = 0x31564C484F57  # "WOHLV1"
+HEADER_SIZE = 64
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+class OHLCVSeries:
+    """یک فایل کندل memory-mapped"""
+
+    def __init__(self, path, capacity=4096):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, capacity)
+        self._open()
+
+    @staticmethod
+    def _create(path, capacity, count=0):
+        with open(path, 'wb') as f:
+            f.truncate(HEADER_SIZE + capacity * 8 * (1 + len(COLUMNS)))
+        header = np.memmap(path, dtype=np.int64, mode='r+', shape=(HEADER_SIZE // 8,))
+        header[0] = MAGIC
+        header[1] = capacity
+        header[2] = count
+        header.flush()
+        del header
+
+    def _open(self):
+        self.header = np.memmap(self.path, dtype=np.int64, mode='r+', shape=(HEADER_SIZE // 8,))
+        if self.header[0] != MAGIC:
+            raise ValueError(f"Invalid OHLCV file: {self.path}")
+
+        self.capacity = int(self.header[1])
+        self.timestamps = np.memmap(self.path, dtype=np.int64, mode='r+',
+                                    offset=HEADER_SIZE, shape=(self.capacity,))
+        self.columns = []
+        for i in range(len(COLUMNS)):
+            offset = HEADER_SIZE + self.capacity * 8 * (1 + i)
+            self.columns.append(np.memmap(self.path, dtype=np.float64, mode='r+',
+                                          offset=offset, shape=(self.capacity,)))
+
+    def close(self):
+        self.header = self.timestamps = None
+        self.columns = []
+
+    @property
+    def count(self):
+        return int(self.header[2])
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def last_timestamp(self):
+        count = self.count
+        return int(self.timestamps[count - 1]) if count else None
+
+    def _grow(self, needed):
+        """دو برابر کردن ظرفیت فایل (کپی ستونها در فایل جدید و جایگزینی اتمیک)"""
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+
+        count = self.count
+        tmp_path = self.path + '.tmp'
+        self._create(tmp_path, capacity, count)
+        new = OHLCVSeries(tmp_path)
+        new.timestamps[:count] = self.timestamps[:count]
+        for old_col, new_col in zip(self.columns, new.columns):
+            new_col[:count] = old_col[:count]
+        new.flush()
+        new.close()
+
+        self.close()
+        os.replace(tmp_path, self.path)
+        self._open()
+
+    def append(self, ohlcv):
+        """اضافه کردن کندلهای جدیدتر از آخرین کندل ذخیره شده"""
+        last = self.last_timestamp
+        rows = [row for row in ohlcv if last is None or row[0] > last]
+        if not rows:
+            return 0
+
+        rows = np.asarray(rows, dtype=np.float64)
+        count = self.count
+        if count + len(rows) > self.capacity:
+            self._grow(count + len(rows))
+
+        end = count + len(rows)
+        self.timestamps[count:end] = rows[:, 0].astype(np.int64)
+        for i, col in enumerate(self.columns):
+            col[count:end] = rows[:, i + 1]
+        self.flush()
+
+        # شمارنده بعد از نوشتن داده بروز میشود
+        self.header[2] = end
+        self.header.flush()
+        return len(rows)
+
+    def flush(self):
+        self.timestamps.flush()
+        for col in self.columns:
+            col.flush()
+
+    def read(self, limit=None):
+        """آخرین کندلها به صورت (timestamps, values)"""
+        count = self.count
+        start = 0 if limit is None else max(count - limit, 0)
+        timestamps = np.array(self.timestamps[start:count])
+        values = np.column_stack([col[start:count] for col in self.columns]) if count > start \
+            else np.zeros((0, len(COLUMNS)))
+        return timestamps, values
+
+
+class OHLCVStore:
+    """مدیریت فایلهای کندل با کلید (exchange, symbol, timeframe)"""
+
+    def __init__(self, root='data/ohlcv'):
+        self.root = root
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def path_for(self, exchange_id, symbol, timeframe):
+        name = re.sub(r'[^A-Za-z0-9]+', '_', symbol).strip('_')
+        return os.path.join(self.root, exchange_id, f"{name}_{timeframe}.ohlcv")
+
+    def _get(self, exchange_id, symbol, timeframe, create=False):
+        key = (exchange_id, symbol, timeframe)
+        series = self.series.get(key)
+        if series is None:
+            path = self.path_for(exchange_id, symbol, timeframe)
+            if not create and not os.path.exists(path):
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            series = OHLCVSeries(path)
+            self.series[key] = series
+        return series
+
+    def append(self, exchange_id, symbol, timeframe, ohlcv):
+        with self.lock:
+            return self._get(exchange_id, symbol, timeframe, create=True).append(ohlcv)
+
+    def last_timestamp(self, exchange_id, symbol, timeframe):
+        with self.lock:
+            series = self._get(exchange_id, symbol, timeframe)
+            return series.last_timestamp if series is not None else None
+
+    def read(self, exchange_id, symbol, timeframe, limit=None, timeframe_ms=None):
+        """
+        خواندن آخرین کندلها
+        با timeframe_ms فقط بخش پیوسته انتهایی (بدون فاصله زمانی) برگردانده میشود
+        """
+        with self.lock:
+            series = self._get(exchange_id, symbol, timeframe)
+            if series is None:
+                return None
+            timestamps, values = series.read(limit)
+
+        if timeframe_ms and len(timestamps) > 1:
+            gaps = np.flatnonzero(np.diff(timestamps) != timeframe_ms)
+            if len(gaps):
+                start = gaps[-1] + 1
+                timestamps, values = timestamps[start:], values[start:]
+
+        return timestamps, values
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from data_fetcher import ExchangeManager
+
+    parser = argparse.ArgumentParser(description='OHLCV store tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    backfill = sub.add_parser('backfill', help='download deep history into the store')
+    backfill.add_argument('--exchange', default='kucoin')
+    backfill.add_argument('--timeframe', default='15m')
+    backfill.add_argument('--days', type=int, default=30)
+    backfill.add_argument('--symbols', type=int, default=250, help='number of symbols to backfill')
+    backfill.add_argument('--concurrency', type=int, default=5)
+
+    args = parser.parse_args()
+
+    manager = ExchangeManager(args.exchange)
+    symbols = manager.load_symbols(args.symbols)
+    since = int((time.time() - args.days * 86400) * 1000)
+
+    started = time.time()
+    total = manager.backfill(symbols, args.timeframe, since, concurrency=args.concurrency)
+    print(f"✅ Backfilled {total} candles for {len(symbols)} symbols in {time.time() - started:.1f}s")
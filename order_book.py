@@ -0,0 +1,341 @@
+"""
+دفتر سفارش L2 محلی برای ارزهای منتخب (hot set) از snapshot + diff
+سطوح قیمت در SortedDict (بروزرسانی O(log n))؛ دتکتور فقط سطوح تغییر کرده را بررسی میکند:
+    BID_WALL / ASK_WALL                 دیوار بزرگ نزدیک قیمت
+    BID_WALL_PULLED / ASK_WALL_PULLED   برداشته شدن دیوار قبل از رسیدن قیمت به آن
+    BID_IMBALANCE / ASK_IMBALANCE       تغییر عدم تعادل خرید/فروش سطوح نزدیک
+
+پیامها (هم فرمت market_stream):
+    {"type": "book_snapshot" | "book_diff", "symbol": ..., "bids": [[price, size], ...],
+     "asks": [[price, size], ...], "nonce": ..., "timestamp": ms}
+در diff اندازه 0 یعنی حذف سطح
+"""
+from datetime import datetime
+from itertools import islice
+import json
+import operator
+import queue
+import threading
+import time
+from sortedcontainers import SortedDict
+
+# بازه کلید طبیعی رویدادهای دفتر (ثانیه): هر نوع رویداد هر ارز در هر بازه یک بار ذخیره میشود
+BOOK_EVENT_BUCKET = 300
+
+class OrderBook:
+    """دفتر سفارش یک ارز؛ bids نزولی و asks صعودی"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.sides = {'bids': SortedDict(operator.neg), 'asks': SortedDict()}
+        self.notional = {'bids': 0.0, 'asks': 0.0}   # جمع price * size هر طرف
+        self.nonce = None
+        self.timestamp = None
+        self.synced = False
+
+    def _set(self, side, price, size):
+        """تغییر یک سطح؛ اندازه قبلی برگردانده میشود"""
+        levels = self.sides[side]
+        old = levels.get(price, 0.0)
+        if size > 0:
+            levels[price] = size
+        elif old:
+            del levels[price]
+        self.notional[side] += price * (size - old)
+        return old
+
+    def apply_diff(self, bids, asks):
+        """اعمال تغییرات؛ لیست (side, price, old, new) سطوح تغییر کرده"""
+        changes = []
+        for side, levels in (('bids', bids), ('asks', asks)):
+            for price, size in levels:
+                price, size = float(price), float(size)
+                old = self._set(side, price, size)
+                if old != size:
+                    changes.append((side, price, old, size))
+        return changes
+
+    def apply_snapshot(self, bids, asks):
+        """جایگزینی کامل؛ به صورت diff با دفتر فعلی اعمال میشود تا دتکتور هم تغییرات را ببیند"""
+        diff = {}
+        for side, levels in (('bids', bids), ('asks', asks)):
+            new = {float(price): float(size) for price, size in levels}
+            removed = [(price, 0.0) for price in self.sides[side] if price not in new]
+            diff[side] = removed + list(new.items())
+        changes = self.apply_diff(diff['bids'], diff['asks'])
+        self.synced = True
+        return changes
+
+    def best(self, side):
+        levels = self.sides[side]
+        return levels.peekitem(0)[0] if levels else None
+
+    @property
+    def mid(self):
+        bid, ask = self.best('bids'), self.best('asks')
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def top(self, side, levels=20):
+        """levels سطح اول (price, size)"""
+        return list(islice(self.sides[side].items(), levels))
+
+    def depth(self, side, levels=20):
+        """ارزش دلاری levels سطح اول"""
+        return sum(price * size for price, size in islice(self.sides[side].items(), levels))
+
+    def imbalance(self, levels=20):
+        """(bid - ask) / (bid + ask) روی levels سطح اول، بین -1 و 1"""
+        bid, ask = self.depth('bids', levels), self.depth('asks', levels)
+        return (bid - ask) / (bid + ask) if bid + ask else 0.0
+
+    def mean_level(self, side):
+        """میانگین ارزش دلاری سطوح یک طرف (O(1))"""
+        count = len(self.sides[side])
+        return self.notional[side] / count if count else 0.0
+
+
+class BookTracker:
+    """
+    دتکتور افزایشی یک دفتر
+    دیوار: سطحی با ارزش حداقل wall_multiple برابر میانگین سطوح همان طرف و در فاصله band درصد از قیمت میانی
+    برداشته شدن: کاهش حداقل pull_fraction از دیوار در حالی که سطح بهتری جلوی آن بوده (پس با معامله پر نشده)
+    عدم تعادل: عبور از imbalance_threshold (برگشت به حالت عادی زیر نصف آستانه)
+    candle_ts رویدادها به بازه bucket ثانیه گرد میشود (مثل cooldown اسکرینر)
+    """
+
+    def __init__(self, wall_multiple=8, band=2.0, pull_fraction=0.7, imbalance_threshold=0.4,
+                 imbalance_levels=20, min_wall_notional=0, bucket=BOOK_EVENT_BUCKET):
+        self.wall_multiple = wall_multiple
+        self.band = band
+        self.pull_fraction = pull_fraction
+        self.imbalance_threshold = imbalance_threshold
+        self.imbalance_levels = imbalance_levels
+        self.min_wall_notional = min_wall_notional
+        self.bucket_ms = int(bucket * 1000)
+        self.walls = {}       # (side, price) -> اندازه هنگام تشخیص
+        self.regime = 0       # 1 خرید غالب، -1 فروش غالب، 0 عادی
+
+    def update(self, book, changes, timestamp):
+        events = []
+        mid = book.mid
+        if mid is None:
+            return events
+
+        for side, price, old, new in changes:
+            key = (side, price)
+            wall = self.walls.get(key)
+
+            if wall is not None:
+                if new <= wall * (1 - self.pull_fraction):
+                    del self.walls[key]
+                    best = book.best(side)
+                    # سطح بهتری جلوی دیوار بوده: بدون معامله برداشته شده
+                    if best is not None and (best > price if side == 'bids' else best < price):
+                        events.append(self._pull_event(book, side, price, wall, mid, timestamp))
+                continue
+
+            notional = price * new
+            if (new > 0 and notional >= self.min_wall_notional
+                    and notional >= self.wall_multiple * book.mean_level(side)
+                    and abs(price - mid) / mid * 100 <= self.band):
+                self.walls[key] = new
+                events.append(self._wall_event(book, side, price, notional, mid, timestamp))
+
+        events.extend(self._imbalance(book, mid, timestamp))
+        return events
+
+    def _imbalance(self, book, mid, timestamp):
+        value = book.imbalance(self.imbalance_levels)
+        regime = self.regime
+        if value >= self.imbalance_threshold:
+            regime = 1
+        elif value <= -self.imbalance_threshold:
+            regime = -1
+        elif abs(value) < self.imbalance_threshold / 2:
+            regime = 0
+
+        changed = regime != self.regime
+        self.regime = regime
+        if not changed or regime == 0:
+            return []
+
+        side = 'BID' if regime > 0 else 'ASK'
+        return [self._event(book, f'{side}_IMBALANCE', 'BUY' if regime > 0 else 'SELL',
+                            min(55 + int(abs(value) * 40), 90), mid, timestamp,
+                            f'⚖️ Order book {side.lower()} imbalance ({value:+.2f})',
+                            imbalance=round(value, 3))]
+
+    def _wall_event(self, book, side, price, notional, mid, timestamp):
+        ratio = notional / book.mean_level(side)
+        name = 'BID' if side == 'bids' else 'ASK'
+        return self._event(book, f'{name}_WALL', 'BUY' if side == 'bids' else 'SELL',
+                           min(60 + int(ratio), 90), mid, timestamp,
+                           f'🧱 {name.title()} wall ${notional:,.0f} @ {price:g} ({ratio:.0f}x avg level)',
+                           wall_price=price, wall_notional=round(notional, 2))
+
+    def _pull_event(self, book, side, price, size, mid, timestamp):
+        name = 'BID' if side == 'bids' else 'ASK'
+        # دیوار خرید برداشته شود حمایت جعلی بوده (فروش) و برعکس
+        return self._event(book, f'{name}_WALL_PULLED', 'SELL' if side == 'bids' else 'BUY',
+                           70, mid, timestamp,
+                           f'🫥 {name.title()} wall pulled ${price * size:,.0f} @ {price:g}',
+                           wall_price=price, wall_notional=round(price * size, 2))
+
+    def _event(self, book, type, signal, strength, mid, timestamp, reason, **fields):
+        event = {
+            'symbol': book.symbol,
+            'type': type,
+            'signal': signal,
+            'strength': strength,
+            'price': mid,
+            'reason': reason,
+            'timeframe': 'book',
+            # کلید طبیعی: دیوار ماندگار یا دوباره گذاشته شده در هر بازه یک بار
+            'candle_ts': int(timestamp // self.bucket_ms * self.bucket_ms),
+            'timestamp': datetime.utcfromtimestamp(timestamp / 1000)
+        }
+        event.update(fields)
+        return event
+
+
+class OrderBookManager:
+    """دفترهای hot set و صف رویدادهای دتکتور"""
+
+    def __init__(self, symbols=None, **tracker_options):
+        self.hot = set(symbols or ())
+        self.tracker_options = tracker_options
+        self.books = {}
+        self.trackers = {}
+        self.events = queue.Queue()
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.skipped = 0     # diff قبل از snapshot یا با nonce قدیمی
+        self.gaps = 0        # شکاف در nonce (دفتر تا snapshot بعدی کنار گذاشته میشود)
+        self.emitted = 0
+        self.seconds = 0.0
+
+    def set_hot(self, symbols):
+        with self.lock:
+            self.hot = set(symbols)
+            for symbol in list(self.books):
+                if symbol not in self.hot:
+                    del self.books[symbol]
+                    del self.trackers[symbol]
+
+    def apply(self, message):
+        """اعمال یک پیام book_snapshot / book_diff؛ رویدادهای جدید برگردانده (و در صف گذاشته) میشوند"""
+        symbol = message['symbol']
+        if symbol not in self.hot:
+            return []
+
+        started = time.perf_counter()
+        with self.lock:
+            self.messages += 1
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = OrderBook(symbol)
+                self.trackers[symbol] = BookTracker(**self.tracker_options)
+
+            nonce = message.get('nonce')
+            if message['type'] == 'book_snapshot':
+                changes = book.apply_snapshot(message.get('bids', ()), message.get('asks', ()))
+            else:
+                if not book.synced or (nonce is not None and book.nonce is not None and nonce <= book.nonce):
+                    self.skipped += 1
+                    return []
+                previous = message.get('prev_nonce')
+                if previous is not None and book.nonce is not None and previous != book.nonce:
+                    book.synced = False
+                    self.gaps += 1
+                    return []
+                changes = book.apply_diff(message.get('bids', ()), message.get('asks', ()))
+
+            book.nonce = nonce if nonce is not None else book.nonce
+            book.timestamp = message.get('timestamp') or int(time.time() * 1000)
+            events = self.trackers[symbol].update(book, changes, book.timestamp)
+            self.emitted += len(events)
+            self.seconds += time.perf_counter() - started
+
+        for event in events:
+            self.events.put(event)
+        return events
+
+    def needs_snapshot(self):
+        """ارزهای hot که دفترشان همگام نیست"""
+        with self.lock:
+            return [s for s in self.hot if s not in self.books or not self.books[s].synced]
+
+    def drain(self):
+        """همه رویدادهای در صف"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def summary(self, symbol, levels=20):
+        with self.lock:
+            book = self.books.get(symbol)
+            if book is None:
+                return None
+            return {
+                'symbol': symbol,
+                'synced': book.synced,
+                'nonce': book.nonce,
+                'best_bid': book.best('bids'),
+                'best_ask': book.best('asks'),
+                'levels': {'bids': len(book.sides['bids']), 'asks': len(book.sides['asks'])},
+                'imbalance': round(book.imbalance(levels), 3),
+                'walls': [{'side': side, 'price': price, 'size': size}
+                          for (side, price), size in self.trackers[symbol].walls.items()]
+            }
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hot': sorted(self.hot),
+                'books': len(self.books),
+                'messages': self.messages,
+                'skipped': self.skipped,
+                'gaps': self.gaps,
+                'events': self.emitted,
+                'avg_us': round(self.seconds / self.messages * 1e6, 2) if self.messages else 0
+            }
+
+
+def replay(path, manager=None):
+    """
+    اعمال پیامهای ضبط شده (jsonl، مثلا خروجی record_path استریم) روی یک manager
+    پیامهای غیر دفتر سفارش نادیده گرفته میشوند
+    """
+    with open(path) as f:
+        messages = [json.loads(line) for line in f if line.strip()]
+    books = [m for m in messages if m.get('type') in ('book_snapshot', 'book_diff')]
+    if manager is None:
+        manager = OrderBookManager({m['symbol'] for m in books})
+
+    events = []
+    for message in books:
+        events.extend(manager.apply(message))
+    manager.drain()
+    return manager, events
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay recorded order book diffs through the wall/imbalance tracker')
+    parser.add_argument('path', help='jsonl file of book_snapshot / book_diff messages')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    manager, events = replay(args.path)
+    elapsed = time.perf_counter() - started
+    for event in events:
+        print(f"{event['timestamp']} {event['symbol']:<20} {event['type']:<18} {event['reason']}")
+    stats = manager.stats()
+    print(f"✅ {stats['messages']} messages, {len(events)} events in {elapsed:.3f}s "
+          f"({stats['messages'] / elapsed if elapsed else 0:,.0f} msg/s)")
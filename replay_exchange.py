@@ -0,0 +1,294 @@
+"""
+صرافی آفلاین برای بنچمارک قابل تکرار
+داده از فایلهای ضبط شده یا به صورت مصنوعی (random walk با seed ثابت) ساخته میشود
+تاخیر و خطا (شبکه / 429) قابل تنظیم است
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import ccxt
+import numpy as np
+
+# سریهای ساخته شده بین نمونهها مشترک هستند
+_series_cache = {}
+_series_lock = threading.Lock()
+
+class ReplayExchange:
+    """
+    پیادهسازی load_markets, fetch_ohlcv, fetch_ticker, fetch_tickers با رابط ccxt
+
+    options:
+        data_dir       پوشه فایلهای <SYMBOL>_<timeframe>.json (لیست [ts, o, h, l, c, v])
+        symbols        تعداد ارزهای مصنوعی وقتی data_dir نداریم
+        history        تعداد کندلهای هر سری مصنوعی
+        latency        تاخیر هر درخواست (ثانیه)
+        error_rate     احتمال NetworkError
+        rate_limit_rate احتمال RateLimitExceeded
+        rate_limit     فاصله مجاز بین درخواستها (میلیثانیه) برای زمانبند
+        seed           seed داده و خطاها
+    """
+
+    id = 'replay'
+    name = 'Replay'
+
+    def __init__(self, config=None):
+        config = config or {}
+        options = config.get('options', {})
+        env = os.environ
+
+        self.data_dir = options.get('data_dir', env.get('REPLAY_DATA_DIR'))
+        self.symbol_count = int(options.get('symbols', env.get('REPLAY_SYMBOLS', 250)))
+        self.history = int(options.get('history', env.get('REPLAY_HISTORY', 1500)))
+        self.latency = float(options.get('latency', env.get('REPLAY_LATENCY', 0)))
+        self.error_rate = float(options.get('error_rate', env.get('REPLAY_ERROR_RATE', 0)))
+        self.rate_limit_rate = float(options.get('rate_limit_rate', env.get('REPLAY_RATE_LIMIT_RATE', 0)))
+        self.rateLimit = float(options.get('rate_limit', env.get('REPLAY_RATE_LIMIT', 1)))
+        self.seed = int(options.get('seed', env.get('REPLAY_SEED', 42)))
+
+        self.random = random.Random(self.seed)
+        self.markets = {}
+        self.currencies = {}
+        self.has = {'fetchOHLCV': True, 'fetchTicker': True, 'fetchTickers': True}
+        self.requests = 0
+        self.ticker_timeframes = {}
+
+    # --- داده ---
+
+    @staticmethod
+    def _file_name(symbol):
+        return re.sub(r'[^A-Za-z0-9]+', '_', symbol).strip('_')
+
+    def _symbol_file(self, symbol, timeframe):
+        return os.path.join(self.data_dir, f"{self._file_name(symbol)}_{timeframe}.json")
+
+    def _ticker_timeframe(self, symbol):
+        """تایم فریم سری تیکر: کوچکترین تایم فریم ضبط شده برای ارز (داده مصنوعی: 15m)"""
+        if not self.data_dir:
+            return '15m'
+        timeframe = self.ticker_timeframes.get(symbol)
+        if timeframe is None:
+            pattern = re.compile(re.escape(self._file_name(symbol)) + r'_(\d+[smhdwM])\.json$')
+            recorded = [m.group(1) for m in map(pattern.match, os.listdir(self.data_dir)) if m]
+            timeframe = min(recorded, key=ccxt.Exchange.parse_timeframe) if recorded else '15m'
+            self.ticker_timeframes[symbol] = timeframe
+        return timeframe
+
+    def _symbols(self):
+        if not self.data_dir:
+            return [f"SYN{i:04d}/USDT:USDT" for i in range(self.symbol_count)]
+
+        path = os.path.join(self.data_dir, 'symbols.json')
+        with open(path) as f:
+            return json.load(f)
+
+    def _synthetic(self, symbol, timeframe_ms):
+        """random walk با seed وابسته به ارز (مقادیر در هر اجرا یکسان است)"""
+        rng = np.random.default_rng([self.seed, sum(map(ord, symbol))])
+        n = self.history
+
+        returns = rng.normal(0, 0.004, n)
+        # چند حرکت شدید (پامپ/دامپ) برای فعال شدن دتکتورها
+        for start in rng.integers(0, n - 10, 3):
+            returns[start:start + 8] += rng.choice([-1, 1]) * 0.012
+
+        close = 100 * rng.uniform(0.01, 10) * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[close[0]], close[:-1]])
+        spread = np.abs(rng.normal(0, 0.003, n)) * close
+        high = np.maximum(open_, close) + spread
+        low = np.minimum(open_, close) - spread
+        volume = rng.lognormal(10, 0.5, n) * (1 + 4 * (np.abs(returns) > 0.01))
+
+        timestamps = np.arange(n, dtype=np.int64) * timeframe_ms
+        return timestamps, np.column_stack([open_, high, low, close, volume])
+
+    def _recorded(self, symbol, timeframe):
+        with open(self._symbol_file(symbol, timeframe)) as f:
+            rows = np.asarray(json.load(f), dtype=np.float64)
+        return rows[:, 0].astype(np.int64), rows[:, 1:6]
+
+    def _series(self, symbol, timeframe):
+        """سری کامل کندلها؛ زمانها طوری جابجا میشوند که آخرین کندل، کندل جاری باشد"""
+        key = (self.data_dir, self.seed, self.history, symbol, timeframe)
+        with _series_lock:
+            series = _series_cache.get(key)
+            if series is None:
+                timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+                if self.data_dir:
+                    series = self._recorded(symbol, timeframe)
+                else:
+                    series = self._synthetic(symbol, timeframe_ms)
+                _series_cache[key] = series
+
+        timestamps, values = series
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        current = int(time.time() * 1000) // timeframe_ms * timeframe_ms
+        return timestamps + (current - timestamps[-1]), values
+
+    # --- تاخیر و خطا ---
+
+    def _inject(self):
+        self.requests += 1
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            raise ccxt.RateLimitExceeded('replay: injected 429')
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise ccxt.NetworkError('replay: injected network error')
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    # --- رابط ccxt ---
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = markets
+        self.currencies = currencies or {}
+        return markets
+
+    def _load_markets(self):
+        if not self.markets:
+            markets = {}
+            for symbol in self._symbols():
+                base, quote = symbol.split(':')[0].split('/')
+                markets[symbol] = {
+                    'id': symbol.replace('/', '').replace(':', '_'),
+                    'symbol': symbol,
+                    'base': base,
+                    'quote': quote,
+                    'settle': quote,
+                    'swap': True,
+                    'future': False,
+                    'active': True
+                }
+            self.markets = markets
+        return self.markets
+
+    def load_markets(self, reload=False, params={}):
+        self._delay()
+        self._inject()
+        return self._load_markets()
+
+    def _ohlcv(self, symbol, timeframe, since, limit):
+        if symbol not in self._load_markets():
+            raise ccxt.BadSymbol(f'replay: unknown symbol {symbol}')
+
+        timestamps, values = self._series(symbol, timeframe)
+        start = 0 if since is None else int(np.searchsorted(timestamps, since))
+        end = len(timestamps)
+        if limit:
+            if since is None:
+                start = max(end - limit, 0)
+            else:
+                end = min(start + limit, end)
+
+        rows = np.column_stack([timestamps[start:end], values[start:end]]).tolist()
+        for row in rows:
+            row[0] = int(row[0])
+        return rows
+
+    def _ticker(self, symbol):
+        timeframe = self._ticker_timeframe(symbol)
+        timestamps, values = self._series(symbol, timeframe)
+        # تعداد کندلهای 24 ساعت
+        day = max(86400 // ccxt.Exchange.parse_timeframe(timeframe), 1)
+        last = values[-1, 3]
+        day_ago = values[max(len(values) - day, 0), 0]
+        return {
+            'symbol': symbol,
+            'timestamp': int(timestamps[-1]),
+            'last': last,
+            'open': day_ago,
+            'high': values[-day:, 1].max(),
+            'low': values[-day:, 2].min(),
+            'percentage': (last - day_ago) / day_ago * 100,
+            'quoteVolume': float((values[-day:, 3] * values[-day:, 4]).sum()),
+            # فیلدهای خام مشتقات مثل تیکر bybit
+            'info': {
+                'fundingRate': str(round(float(np.clip((last - day_ago) / day_ago * 0.01, -0.0075, 0.0075)), 6)),
+                'openInterest': str(round(float(values[-3 * day:, 4].sum()), 2))
+            }
+        }
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        self._delay()
+        self._inject()
+        return self._ohlcv(symbol, timeframe, since, limit)
+
+    def fetch_ticker(self, symbol, params={}):
+        self._delay()
+        self._inject()
+        return self._ticker(symbol)
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._delay()
+        self._inject()
+        return {symbol: self._ticker(symbol) for symbol in (symbols or self._load_markets())}
+
+
+class AsyncReplayExchange(ReplayExchange):
+    """نسخه async (مشابه ccxt.async_support)"""
+
+    async def _delay_async(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def load_markets(self, reload=False, params={}):
+        await self._delay_async()
+        self._inject()
+        return self._load_markets()
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params={}):
+        await self._delay_async()
+        self._inject()
+        return self._ohlcv(symbol, timeframe, since, limit)
+
+    async def fetch_ticker(self, symbol, params={}):
+        await self._delay_async()
+        self._inject()
+        return self._ticker(symbol)
+
+    async def fetch_tickers(self, symbols=None, params={}):
+        await self._delay_async()
+        self._inject()
+        return {symbol: self._ticker(symbol) for symbol in (symbols or self._load_markets())}
+
+    async def close(self):
+        pass
+
+
+if __name__ == '__main__':
+    import argparse
+    from data_fetcher import ExchangeManager, PRIORITY_SCAN
+
+    parser = argparse.ArgumentParser(description='Record candles from a live exchange for the replay backend')
+    parser.add_argument('out', help='output directory (use as REPLAY_DATA_DIR)')
+    parser.add_argument('--exchange', default='kucoin')
+    parser.add_argument('--timeframe', default='15m')
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    manager = ExchangeManager(args.exchange)
+    symbols = manager.load_symbols(args.symbols)
+    os.makedirs(args.out, exist_ok=True)
+
+    recorder = ReplayExchange({'options': {'data_dir': args.out}})
+    recorded = []
+    for symbol in symbols:
+        try:
+            # از طریق زمانبند مشترک (محدودیت نرخ ccxt خاموش است)
+            rows = manager._request(PRIORITY_SCAN, 'fetch_ohlcv', symbol, args.timeframe, limit=args.limit)
+        except Exception as e:
+            print(f"❌ Error recording {symbol}: {e}")
+            continue
+        with open(recorder._symbol_file(symbol, args.timeframe), 'w') as f:
+            json.dump(rows, f)
+        recorded.append(symbol)
+
+    with open(os.path.join(args.out, 'symbols.json'), 'w') as f:
+        json.dump(recorded, f)
+    print(f"✅ Recorded {len(recorded)} symbols to {args.out}")
@@ -0,0 +1,95 @@
+"""
+ساخت تایم فریمهای بالاتر از یک تایم فریم پایه (مثلا 1h و 4h از 5m) بدون درخواست شبکه
+با رسیدن کندل پایه فقط کندل(های) تایم فریم بالاتر مربوط به همان بازه دوباره ساخته میشود
+"""
+import threading
+import numpy as np
+from candle_cache import CandleCache
+
+def resample(timestamps, values, timeframe_ms, drop_partial=True):
+    """
+    تجمیع کندلهای پایه در بازههای timeframe_ms (هم تراز با epoch مثل صرافیها)
+    open اولین، high بیشینه، low کمینه، close آخرین و volume جمع کندلهای هر بازه
+    drop_partial: حذف اولین بازه اگر تاریخچه پایه از وسط آن شروع شده باشد
+    """
+    if len(timestamps) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 5))
+
+    buckets = timestamps // timeframe_ms * timeframe_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    out = np.empty((len(starts), 5))
+    out[:, 0] = values[starts, 0]
+    out[:, 1] = np.maximum.reduceat(values[:, 1], starts)
+    out[:, 2] = np.minimum.reduceat(values[:, 2], starts)
+    out[:, 3] = values[ends, 3]
+    out[:, 4] = np.add.reduceat(values[:, 4], starts)
+    out_timestamps = buckets[starts]
+
+    if drop_partial and timestamps[0] != out_timestamps[0]:
+        return out_timestamps[1:], out[1:]
+    return out_timestamps, out
+
+
+class TimeframeResampler:
+    """
+    بافر کندلهای ساخته شده با کلید (exchange, symbol, timeframe)
+    هر کلید به تایم فریم پایهای که از آن ساخته شده وابسته است
+    """
+
+    def __init__(self, capacity=500):
+        self.cache = CandleCache(capacity)
+        self.depth = {}   # key -> limit آخرین ساخت از تاریخچه (برای جلوگیری از ساخت دوباره)
+        self.lock = threading.Lock()
+        self.builds = 0
+        self.updates = 0
+
+    def get(self, key, limit):
+        """کندلهای ساخته شده یا None اگر باید (دوباره) از تاریخچه پایه ساخته شوند"""
+        with self.lock:
+            if self.depth.get(key, 0) < limit:
+                return None
+        return self.cache.tail(key, limit)
+
+    def build(self, key, timestamps, values, timeframe_ms, limit):
+        """ساخت کامل از تاریخچه پایه"""
+        out_timestamps, out = resample(timestamps, values, timeframe_ms)
+        self.cache.update(key, np.column_stack([out_timestamps, out]), replace=True, min_capacity=limit)
+        with self.lock:
+            # تاریخچه کوتاه هم نگه داشته میشود؛ با افزایش تاریخچه پایه کلید حذف و دوباره ساخته میشود
+            self.depth[key] = limit
+            self.builds += 1
+        return self.cache.tail(key, limit)
+
+    def keys_for(self, exchange_id, symbol):
+        with self.lock:
+            return [key for key in self.depth if key[0] == exchange_id and key[1] == symbol]
+
+    def update(self, key, timestamps, values, timeframe_ms):
+        """
+        بروزرسانی افزایشی: timestamps/values کندلهای پایه از ابتدای اولین بازه تغییر کرده به بعد
+        فقط همان بازهها جایگزین یا اضافه میشوند؛ اگر بین کندلها شکاف باشد کلید حذف و بعدا دوباره ساخته میشود
+        """
+        out_timestamps, out = resample(timestamps, values, timeframe_ms, drop_partial=False)
+        if len(out_timestamps) == 0:
+            return
+
+        last = self.cache.last_timestamp(key)
+        if last is None or out_timestamps[0] > last + timeframe_ms:
+            self.remove(key)
+            return
+
+        self.cache.update(key, np.column_stack([out_timestamps, out]))
+        with self.lock:
+            self.updates += 1
+
+    def remove(self, key):
+        self.cache.remove(key)
+        with self.lock:
+            self.depth.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {'series': len(self.depth), 'builds': self.builds, 'updates': self.updates,
+                    **self.cache.stats()}
@@ -3,7 +3,7 @@
 """
 from datetime import datetime, timedelta
 from database import signal_db
-from data_fetcher import exchange_manager
+from data_fetcher import exchange_manager, PRIORITY_VALIDATION
 import threading
 import time
 
@@ -25,7 +25,7 @@ class SignalValidator:
             stop_loss = signal.get('stop_loss')
 
             # دریافت قیمت فعلی
-            ticker = exchange_manager.get_ticker(symbol)
+            ticker = exchange_manager.get_ticker(symbol, priority=PRIORITY_VALIDATION)
             if not ticker:
                 return None
 
@@ -90,7 +90,6 @@ class SignalValidator:
             result = self.validate_signal(signal)
             if result:
                 results.append(result)
-            time.sleep(0.2)  # Rate limiting
 
         return results
 
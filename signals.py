@@ -2,380 +2,439 @@
 🔥 سیستم سیگنالدهی پیشرفته
 Smart Money, Order Blocks, Liquidity Hunt, Divergence, Whale Detection
 """
-import pandas as pd
 import numpy as np
-from datetime import datetime
-from ta.trend import EMAIndicator
-from ta.momentum import RSIIndicator
-from ta.volatility import AverageTrueRange
-from indicators import TechnicalIndicators
+from indicators import TechnicalIndicators, IndicatorContext, requires
+from candles import as_candles
+from detector_registry import detector_registry
+
+def shifted(values, k=1):
+    """values[i - k] برای هر i (k اندیس اول NaN)"""
+    out = np.full(len(values), np.nan)
+    out[k:] = values[:len(values) - k]
+    return out
+
+class Rule:
+    """
+    یک قانون ستونی: شرط برداری و قدرت روی کل ستونها
+    fields(columns, i) کلیدهای بعد از strength را فقط برای سیگنالهای نهایی میسازد
+    """
+
+    __slots__ = ('type', 'signal', 'condition', 'strength', 'fields')
+
+    def __init__(self, type, signal, condition, strength, fields):
+        self.type = type
+        self.signal = signal
+        self.condition = condition   # columns -> آرایه bool
+        self.strength = strength     # columns -> آرایه (قبل از int)
+        self.fields = fields         # (columns, i) -> dict
+
+def run_rules(columns, rules, start, stop, limit=5, tail=None):
+    """
+    اجرای قانونها روی اندیسهای [start, stop)
+    مثل حلقه قبلی، از هر کندل به ترتیب rules؛ فقط limit سیگنال آخر (و در tail کندل آخر) ساخته میشود
+    """
+    if tail is not None:
+        start = max(start, stop - tail)
+    if start >= stop:
+        return []
+
+    events = []
+    for order, rule in enumerate(rules):
+        hits = np.flatnonzero(rule.condition(columns)[start:stop])[-limit:] + start
+        events.extend((int(i), order) for i in hits)
+
+    events.sort()
+    signals = []
+    strengths = {}
+    for i, order in events[-limit:]:
+        rule = rules[order]
+        if order not in strengths:
+            strengths[order] = rule.strength(columns)
+        signal = {
+            'index': i,
+            'type': rule.type,
+            'signal': rule.signal,
+            'strength': int(strengths[order][i])
+        }
+        signal.update(rule.fields(columns, i))
+        signals.append(signal)
+
+    return signals
+
+def _clip_strength(values, scale, cap, base=0):
+    """min(base + int(values * scale), cap) به صورت برداری"""
+    with np.errstate(invalid='ignore', over='ignore'):
+        return np.minimum(base + np.trunc(values * scale), cap)
+
+# --- قانونهای دتکتورها ---
+
+SMART_MONEY_RULES = [
+    Rule('SMART_MONEY_ACCUMULATION', 'BUY',
+         lambda c: (c['volume_ratio'] > c['threshold']) & (c['abs_change'] < 0.5),
+         lambda c: _clip_strength(c['volume_ratio'], 30, 95),
+         lambda c, i: {
+             'reason': f"💰 Smart Money Accumulation (Vol: {c['volume_ratio'][i]:.1f}x)",
+             'price': c['close'][i],
+             'timestamp': c['candles'].time_at(i)
+         }),
+    Rule('SMART_MONEY_DISTRIBUTION', 'SELL',
+         lambda c: (c['volume_ratio'] > c['threshold']) & (c['abs_change'] > 2) & (c['close'] > c['prev_close']),
+         lambda c: _clip_strength(c['volume_ratio'], 25, 90),
+         lambda c, i: {
+             'reason': f"💰 Smart Money Distribution (Vol: {c['volume_ratio'][i]:.1f}x)",
+             'price': c['close'][i],
+             'timestamp': c['candles'].time_at(i)
+         })
+]
+
+ORDER_BLOCK_RULES = [
+    Rule('BULLISH_ORDER_BLOCK', 'BUY',
+         lambda c: (c['prev_close'] < c['prev_open']) & (c['close'] > c['open']) &
+                   (c['close'] > c['prev_high']) & (c['bull_move'] > 0.5),
+         lambda c: _clip_strength(c['bull_move'], 20, 90),
+         lambda c, i: {
+             'price': c['close'][i],
+             'reason': f"📦 Bullish Order Block ({c['bull_move'][i]:.1f}% move)",
+             'timestamp': c['candles'].time_at(i)
+         }),
+    Rule('BEARISH_ORDER_BLOCK', 'SELL',
+         lambda c: (c['prev_close'] > c['prev_open']) & (c['close'] < c['open']) &
+                   (c['close'] < c['prev_low']) & (c['bear_move'] > 0.5),
+         lambda c: _clip_strength(c['bear_move'], 20, 90),
+         lambda c, i: {
+             'price': c['close'][i],
+             'reason': f"📦 Bearish Order Block ({c['bear_move'][i]:.1f}% move)",
+             'timestamp': c['candles'].time_at(i)
+         })
+]
+
+DIVERGENCE_RULES = [
+    Rule('BULLISH_DIVERGENCE', 'BUY',
+         lambda c: (c['close'] < c['close_back']) & (c['rsi'] > c['rsi_back']) & (c['rsi'] < 40),
+         lambda c: np.full(len(c['close']), 85),
+         lambda c, i: {
+             'price': c['close'][i],
+             'reason': f"📈 RSI Bullish Divergence (RSI: {c['rsi'][i]:.1f})",
+             'timestamp': c['candles'].time_at(i)
+         }),
+    Rule('BEARISH_DIVERGENCE', 'SELL',
+         lambda c: (c['close'] > c['close_back']) & (c['rsi'] < c['rsi_back']) & (c['rsi'] > 60),
+         lambda c: np.full(len(c['close']), 85),
+         lambda c, i: {
+             'price': c['close'][i],
+             'reason': f"📉 RSI Bearish Divergence (RSI: {c['rsi'][i]:.1f})",
+             'timestamp': c['candles'].time_at(i)
+         })
+]
+
+WHALE_RULES = [
+    Rule('WHALE_BUYING', 'BUY',
+         lambda c: (c['zscore'] > c['threshold']) & (c['price_change'] > 0.3),
+         lambda c: _clip_strength(c['zscore'], 8, 95, base=65),
+         lambda c, i: {
+             'price': c['close'][i],
+             'reason': f"🐋 Whale Buying (Vol Z: {c['zscore'][i]:.1f})",
+             'timestamp': c['candles'].time_at(i)
+         }),
+    Rule('WHALE_SELLING', 'SELL',
+         lambda c: (c['zscore'] > c['threshold']) & (c['price_change'] < -0.3),
+         lambda c: _clip_strength(c['zscore'], 8, 95, base=65),
+         lambda c, i: {
+             'price': c['close'][i],
+             'reason': f"🐋 Whale Selling (Vol Z: {c['zscore'][i]:.1f})",
+             'timestamp': c['candles'].time_at(i)
+         })
+]
 
 class AdvancedSignalEngine:
     """موتور سیگنالدهی پیشرفته"""
 
     @staticmethod
-    def detect_smart_money(df, volume_threshold=2.0):
+    @detector_registry.register('smart_money', order=10)
+    @requires('volume_sma_20', 'price_change')
+    def detect_smart_money(df, volume_threshold=2.0, tail=None):
         """تشخیص ورود و خروج پول هوشمند"""
         if len(df) < 30:
             return []
 
-        df = df.copy()
-        df['volume_sma'] = df['volume'].rolling(20).mean()
-        df['volume_ratio'] = df['volume'] / df['volume_sma']
-        df['price_change'] = df['close'].pct_change() * 100
-
-        signals = []
-
-        for i in range(20, len(df)):
-            vol_ratio = df['volume_ratio'].iloc[i]
-            price_change = abs(df['price_change'].iloc[i])
-
-            if pd.isna(vol_ratio):
-                continue
-
-            if vol_ratio > volume_threshold and price_change < 0.5:
-                signals.append({
-                    'index': i,
-                    'type': 'SMART_MONEY_ACCUMULATION',
-                    'signal': 'BUY',
-                    'strength': min(int(vol_ratio * 30), 95),
-                    'reason': f'💰 Smart Money Accumulation (Vol: {vol_ratio:.1f}x)',
-                    'price': df['close'].iloc[i],
-                    'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                })
-
-            elif vol_ratio > volume_threshold and price_change > 2:
-                if df['close'].iloc[i] > df['close'].iloc[i-1]:
-                    signals.append({
-                        'index': i,
-                        'type': 'SMART_MONEY_DISTRIBUTION',
-                        'signal': 'SELL',
-                        'strength': min(int(vol_ratio * 25), 90),
-                        'reason': f'💰 Smart Money Distribution (Vol: {vol_ratio:.1f}x)',
-                        'price': df['close'].iloc[i],
-                        'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                    })
-
-        return signals[-5:] if signals else []
+        candles = as_candles(df)
+        context = IndicatorContext.of(candles)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_ratio = candles.volume / context.column('volume_sma_20')
+        columns = {
+            'candles': candles,
+            'close': candles.close,
+            'prev_close': shifted(candles.close),
+            'volume_ratio': volume_ratio,
+            'abs_change': np.abs(context.column('price_change') * 100),
+            'threshold': volume_threshold
+        }
+        return run_rules(columns, SMART_MONEY_RULES, 20, len(candles), tail=tail)
 
     @staticmethod
-    def find_order_blocks(df):
+    @detector_registry.register('order_blocks', order=20)
+    def find_order_blocks(df, tail=None):
         """یافتن Order Blocks"""
         if len(df) < 10:
             return []
 
-        df = df.copy()
-        order_blocks = []
-
-        for i in range(3, len(df) - 1):
-            try:
-                if (df['close'].iloc[i-1] < df['open'].iloc[i-1] and
-                    df['close'].iloc[i] > df['open'].iloc[i] and
-                    df['close'].iloc[i] > df['high'].iloc[i-1]):
-
-                    move = ((df['close'].iloc[i] - df['low'].iloc[i-1]) / df['low'].iloc[i-1]) * 100
-
-                    if move > 0.5:
-                        order_blocks.append({
-                            'index': i,
-                            'type': 'BULLISH_ORDER_BLOCK',
-                            'signal': 'BUY',
-                            'strength': min(int(move * 20), 90),
-                            'price': df['close'].iloc[i],
-                            'reason': f'📦 Bullish Order Block ({move:.1f}% move)',
-                            'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                        })
-
-                if (df['close'].iloc[i-1] > df['open'].iloc[i-1] and
-                    df['close'].iloc[i] < df['open'].iloc[i] and
-                    df['close'].iloc[i] < df['low'].iloc[i-1]):
-
-                    move = ((df['high'].iloc[i-1] - df['close'].iloc[i]) / df['high'].iloc[i-1]) * 100
-
-                    if move > 0.5:
-                        order_blocks.append({
-                            'index': i,
-                            'type': 'BEARISH_ORDER_BLOCK',
-                            'signal': 'SELL',
-                            'strength': min(int(move * 20), 90),
-                            'price': df['close'].iloc[i],
-                            'reason': f'📦 Bearish Order Block ({move:.1f}% move)',
-                            'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                        })
-            except:
-                continue
-
-        return order_blocks[-5:] if order_blocks else []
+        candles = as_candles(df)
+        prev_high, prev_low = shifted(candles.high), shifted(candles.low)
+        columns = {
+            'candles': candles,
+            'open': candles.open,
+            'close': candles.close,
+            'prev_open': shifted(candles.open),
+            'prev_close': shifted(candles.close),
+            'prev_high': prev_high,
+            'prev_low': prev_low,
+            'bull_move': ((candles.close - prev_low) / prev_low) * 100,
+            'bear_move': ((prev_high - candles.close) / prev_high) * 100
+        }
+        # کندل آخر (در حال تشکیل) بررسی نمیشود
+        return run_rules(columns, ORDER_BLOCK_RULES, 3, len(candles) - 1, tail=tail)
 
     @staticmethod
+    @detector_registry.register('liquidity_hunt', order=30)
     def detect_liquidity_hunt(df, lookback=20):
-        """تشخیص شکار نقدینگی"""
-        if len(df) < lookback + 5:
-            return []
-
-        df = df.copy()
+        """
+        تشخیص شکار نقدینگی
+        lookback: عدد یا لیست (مثلا [10, 20, 50])؛ برای لیست، اکسترممهای همه پنجرهها در یک مرحله
+        محاسبه و سیگنالها با کلید lookback برگردانده میشوند
+        """
+        lookbacks = [lookback] if np.isscalar(lookback) else list(lookback)
+        candles = as_candles(df)
+        open_, high, low, close = candles.open, candles.high, candles.low, candles.close
+        n = len(close)
         signals = []
 
-        for i in range(lookback, len(df)):
-            try:
-                window = df.iloc[i-lookback:i]
-                current = df.iloc[i]
-
-                prev_high = window['high'].max()
-                prev_low = window['low'].min()
-
-                if (current['low'] < prev_low and
-                    current['close'] > prev_low and
-                    current['close'] > current['open']):
-
-                    hunt = ((prev_low - current['low']) / prev_low) * 100
+        for order, window in enumerate(lookbacks):
+            if n < window + 5:
+                continue
 
-                    signals.append({
+            # بیشینه/کمینه window کندل قبل از هر کندل i >= window
+            prev_high = TechnicalIndicators.window_extreme(high, window, 'max')[:n - window]
+            prev_low = TechnicalIndicators.window_extreme(low, window, 'min')[:n - window]
+            o, h, l, c = open_[window:], high[window:], low[window:], close[window:]
+
+            grab_low = (l < prev_low) & (c > prev_low) & (c > o)
+            grab_high = (h > prev_high) & (c < prev_high) & (c < o)
+
+            # دو شرط همزمان برقرار نمیشوند (کندل صعودی/نزولی)؛ فقط 5 مورد آخر ساخته میشود
+            hits = np.flatnonzero(grab_low | grab_high)[-5:]
+            for j in hits:
+                i = int(j) + window
+                if grab_low[j]:
+                    hunt = ((prev_low[j] - low[i]) / prev_low[j]) * 100
+                    signal = {
                         'index': i,
                         'type': 'LIQUIDITY_GRAB_LOW',
                         'signal': 'BUY',
                         'strength': min(75 + int(hunt * 10), 95),
-                        'price': current['close'],
-                        'stop_loss': current['low'] * 0.995,
+                        'price': close[i],
+                        'stop_loss': low[i] * 0.995,
                         'reason': f'🎯 Liquidity Hunt Below Support ({hunt:.2f}%)',
-                        'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                    })
-
-                if (current['high'] > prev_high and
-                    current['close'] < prev_high and
-                    current['close'] < current['open']):
-
-                    hunt = ((current['high'] - prev_high) / prev_high) * 100
-
-                    signals.append({
+                        'timestamp': candles.time_at(i)
+                    }
+                else:
+                    hunt = ((high[i] - prev_high[j]) / prev_high[j]) * 100
+                    signal = {
                         'index': i,
                         'type': 'LIQUIDITY_GRAB_HIGH',
                         'signal': 'SELL',
                         'strength': min(75 + int(hunt * 10), 95),
-                        'price': current['close'],
-                        'stop_loss': current['high'] * 1.005,
+                        'price': close[i],
+                        'stop_loss': high[i] * 1.005,
                         'reason': f'🎯 Liquidity Hunt Above Resistance ({hunt:.2f}%)',
-                        'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                    })
-            except:
-                continue
+                        'timestamp': candles.time_at(i)
+                    }
+                if len(lookbacks) > 1:
+                    signal['lookback'] = window
+                signals.append((i, order, signal))
 
-        return signals[-5:] if signals else []
+        signals.sort(key=lambda item: item[:2])
+        return [signal for _, _, signal in signals]
 
     @staticmethod
-    def find_divergences(df):
+    @detector_registry.register('divergence', order=40)
+    @requires('rsi')
+    def find_divergences(df, tail=None):
         """یافتن واگراییها"""
         if len(df) < 30:
             return []
 
-        df = df.copy()
-        df['rsi'] = RSIIndicator(df['close'], window=14).rsi()
-
-        divergences = []
+        candles = as_candles(df)
+        rsi = IndicatorContext.of(candles).column('rsi')
         lookback = 5
+        columns = {
+            'candles': candles,
+            'close': candles.close,
+            'close_back': shifted(candles.close, lookback),
+            'rsi': rsi,
+            'rsi_back': shifted(rsi, lookback)
+        }
+        return run_rules(columns, DIVERGENCE_RULES, lookback * 2, len(candles), tail=tail)
 
-        for i in range(lookback * 2, len(df)):
-            try:
-                if (df['close'].iloc[i] < df['close'].iloc[i-lookback] and
-                    df['rsi'].iloc[i] > df['rsi'].iloc[i-lookback] and
-                    df['rsi'].iloc[i] < 40):
-
-                    divergences.append({
-                        'index': i,
-                        'type': 'BULLISH_DIVERGENCE',
-                        'signal': 'BUY',
-                        'strength': 85,
-                        'price': df['close'].iloc[i],
-                        'reason': f'📈 RSI Bullish Divergence (RSI: {df["rsi"].iloc[i]:.1f})',
-                        'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                    })
-
-                if (df['close'].iloc[i] > df['close'].iloc[i-lookback] and
-                    df['rsi'].iloc[i] < df['rsi'].iloc[i-lookback] and
-                    df['rsi'].iloc[i] > 60):
+    @staticmethod
+    @detector_registry.register('whale', order=50)
+    @requires('volume_mean_50', 'volume_std_50')
+    def detect_whale_activity(df, std_multiplier=2.5, window=50, tail=None):
+        """
+        تشخیص فعالیت نهنگها (z-score حجم نسبت به window کندل)
+        window لیست باشد: z همه پنجرهها یک جا و برای هر کندل بیشترین z (با کلید window)
+        std_multiplier لیست باشد: کمترین آستانه شرط است و بزرگترین آستانه رد شده با کلید std_multiplier میآید
+        """
+        windows = [window] if np.isscalar(window) else list(window)
+        multipliers = np.sort(np.atleast_1d(std_multiplier))
+        candles = as_candles(df)
+        n = len(candles)
+        windows = [w for w in windows if n >= w + 10]
+        if not windows:
+            return []
 
-                    divergences.append({
-                        'index': i,
-                        'type': 'BEARISH_DIVERGENCE',
-                        'signal': 'SELL',
-                        'strength': 85,
-                        'price': df['close'].iloc[i],
-                        'reason': f'📉 RSI Bearish Divergence (RSI: {df["rsi"].iloc[i]:.1f})',
-                        'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                    })
-            except:
-                continue
-
-        return divergences[-5:] if divergences else []
-
-        @staticmethod
-        def detect_whale_activity(df, std_multiplier=2.5):
-            """تشخیص فعالیت نهنگها"""
-            if len(df) < 60:
-                return []
-
-            df = df.copy()
-            df['volume_mean'] = df['volume'].rolling(50).mean()
-            df['volume_std'] = df['volume'].rolling(50).std()
-
-            signals = []
-
-            for i in range(50, len(df)):
-                try:
-                    if df['volume_std'].iloc[i] == 0 or pd.isna(df['volume_std'].iloc[i]):
-                        continue
-
-                    zscore = (df['volume'].iloc[i] - df['volume_mean'].iloc[i]) / df['volume_std'].iloc[i]
-
-                    if zscore > std_multiplier:
-                        price_change = ((df['close'].iloc[i] - df['open'].iloc[i]) / df['open'].iloc[i]) * 100
-
-                        if price_change > 0.3:
-                            signals.append({
-                                'index': i,
-                                'type': 'WHALE_BUYING',
-                                'signal': 'BUY',
-                                'strength': min(65 + int(zscore * 8), 95),
-                                'price': df['close'].iloc[i],
-                                'reason': f'🐋 Whale Buying (Vol Z: {zscore:.1f})',
-                                'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                            })
-                        elif price_change < -0.3:
-                            signals.append({
-                                'index': i,
-                                'type': 'WHALE_SELLING',
-                                'signal': 'SELL',
-                                'strength': min(65 + int(zscore * 8), 95),
-                                'price': df['close'].iloc[i],
-                                'reason': f'🐋 Whale Selling (Vol Z: {zscore:.1f})',
-                                'timestamp': df['timestamp'].iloc[i] if 'timestamp' in df.columns else datetime.utcnow()
-                            })
-                except:
-                    continue
-
-            return signals[-5:] if signals else []
-
-
-    class PumpDumpDetector:
-        """تشخیص پامپ و دامپ"""
-
-        @staticmethod
-        def detect_pump(df, symbol, threshold=5, window=15):
-            """تشخیص پامپ"""
-            if len(df) < window + 50:
-                return []
-
-            alerts = []
-
-            try:
-                recent = df.tail(window)
-                start_price = recent['close'].iloc[0]
-                end_price = recent['close'].iloc[-1]
-                price_change = ((end_price - start_price) / start_price) * 100
-
-                avg_volume = df['volume'].tail(100).mean()
-                recent_volume = recent['volume'].mean()
-                volume_change = ((recent_volume - avg_volume) / avg_volume) * 100 if avg_volume > 0 else 0
-
-                if price_change >= threshold and volume_change > 30:
-                    alerts.append({
-                        'symbol': symbol,
-                        'alert_type': 'PUMP',
-                        'signal': 'BUY',
-                        'price': end_price,
-                        'price_change': round(price_change, 2),
-                        'volume_change': round(volume_change, 2),
-                        'strength': min(70 + int(price_change * 2), 95),
-                        'reason': f'🚀 PUMP! +{price_change:.1f}% | Vol +{volume_change:.0f}%',
-                        'timestamp': datetime.utcnow()
-                    })
-            except:
-                pass
-
-            return alerts
+        context = IndicatorContext.of(candles)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zscores = np.vstack([
+                (candles.volume - context.get('sma', window=w, source='volume')) /
+                context.get('std', window=w, source='volume', ddof=1)
+                for w in windows
+            ])
+            # انحراف معیار صفر یا NaN بررسی نمیشود
+            zscores[~np.isfinite(zscores)] = np.nan
+            price_change = ((candles.close - candles.open) / candles.open) * 100
+
+        best = np.argmax(np.nan_to_num(zscores, nan=-np.inf), axis=0)
+        columns = {
+            'candles': candles,
+            'close': candles.close,
+            'zscore': zscores[best, np.arange(n)],
+            'threshold': multipliers[0],
+            'price_change': price_change
+        }
+        signals = run_rules(columns, WHALE_RULES, min(windows), n, tail=tail)
+
+        for signal in signals:
+            i = signal['index']
+            if len(windows) > 1:
+                signal['window'] = windows[best[i]]
+            if len(multipliers) > 1:
+                signal['std_multiplier'] = float(multipliers[multipliers < columns['zscore'][i]][-1])
+        return signals
+
+
+class PumpDumpDetector:
+    """
+    تشخیص پامپ و دامپ روی کندلهای آخر
+    تغییر قیمت و حجم همه پنجرهها با یک کرنل (IndicatorContext window_change) و برای پامپ و دامپ مشترک
+    """
 
     @staticmethod
-    def detect_dump(df, symbol, threshold=5, window=15):
-        """تشخیص دامپ"""
-        if len(df) < window + 50:
+    def _detect(df, symbol, threshold, window, direction):
+        windows = [window] if np.isscalar(window) else list(window)
+        thresholds = np.sort(np.atleast_1d(threshold))
+        candles = as_candles(df)
+        n = len(candles)
+        windows = [w for w in windows if n >= w + 50]
+        if not windows:
             return []
 
-        alerts = []
-
-        try:
-            recent = df.tail(window)
-            start_price = recent['close'].iloc[0]
-            end_price = recent['close'].iloc[-1]
-            price_change = ((end_price - start_price) / start_price) * 100
+        price_change, volume_change = IndicatorContext.of(candles).get('window_change', windows=tuple(windows))
+        move = price_change * (1 if direction == 'PUMP' else -1)
+        passed = (move >= thresholds[0]) & (volume_change > 30)
+        if not passed.any():
+            return []
 
-            avg_volume = df['volume'].tail(100).mean()
-            recent_volume = recent['volume'].mean()
-            volume_change = ((recent_volume - avg_volume) / avg_volume) * 100 if avg_volume > 0 else 0
+        # قویترین پنجره (یک هشدار برای هر کندل)
+        k = int(np.argmax(np.where(passed, move, -np.inf)))
+        change, volume = price_change[k], volume_change[k]
+        if direction == 'PUMP':
+            reason = f'🚀 PUMP! +{change:.1f}% | Vol +{volume:.0f}%'
+        else:
+            reason = f'📉 DUMP! {change:.1f}% | Vol +{volume:.0f}%'
+
+        alert = {
+            'index': n - 1,
+            'symbol': symbol,
+            'type': direction,
+            'alert_type': direction,
+            'signal': 'BUY' if direction == 'PUMP' else 'SELL',
+            'price': candles.close[-1],
+            'price_change': round(change, 2),
+            'volume_change': round(volume, 2),
+            'strength': min(70 + int(move[k] * 2), 95),
+            'reason': reason,
+            'timestamp': candles.time_at(n - 1)
+        }
+        if len(windows) > 1:
+            alert['window'] = windows[k]
+        if len(thresholds) > 1:
+            alert['threshold'] = float(thresholds[thresholds <= move[k]][-1])
+        return [alert]
 
-            if price_change <= -threshold and volume_change > 30:
-                alerts.append({
-                    'symbol': symbol,
-                    'alert_type': 'DUMP',
-                    'signal': 'SELL',
-                    'price': end_price,
-                    'price_change': round(price_change, 2),
-                    'volume_change': round(volume_change, 2),
-                    'strength': min(70 + int(abs(price_change) * 2), 95),
-                    'reason': f'📉 DUMP! {price_change:.1f}% | Vol +{volume_change:.0f}%',
-                    'timestamp': datetime.utcnow()
-                })
-        except:
-            pass
+    @staticmethod
+    @detector_registry.register('pump', symbol=True, order=80)
+    def detect_pump(df, symbol, threshold=5, window=15):
+        """تشخیص پامپ"""
+        return PumpDumpDetector._detect(df, symbol, threshold, window, 'PUMP')
 
-        return alerts
+    @staticmethod
+    @detector_registry.register('dump', symbol=True, order=90)
+    def detect_dump(df, symbol, threshold=5, window=15):
+        """تشخیص دامپ"""
+        return PumpDumpDetector._detect(df, symbol, threshold, window, 'DUMP')
 
 
 class UltimateSignalGenerator:
-    """ترکیب همه روشها"""
-
-    def __init__(self):
-        self.engine = AdvancedSignalEngine()
-        self.pump_dump = PumpDumpDetector()
-        self.indicators = TechnicalIndicators()
-
-    def analyze(self, df, symbol):
-        """تحلیل کامل"""
+    """ترکیب همه روشها (دتکتورهای ثبت شده در detector_registry)"""
+
+    def __init__(self, registry=detector_registry):
+        self.registry = registry
+        # تابع lookup معیارهای مشتقات (مثلا DerivativesCache.lookup)؛ بدون درخواست شبکه
+        self.derivatives = None
+
+    def set_derivatives(self, lookup):
+        self.derivatives = lookup
+
+    def enrich(self, signals, symbol):
+        """افزودن funding / تغییرات OI آخرین snapshot به سیگنالهای ارز"""
+        if self.derivatives is None or not signals:
+            return signals
+        metrics = self.derivatives(symbol)
+        if metrics is not None:
+            for sig in signals:
+                sig['derivatives'] = metrics
+        return signals
+
+    def set_enabled(self, name, enabled=True):
+        """فعال/غیرفعال کردن یک دتکتور (اندیکاتورهایش هم دیگر محاسبه نمیشوند)"""
+        self.registry.set_enabled(name, enabled)
+
+    def required_columns(self, detectors=None):
+        """ستونهای اندیکاتور لازم برای دتکتورهای فعال"""
+        return self.registry.required_columns(detectors)
+
+    def analyze(self, df, symbol, detectors=None, enrich=True):
+        """
+        تحلیل کامل (detectors: فقط همین دتکتورها، None یعنی همه دتکتورهای فعال)
+        هر دتکتور جدا اجرا میشود؛ خطای یکی فقط سیگنالهای همان دتکتور را حذف میکند
+        enrich=False: بدون معیارهای مشتقات (پردازه کارگر؛ در پردازه اصلی اضافه میشوند)
+        """
         all_signals = []
+        df = as_candles(df)
 
-        try:
-            # سیگنالهای پیشرفته
-            smart_money = self.engine.detect_smart_money(df)
-            order_blocks = self.engine.find_order_blocks(df)
-            liquidity = self.engine.detect_liquidity_hunt(df)
-            divergence = self.engine.find_divergences(df)
-            whale = self.engine.detect_whale_activity(df)
-
-            # UT Bot
-            _, ut_alerts = self.indicators.ut_bot_alert(df)
-
-            # MA/EMA Cross
-            ma_crosses = self.indicators.detect_ma_ema_cross(df)
-
-            # پامپ و دامپ
-            pump = self.pump_dump.detect_pump(df, symbol)
-            dump = self.pump_dump.detect_dump(df, symbol)
-
-            for sig_list in [smart_money, order_blocks, liquidity, divergence, whale, ut_alerts, ma_crosses]:
-                for sig in sig_list:
+        for detector in self.registry.ordered():
+            if not detector.enabled or (detectors is not None and detector.name not in detectors):
+                continue
+            for sig in self.registry.run(detector, df, symbol):
+                if not detector.symbol:
                     sig['symbol'] = symbol
-                    all_signals.append(sig)
-
-            all_signals.extend(pump)
-            all_signals.extend(dump)
-
-        except Exception as e:
-            print(f"Error analyzing {symbol}: {e}")
+                all_signals.append(sig)
 
-        return all_signals
+        return self.enrich(all_signals, symbol) if enrich else all_signals
 
-    def get_best_signals(self, df, symbol, top_n=5):
+    def get_best_signals(self, df, symbol, top_n=5, detectors=None):
         """بهترین سیگنالها"""
-        signals = self.analyze(df, symbol)
+        signals = self.analyze(df, symbol, detectors)
         signals.sort(key=lambda x: x.get('strength', 0), reverse=True)
         return signals[:top_n]
 
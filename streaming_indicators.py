@@ -0,0 +1,356 @@
+"""
+اندیکاتورهای افزایشی (O(1) برای هر کندل جدید)
+هر (symbol, timeframe) یک IndicatorState دارد که فقط با کندل جدید یا بروزرسانی کندل در حال تشکیل جلو میرود
+مقادیر با ستونهای TechnicalIndicators.calculate_all (کتابخانه ta) روی همان تاریخچه برابرند
+
+هر جزء «وضعیت تا کندل قبلی» + «ورودی کندل آخر» را نگه میدارد:
+    push(x)     کندل جدید (ورودی قبلی قطعی میشود)
+    replace(x)  بروزرسانی کندل در حال تشکیل
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+import math
+import threading
+
+NAN = float('nan')
+
+def _isnan(x):
+    return x != x
+
+class _Stream(ABC):
+    """پایه: ورودی کندل آخر جدا از وضعیت قطعی نگه داشته میشود"""
+
+    __slots__ = ('x',)
+
+    def __init__(self):
+        self.x = None
+
+    def push(self, x):
+        if self.x is not None:
+            self._commit(self.x)
+        self.x = x
+
+    def replace(self, x):
+        self.x = x
+
+    @abstractmethod
+    def _commit(self, x):
+        """قطعی کردن ورودی کندل قبلی در وضعیت"""
+
+
+class Ema(_Stream):
+    """میانگین نمایی مثل pandas ewm(adjust=False)؛ NaN های ابتدای سری نادیده گرفته میشوند"""
+
+    __slots__ = ('alpha', 'min_periods', 'prev', 'count')
+
+    def __init__(self, alpha, min_periods):
+        super().__init__()
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.prev = None
+        self.count = 0
+
+    def _advance(self, x):
+        if self.prev is None:
+            return x
+        return (1 - self.alpha) * self.prev + self.alpha * x
+
+    def _commit(self, x):
+        if _isnan(x):
+            return
+        self.prev = self._advance(x)
+        self.count += 1
+
+    def value(self):
+        if self.x is None or _isnan(self.x) or self.count + 1 < self.min_periods:
+            return NAN
+        return self._advance(self.x)
+
+
+class Rolling(_Stream):
+    """جمع و جمع مربعات پنجره متحرک (SMA و انحراف معیار ddof=0)"""
+
+    __slots__ = ('window', 'values', 'total', 'total_sq', 'nans', 'commits')
+
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self.values = deque()  # حداکثر window - 1 ورودی قطعی آخر
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nans = 0
+        self.commits = 0
+
+    def _commit(self, x):
+        self.values.append(x)
+        if _isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+            self.total_sq += x * x
+
+        if len(self.values) > self.window - 1:
+            old = self.values.popleft()
+            if _isnan(old):
+                self.nans -= 1
+            else:
+                self.total -= old
+                self.total_sq -= old * old
+
+        # محاسبه دوباره دقیق هر window بار (سرشکن O(1)) برای جلوگیری از انباشت خطای اعشاری
+        self.commits += 1
+        if self.commits % self.window == 0:
+            finite = [v for v in self.values if not _isnan(v)]
+            self.total = math.fsum(finite)
+            self.total_sq = math.fsum(v * v for v in finite)
+
+    def _ready(self):
+        return (self.x is not None and not _isnan(self.x) and self.nans == 0
+                and len(self.values) + 1 >= self.window)
+
+    def mean(self):
+        if not self._ready():
+            return NAN
+        return (self.total + self.x) / self.window
+
+    def std(self):
+        if not self._ready():
+            return NAN
+        mean = (self.total + self.x) / self.window
+        variance = (self.total_sq + self.x * self.x) / self.window - mean * mean
+        return math.sqrt(max(variance, 0.0))
+
+
+class RollingExtreme(_Stream):
+    """کمینه/بیشینه پنجره متحرک با deque یکنوا"""
+
+    __slots__ = ('window', 'better', 'queue', 'index')
+
+    def __init__(self, window, mode='min'):
+        super().__init__()
+        self.window = window
+        self.better = (lambda a, b: a <= b) if mode == 'min' else (lambda a, b: a >= b)
+        self.queue = deque()  # (index, value) از window - 1 ورودی قطعی آخر
+        self.index = 0
+
+    def _commit(self, x):
+        while self.queue and self.better(x, self.queue[-1][1]):
+            self.queue.pop()
+        self.queue.append((self.index, x))
+        self.index += 1
+        while self.queue[0][0] <= self.index - self.window:
+            self.queue.popleft()
+
+    def value(self):
+        if self.x is None or self.index + 1 < self.window:
+            return NAN
+        if self.queue and self.better(self.queue[0][1], self.x):
+            return self.queue[0][1]
+        return self.x
+
+
+class WilderAtr(_Stream):
+    """ATR مثل ta.AverageTrueRange (صفر تا پر شدن پنجره، سپس میانگین وایلدر)"""
+
+    __slots__ = ('window', 'prev', 'warmup', 'count')
+
+    def __init__(self, window=14):
+        super().__init__()
+        self.window = window
+        self.prev = None
+        self.warmup = []
+        self.count = 0
+
+    def _advance(self, tr):
+        if self.prev is not None:
+            return (self.prev * (self.window - 1) + tr) / float(self.window)
+        if self.count + 1 == self.window:
+            return math.fsum(self.warmup + [tr]) / self.window
+        return 0.0
+
+    def _commit(self, tr):
+        if self.prev is None and self.count + 1 < self.window:
+            self.warmup.append(tr)
+        else:
+            self.prev = self._advance(tr)
+        self.count += 1
+
+    def value(self):
+        if self.x is None:
+            return NAN
+        return self._advance(self.x)
+
+
+SMA_WINDOWS = (7, 20, 50, 100, 200)
+EMA_WINDOWS = (9, 12, 21, 26, 50)
+RSI_WINDOWS = (14, 7)
+
+class IndicatorState:
+    """وضعیت همه اندیکاتورهای calculate_all برای یک ارز/تایم فریم"""
+
+    def __init__(self):
+        self.last_timestamp = None
+        self.count = 0
+        self.prev_close = None   # close قطعی کندل قبلی
+        self.bar = None          # (high, low, close) کندل آخر
+
+        self.sma = {w: Rolling(w) for w in SMA_WINDOWS}
+        self.ema = {w: Ema(2 / (w + 1), w) for w in EMA_WINDOWS}
+        self.rsi = {w: (Ema(1 / w, w), Ema(1 / w, w)) for w in RSI_WINDOWS}
+        self.macd_signal = Ema(2 / 10, 9)
+        self.atr = WilderAtr(14)
+        self.stoch_low = RollingExtreme(14, 'min')
+        self.stoch_high = RollingExtreme(14, 'max')
+        self.stoch_d = Rolling(3)
+
+    def update(self, timestamp, high, low, close):
+        """اعمال یک کندل؛ کندل جدید push و کندل هم زمان با آخرین کندل replace میشود"""
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            return False
+
+        new_bar = self.last_timestamp is None or timestamp > self.last_timestamp
+        if new_bar:
+            if self.bar is not None:
+                self.prev_close = self.bar[2]
+            self.count += 1
+        self.last_timestamp = timestamp
+        self.bar = (high, low, close)
+        step = 'push' if new_bar else 'replace'
+
+        def feed(stream, x):
+            getattr(stream, step)(x)
+
+        for stream in self.sma.values():
+            feed(stream, close)
+        for stream in self.ema.values():
+            feed(stream, close)
+
+        diff = close - self.prev_close if self.prev_close is not None else NAN
+        for up, down in self.rsi.values():
+            feed(up, diff if diff > 0 else 0.0)
+            feed(down, -diff if diff < 0 else 0.0)
+
+        feed(self.macd_signal, self.ema[12].value() - self.ema[26].value())
+
+        if self.prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        feed(self.atr, true_range)
+
+        feed(self.stoch_low, low)
+        feed(self.stoch_high, high)
+        feed(self.stoch_d, self._stoch_k())
+        return True
+
+    def _stoch_k(self):
+        low = self.stoch_low.value()
+        high = self.stoch_high.value()
+        close = self.bar[2]
+        if _isnan(low) or _isnan(high):
+            return NAN
+        if high == low:
+            return NAN if close == low else math.copysign(math.inf, close - low)
+        return 100 * (close - low) / (high - low)
+
+    @staticmethod
+    def _rsi(up, down):
+        up_value, down_value = up.value(), down.value()
+        if down_value == 0:
+            return 100.0
+        if _isnan(up_value) or _isnan(down_value):
+            return NAN
+        return 100 - (100 / (1 + up_value / down_value))
+
+    def values(self):
+        """مقادیر آخرین کندل با همان نام ستونهای calculate_all"""
+        if self.bar is None:
+            return {}
+
+        close = self.bar[2]
+        result = {'close': close}
+        for w, stream in self.sma.items():
+            result[f'ma_{w}'] = stream.mean()
+        for w, stream in self.ema.items():
+            result[f'ema_{w}'] = stream.value()
+
+        result['rsi'] = self._rsi(*self.rsi[14])
+        result['rsi_7'] = self._rsi(*self.rsi[7])
+
+        macd = self.ema[12].value() - self.ema[26].value()
+        signal = self.macd_signal.value()
+        result['macd'] = macd
+        result['macd_signal'] = signal
+        result['macd_histogram'] = macd - signal
+
+        middle = self.sma[20].mean()
+        std = self.sma[20].std()
+        result['bb_upper'] = middle + 2 * std
+        result['bb_middle'] = middle
+        result['bb_lower'] = middle - 2 * std
+        result['bb_width'] = (result['bb_upper'] - result['bb_lower']) / middle if middle else NAN
+
+        atr = self.atr.value()
+        result['atr'] = atr
+        result['atr_percent'] = atr / close * 100
+
+        result['stoch_k'] = self._stoch_k()
+        result['stoch_d'] = self.stoch_d.mean()
+        return result
+
+
+class IndicatorStateStore:
+    """نگهداری IndicatorState ها با کلید (symbol, timeframe)"""
+
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def sync(self, key, candles):
+        """
+        جلو بردن وضعیت با کندلهای جدید
+        اگر ادامه پیوستهای نباشد (شکاف یا اولین بار)، وضعیت از همین کندلها ساخته میشود
+        """
+        timestamps = candles.timestamp
+        with self.lock:
+            state = self.states.get(key)
+            start = 0
+
+            if state is not None and state.last_timestamp is not None and len(timestamps):
+                position = int(timestamps.searchsorted(state.last_timestamp))
+                if position < len(timestamps) and timestamps[position] == state.last_timestamp:
+                    start = position
+                else:
+                    state = None
+
+            if state is None:
+                state = IndicatorState()
+                self.states[key] = state
+
+            high, low, close = candles.high, candles.low, candles.close
+            for i in range(start, len(timestamps)):
+                state.update(int(timestamps[i]), float(high[i]), float(low[i]), float(close[i]))
+
+            return state.values()
+
+    def apply(self, key, candle, timeframe_ms):
+        """
+        کندل استریم [ts, open, high, low, close, volume] در O(1)
+        فقط وضعیتهای موجود جلو میروند؛ با شکاف وضعیت حذف و در sync بعدی از کندلها ساخته میشود
+        """
+        with self.lock:
+            state = self.states.get(key)
+            if state is None:
+                return
+            if candle[0] > state.last_timestamp + timeframe_ms:
+                del self.states[key]
+                return
+            state.update(int(candle[0]), float(candle[2]), float(candle[3]), float(candle[4]))
+
+    def get(self, key):
+        with self.lock:
+            state = self.states.get(key)
+            return state.values() if state is not None else {}
+
+# نمونه گلوبال
+indicator_states = IndicatorStateStore()
@@ -0,0 +1,480 @@
+"""
+پیادهسازی اصلی (نسخه baseline) اندیکاتورها و دتکتورها با حلقه pandas و کتابخانه ta
+مرجع تستهای برابری و زمانسنجی benchmark.py؛ منطق بدون تغییر، فقط فیلد timestamp حذف شده
+"""
+import pandas as pd
+from ta.trend import EMAIndicator, SMAIndicator, MACD
+from ta.momentum import RSIIndicator, StochasticOscillator
+from ta.volatility import BollingerBands, AverageTrueRange
+
+
+def calculate_all(df):
+    """محاسبه همه اندیکاتورها"""
+    if len(df) < 50:
+        return df
+
+    df = df.copy()
+
+    # Moving Averages
+    df['ma_7'] = SMAIndicator(df['close'], window=7).sma_indicator()
+    df['ma_20'] = SMAIndicator(df['close'], window=20).sma_indicator()
+    df['ma_50'] = SMAIndicator(df['close'], window=50).sma_indicator()
+    df['ma_100'] = SMAIndicator(df['close'], window=100).sma_indicator()
+    df['ma_200'] = SMAIndicator(df['close'], window=200).sma_indicator()
+
+    # EMA
+    df['ema_9'] = EMAIndicator(df['close'], window=9).ema_indicator()
+    df['ema_12'] = EMAIndicator(df['close'], window=12).ema_indicator()
+    df['ema_21'] = EMAIndicator(df['close'], window=21).ema_indicator()
+    df['ema_26'] = EMAIndicator(df['close'], window=26).ema_indicator()
+    df['ema_50'] = EMAIndicator(df['close'], window=50).ema_indicator()
+
+    # RSI
+    df['rsi'] = RSIIndicator(df['close'], window=14).rsi()
+    df['rsi_7'] = RSIIndicator(df['close'], window=7).rsi()
+
+    # MACD
+    macd = MACD(df['close'])
+    df['macd'] = macd.macd()
+    df['macd_signal'] = macd.macd_signal()
+    df['macd_histogram'] = macd.macd_diff()
+
+    # Bollinger Bands
+    bb = BollingerBands(df['close'], window=20, window_dev=2)
+    df['bb_upper'] = bb.bollinger_hband()
+    df['bb_middle'] = bb.bollinger_mavg()
+    df['bb_lower'] = bb.bollinger_lband()
+    df['bb_width'] = (df['bb_upper'] - df['bb_lower']) / df['bb_middle']
+
+    # ATR
+    atr = AverageTrueRange(df['high'], df['low'], df['close'], window=14)
+    df['atr'] = atr.average_true_range()
+    df['atr_percent'] = (df['atr'] / df['close']) * 100
+
+    # Stochastic
+    stoch = StochasticOscillator(df['high'], df['low'], df['close'])
+    df['stoch_k'] = stoch.stoch()
+    df['stoch_d'] = stoch.stoch_signal()
+
+    return df
+
+
+def ut_bot_alert(df, sensitivity=1, atr_period=10):
+    """UT Bot Alert با حلقه iloc"""
+    if len(df) < atr_period + 10:
+        return df, []
+
+    df = df.copy()
+
+    atr = AverageTrueRange(df['high'], df['low'], df['close'], window=atr_period)
+    df['ut_atr'] = atr.average_true_range()
+    df['ut_nLoss'] = sensitivity * df['ut_atr']
+
+    df['ut_xATRTrailingStop'] = 0.0
+
+    for i in range(1, len(df)):
+        nLoss = df['ut_nLoss'].iloc[i]
+        prev_stop = df['ut_xATRTrailingStop'].iloc[i-1]
+        close = df['close'].iloc[i]
+        prev_close = df['close'].iloc[i-1]
+
+        if close > prev_stop and prev_close > prev_stop:
+            df.loc[df.index[i], 'ut_xATRTrailingStop'] = max(prev_stop, close - nLoss)
+        elif close < prev_stop and prev_close < prev_stop:
+            df.loc[df.index[i], 'ut_xATRTrailingStop'] = min(prev_stop, close + nLoss)
+        elif close > prev_stop:
+            df.loc[df.index[i], 'ut_xATRTrailingStop'] = close - nLoss
+        else:
+            df.loc[df.index[i], 'ut_xATRTrailingStop'] = close + nLoss
+
+    df['ut_pos'] = 0
+    df.loc[df['close'] > df['ut_xATRTrailingStop'], 'ut_pos'] = 1
+    df.loc[df['close'] < df['ut_xATRTrailingStop'], 'ut_pos'] = -1
+
+    df['ut_signal'] = df['ut_pos'].diff()
+
+    alerts = []
+    for i in range(1, len(df)):
+        if df['ut_signal'].iloc[i] == 2:  # Buy
+            alerts.append({
+                'index': i,
+                'type': 'UT_BOT_BUY',
+                'signal': 'BUY',
+                'price': df['close'].iloc[i],
+                'stop': df['ut_xATRTrailingStop'].iloc[i],
+                'strength': 80,
+                'reason': f'📈 UT Bot Buy Signal (Stop: {df["ut_xATRTrailingStop"].iloc[i]:.4f})'
+            })
+        elif df['ut_signal'].iloc[i] == -2:  # Sell
+            alerts.append({
+                'index': i,
+                'type': 'UT_BOT_SELL',
+                'signal': 'SELL',
+                'price': df['close'].iloc[i],
+                'stop': df['ut_xATRTrailingStop'].iloc[i],
+                'strength': 80,
+                'reason': f'📉 UT Bot Sell Signal (Stop: {df["ut_xATRTrailingStop"].iloc[i]:.4f})'
+            })
+
+    return df, alerts[-5:] if alerts else []
+
+
+def detect_ma_ema_cross(df):
+    """تقاطع EMA 9/21 و MA 20/50"""
+    if len(df) < 55:
+        return []
+
+    df = df.copy()
+
+    if 'ema_9' not in df.columns:
+        df = calculate_all(df)
+
+    crosses = []
+
+    for i in range(1, len(df)):
+        if (df['ema_9'].iloc[i] > df['ema_21'].iloc[i] and
+            df['ema_9'].iloc[i-1] <= df['ema_21'].iloc[i-1]):
+            crosses.append({
+                'index': i,
+                'type': 'EMA_GOLDEN_CROSS',
+                'signal': 'BUY',
+                'strength': 75,
+                'price': df['close'].iloc[i],
+                'reason': '🔀 EMA 9/21 Golden Cross (BUY)'
+            })
+
+        elif (df['ema_9'].iloc[i] < df['ema_21'].iloc[i] and
+              df['ema_9'].iloc[i-1] >= df['ema_21'].iloc[i-1]):
+            crosses.append({
+                'index': i,
+                'type': 'EMA_DEATH_CROSS',
+                'signal': 'SELL',
+                'strength': 75,
+                'price': df['close'].iloc[i],
+                'reason': '🔀 EMA 9/21 Death Cross (SELL)'
+            })
+
+        if pd.notna(df['ma_50'].iloc[i]) and pd.notna(df['ma_50'].iloc[i-1]):
+            if (df['ma_20'].iloc[i] > df['ma_50'].iloc[i] and
+                df['ma_20'].iloc[i-1] <= df['ma_50'].iloc[i-1]):
+                crosses.append({
+                    'index': i,
+                    'type': 'MA_GOLDEN_CROSS',
+                    'signal': 'BUY',
+                    'strength': 85,
+                    'price': df['close'].iloc[i],
+                    'reason': '🌟 MA 20/50 Golden Cross (Strong BUY)'
+                })
+
+            elif (df['ma_20'].iloc[i] < df['ma_50'].iloc[i] and
+                  df['ma_20'].iloc[i-1] >= df['ma_50'].iloc[i-1]):
+                crosses.append({
+                    'index': i,
+                    'type': 'MA_DEATH_CROSS',
+                    'signal': 'SELL',
+                    'strength': 85,
+                    'price': df['close'].iloc[i],
+                    'reason': '💀 MA 20/50 Death Cross (Strong SELL)'
+                })
+
+    return crosses[-10:] if crosses else []
+
+
+def detect_smart_money(df, volume_threshold=2.0):
+    """ورود و خروج پول هوشمند"""
+    if len(df) < 30:
+        return []
+
+    df = df.copy()
+    df['volume_sma'] = df['volume'].rolling(20).mean()
+    df['volume_ratio'] = df['volume'] / df['volume_sma']
+    df['price_change'] = df['close'].pct_change() * 100
+
+    signals = []
+
+    for i in range(20, len(df)):
+        vol_ratio = df['volume_ratio'].iloc[i]
+        price_change = abs(df['price_change'].iloc[i])
+
+        if pd.isna(vol_ratio):
+            continue
+
+        if vol_ratio > volume_threshold and price_change < 0.5:
+            signals.append({
+                'index': i,
+                'type': 'SMART_MONEY_ACCUMULATION',
+                'signal': 'BUY',
+                'strength': min(int(vol_ratio * 30), 95),
+                'reason': f'💰 Smart Money Accumulation (Vol: {vol_ratio:.1f}x)',
+                'price': df['close'].iloc[i]
+            })
+
+        elif vol_ratio > volume_threshold and price_change > 2:
+            if df['close'].iloc[i] > df['close'].iloc[i-1]:
+                signals.append({
+                    'index': i,
+                    'type': 'SMART_MONEY_DISTRIBUTION',
+                    'signal': 'SELL',
+                    'strength': min(int(vol_ratio * 25), 90),
+                    'reason': f'💰 Smart Money Distribution (Vol: {vol_ratio:.1f}x)',
+                    'price': df['close'].iloc[i]
+                })
+
+    return signals[-5:] if signals else []
+
+
+def find_order_blocks(df):
+    """Order Blocks"""
+    if len(df) < 10:
+        return []
+
+    df = df.copy()
+    order_blocks = []
+
+    for i in range(3, len(df) - 1):
+        try:
+            if (df['close'].iloc[i-1] < df['open'].iloc[i-1] and
+                df['close'].iloc[i] > df['open'].iloc[i] and
+                df['close'].iloc[i] > df['high'].iloc[i-1]):
+
+                move = ((df['close'].iloc[i] - df['low'].iloc[i-1]) / df['low'].iloc[i-1]) * 100
+
+                if move > 0.5:
+                    order_blocks.append({
+                        'index': i,
+                        'type': 'BULLISH_ORDER_BLOCK',
+                        'signal': 'BUY',
+                        'strength': min(int(move * 20), 90),
+                        'price': df['close'].iloc[i],
+                        'reason': f'📦 Bullish Order Block ({move:.1f}% move)'
+                    })
+
+            if (df['close'].iloc[i-1] > df['open'].iloc[i-1] and
+                df['close'].iloc[i] < df['open'].iloc[i] and
+                df['close'].iloc[i] < df['low'].iloc[i-1]):
+
+                move = ((df['high'].iloc[i-1] - df['close'].iloc[i]) / df['high'].iloc[i-1]) * 100
+
+                if move > 0.5:
+                    order_blocks.append({
+                        'index': i,
+                        'type': 'BEARISH_ORDER_BLOCK',
+                        'signal': 'SELL',
+                        'strength': min(int(move * 20), 90),
+                        'price': df['close'].iloc[i],
+                        'reason': f'📦 Bearish Order Block ({move:.1f}% move)'
+                    })
+        except:
+            continue
+
+    return order_blocks[-5:] if order_blocks else []
+
+
+def detect_liquidity_hunt(df, lookback=20):
+    """شکار نقدینگی (برش پنجره برای هر کندل)"""
+    if len(df) < lookback + 5:
+        return []
+
+    df = df.copy()
+    signals = []
+
+    for i in range(lookback, len(df)):
+        try:
+            window = df.iloc[i-lookback:i]
+            current = df.iloc[i]
+
+            prev_high = window['high'].max()
+            prev_low = window['low'].min()
+
+            if (current['low'] < prev_low and
+                current['close'] > prev_low and
+                current['close'] > current['open']):
+
+                hunt = ((prev_low - current['low']) / prev_low) * 100
+
+                signals.append({
+                    'index': i,
+                    'type': 'LIQUIDITY_GRAB_LOW',
+                    'signal': 'BUY',
+                    'strength': min(75 + int(hunt * 10), 95),
+                    'price': current['close'],
+                    'stop_loss': current['low'] * 0.995,
+                    'reason': f'🎯 Liquidity Hunt Below Support ({hunt:.2f}%)'
+                })
+
+            if (current['high'] > prev_high and
+                current['close'] < prev_high and
+                current['close'] < current['open']):
+
+                hunt = ((current['high'] - prev_high) / prev_high) * 100
+
+                signals.append({
+                    'index': i,
+                    'type': 'LIQUIDITY_GRAB_HIGH',
+                    'signal': 'SELL',
+                    'strength': min(75 + int(hunt * 10), 95),
+                    'price': current['close'],
+                    'stop_loss': current['high'] * 1.005,
+                    'reason': f'🎯 Liquidity Hunt Above Resistance ({hunt:.2f}%)'
+                })
+        except:
+            continue
+
+    return signals[-5:] if signals else []
+
+
+def find_divergences(df):
+    """واگرایی RSI (RSI از ta)"""
+    if len(df) < 30:
+        return []
+
+    df = df.copy()
+    df['rsi'] = RSIIndicator(df['close'], window=14).rsi()
+
+    divergences = []
+    lookback = 5
+
+    for i in range(lookback * 2, len(df)):
+        try:
+            if (df['close'].iloc[i] < df['close'].iloc[i-lookback] and
+                df['rsi'].iloc[i] > df['rsi'].iloc[i-lookback] and
+                df['rsi'].iloc[i] < 40):
+
+                divergences.append({
+                    'index': i,
+                    'type': 'BULLISH_DIVERGENCE',
+                    'signal': 'BUY',
+                    'strength': 85,
+                    'price': df['close'].iloc[i],
+                    'reason': f'📈 RSI Bullish Divergence (RSI: {df["rsi"].iloc[i]:.1f})'
+                })
+
+            if (df['close'].iloc[i] > df['close'].iloc[i-lookback] and
+                df['rsi'].iloc[i] < df['rsi'].iloc[i-lookback] and
+                df['rsi'].iloc[i] > 60):
+
+                divergences.append({
+                    'index': i,
+                    'type': 'BEARISH_DIVERGENCE',
+                    'signal': 'SELL',
+                    'strength': 85,
+                    'price': df['close'].iloc[i],
+                    'reason': f'📉 RSI Bearish Divergence (RSI: {df["rsi"].iloc[i]:.1f})'
+                })
+        except:
+            continue
+
+    return divergences[-5:] if divergences else []
+
+
+def detect_whale_activity(df, std_multiplier=2.5):
+    """فعالیت نهنگها (z-score حجم)"""
+    if len(df) < 60:
+        return []
+
+    df = df.copy()
+    df['volume_mean'] = df['volume'].rolling(50).mean()
+    df['volume_std'] = df['volume'].rolling(50).std()
+
+    signals = []
+
+    for i in range(50, len(df)):
+        try:
+            if df['volume_std'].iloc[i] == 0 or pd.isna(df['volume_std'].iloc[i]):
+                continue
+
+            zscore = (df['volume'].iloc[i] - df['volume_mean'].iloc[i]) / df['volume_std'].iloc[i]
+
+            if zscore > std_multiplier:
+                price_change = ((df['close'].iloc[i] - df['open'].iloc[i]) / df['open'].iloc[i]) * 100
+
+                if price_change > 0.3:
+                    signals.append({
+                        'index': i,
+                        'type': 'WHALE_BUYING',
+                        'signal': 'BUY',
+                        'strength': min(65 + int(zscore * 8), 95),
+                        'price': df['close'].iloc[i],
+                        'reason': f'🐋 Whale Buying (Vol Z: {zscore:.1f})'
+                    })
+                elif price_change < -0.3:
+                    signals.append({
+                        'index': i,
+                        'type': 'WHALE_SELLING',
+                        'signal': 'SELL',
+                        'strength': min(65 + int(zscore * 8), 95),
+                        'price': df['close'].iloc[i],
+                        'reason': f'🐋 Whale Selling (Vol Z: {zscore:.1f})'
+                    })
+        except:
+            continue
+
+    return signals[-5:] if signals else []
+
+
+def detect_pump(df, symbol, threshold=5, window=15):
+    """پامپ: تغییر قیمت پنجره آخر و حجم نسبت به میانگین 100 کندل"""
+    if len(df) < window + 50:
+        return []
+
+    alerts = []
+
+    try:
+        recent = df.tail(window)
+        start_price = recent['close'].iloc[0]
+        end_price = recent['close'].iloc[-1]
+        price_change = ((end_price - start_price) / start_price) * 100
+
+        avg_volume = df['volume'].tail(100).mean()
+        recent_volume = recent['volume'].mean()
+        volume_change = ((recent_volume - avg_volume) / avg_volume) * 100 if avg_volume > 0 else 0
+
+        if price_change >= threshold and volume_change > 30:
+            alerts.append({
+                'symbol': symbol,
+                'alert_type': 'PUMP',
+                'signal': 'BUY',
+                'price': end_price,
+                'price_change': round(price_change, 2),
+                'volume_change': round(volume_change, 2),
+                'strength': min(70 + int(price_change * 2), 95),
+                'reason': f'🚀 PUMP! +{price_change:.1f}% | Vol +{volume_change:.0f}%'
+            })
+    except:
+        pass
+
+    return alerts
+
+
+def detect_dump(df, symbol, threshold=5, window=15):
+    """دامپ"""
+    if len(df) < window + 50:
+        return []
+
+    alerts = []
+
+    try:
+        recent = df.tail(window)
+        start_price = recent['close'].iloc[0]
+        end_price = recent['close'].iloc[-1]
+        price_change = ((end_price - start_price) / start_price) * 100
+
+        avg_volume = df['volume'].tail(100).mean()
+        recent_volume = recent['volume'].mean()
+        volume_change = ((recent_volume - avg_volume) / avg_volume) * 100 if avg_volume > 0 else 0
+
+        if price_change <= -threshold and volume_change > 30:
+            alerts.append({
+                'symbol': symbol,
+                'alert_type': 'DUMP',
+                'signal': 'SELL',
+                'price': end_price,
+                'price_change': round(price_change, 2),
+                'volume_change': round(volume_change, 2),
+                'strength': min(70 + int(abs(price_change) * 2), 95),
+                'reason': f'📉 DUMP! {price_change:.1f}% | Vol +{volume_change:.0f}%'
+            })
+    except:
+        pass
+
+    return alerts
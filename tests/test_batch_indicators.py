@@ -0,0 +1,62 @@
+"""
+prefill ماتریسی همه ارزها همان مقادیر IndicatorContext تک ارزی را میدهد
+"""
+import numpy as np
+import pandas as pd
+
+from candles import Candles
+from indicators import TechnicalIndicators, IndicatorContext, COLUMNS
+from tests.test_legacy_parity import random_candles
+
+def test_prefill_matches_single_context():
+    universe = [Candles.from_frame(random_candles(seed, 200)) for seed in range(12)]
+    columns = list(COLUMNS)
+
+    def fresh():
+        return [Candles(c.timestamp, c.open, c.high, c.low, c.close, c.volume) for c in universe]
+
+    single, batched = fresh(), fresh()
+    TechnicalIndicators.prefill(batched, columns)
+    for a, b in zip(single, batched):
+        expected = IndicatorContext(a).require(columns)
+        actual = IndicatorContext.of(b).require(columns)
+        for name in columns:
+            assert np.array_equal(expected[name], actual[name], equal_nan=True), name
+
+def test_rolling_kernels_match_pandas():
+    rng = np.random.default_rng(3)
+    values = rng.normal(0, 1, (300, 8)) * 10.0 ** rng.integers(-3, 6, 8)
+    values[40:90, 1] = 2.5          # مقدار ثابت (شاخه same در pandas)
+    values[:, 2] = np.abs(values[:, 2])
+    values[:, 3] = -np.abs(values[:, 3])
+    with_nan = values.copy()
+    with_nan[rng.random(values.shape) < 0.05] = np.nan
+    # NaN فقط در سطرهای ابتدایی (مثل ورودی macd_signal و stoch_d)
+    leading = values.copy()
+    leading[:25] = np.nan
+
+    for matrix in (values, with_nan, leading):
+        frame = pd.DataFrame(matrix)
+        for window in (2, 7, 20, 50):
+            rolling = frame.rolling(window, min_periods=window)
+            assert np.array_equal(TechnicalIndicators.rolling_mean_batch(matrix, window),
+                                  rolling.mean().to_numpy(), equal_nan=True), window
+            for ddof in (0, 1):
+                assert np.array_equal(TechnicalIndicators.rolling_std_batch(matrix, window, ddof),
+                                      rolling.std(ddof=ddof).to_numpy(), equal_nan=True), (window, ddof)
+
+def test_ewm_kernel_matches_pandas():
+    rng = np.random.default_rng(4)
+    values = rng.normal(100, 5, (200, 6))
+    values[30:60, 0] = 101.0
+    with_nan = values.copy()
+    with_nan[rng.random(values.shape) < 0.05] = np.nan
+    leading = values.copy()
+    leading[:25] = np.nan
+
+    for matrix in (values, with_nan, leading):
+        for span, min_periods in ((9, 9), (26, 26), (14, 0)):
+            com = (span - 1) / 2
+            expected = pd.DataFrame(matrix).ewm(span=span, min_periods=min_periods, adjust=False).mean()
+            assert np.array_equal(TechnicalIndicators.ewm_mean_batch(matrix, com, min_periods),
+                                  expected.to_numpy(), equal_nan=True), (span, min_periods)
@@ -0,0 +1,30 @@
+"""
+کلید طبیعی رویدادهای دفتر سفارش: دیوار ماندگار یا دوباره گذاشته شده در هر بازه یک رویداد
+"""
+from order_book import OrderBookManager
+
+SYMBOL = 'BTC/USDT:USDT'
+START = 1700000100000   # ابتدای یک بازه 300 ثانیهای
+
+def diff(nonce, timestamp, bids=(), asks=()):
+    return {'type': 'book_diff', 'symbol': SYMBOL, 'bids': list(bids), 'asks': list(asks),
+            'nonce': nonce, 'timestamp': timestamp}
+
+def walls(events):
+    return [e for e in events if e['type'] == 'BID_WALL']
+
+def test_wall_events_share_bucket_key():
+    books = OrderBookManager([SYMBOL], bucket=300)
+    books.apply({'type': 'book_snapshot', 'symbol': SYMBOL, 'nonce': 1, 'timestamp': START,
+                 'bids': [[100 - i, 1] for i in range(10)], 'asks': [[101 + i, 1] for i in range(10)]})
+
+    first = walls(books.apply(diff(2, START + 1000, bids=[[99.5, 50]])))
+    pulled = books.apply(diff(3, START + 2000, bids=[[99.5, 0]]))
+    again = walls(books.apply(diff(4, START + 60000, bids=[[99.5, 50]])))
+    books.apply(diff(5, START + 61000, bids=[[99.5, 0]]))
+    later = walls(books.apply(diff(6, START + 400000, bids=[[99.5, 50]])))
+
+    assert [e['type'] for e in pulled] == ['BID_WALL_PULLED']
+    assert len(first) == len(again) == len(later) == 1
+    assert first[0]['candle_ts'] == again[0]['candle_ts'] == START // 300000 * 300000
+    assert later[0]['candle_ts'] == first[0]['candle_ts'] + 300000
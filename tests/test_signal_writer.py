@@ -0,0 +1,42 @@
+"""
+نویسنده دستهای سیگنال: یک ردیف خراب فقط خودش را از دست میدهد و کلیدش آزاد میشود
+"""
+import sqlite3
+
+
+def _database(tmp_path, monkeypatch):
+    # ماژول database در import یک signals.db در مسیر جاری میسازد
+    monkeypatch.chdir(tmp_path)
+    from database import SignalDatabase
+    return SignalDatabase(str(tmp_path / 'writer.db'))
+
+
+def _signal(symbol, price):
+    return {
+        'symbol': symbol, 'type': 'UT_BOT', 'signal': 'BUY', 'price': price,
+        'exchange': 'replay', 'timeframe': '15m', 'candle_ts': 1700000000000
+    }
+
+
+def test_bad_row_does_not_lose_batch(tmp_path, monkeypatch):
+    db = _database(tmp_path, monkeypatch)
+    good = [db.save_signal(_signal(f'C{i}/USDT', 1.0 + i)) for i in range(3)]
+    bad_signal = _signal('BAD/USDT', {'not': 'bindable'})
+    bad = db.save_signal(bad_signal)
+    db.flush()
+
+    conn = sqlite3.connect(str(tmp_path / 'writer.db'))
+    symbols = {row[0] for row in conn.execute('SELECT symbol FROM signals')}
+    conn.close()
+    assert symbols == {key[1] for key in good}
+
+    stats = db.writer.stats()
+    assert stats['written'] == 3
+    assert stats['failed'] == 1
+    assert stats['conflicts'] == 0
+    # کلید ردیف خراب آزاد شده و دوباره قابل ذخیره است
+    assert bad not in db.seen['signals']
+    assert db.save_signal(dict(bad_signal, price=2.5)) == bad
+    db.flush()
+    assert db.writer.stats()['written'] == 4
+    db.writer.stop()
@@ -0,0 +1,57 @@
+"""
+IndicatorState: همان مقادیر calculate_all (کتابخانه ta) روی همان تاریخچه، هم با sync و هم با کندلهای استریم
+"""
+import numpy as np
+import pytest
+from candles import Candles
+from indicators import TechnicalIndicators
+from replay_exchange import ReplayExchange
+from streaming_indicators import IndicatorStateStore
+
+TIMEFRAME_MS = 15 * 60 * 1000
+COLUMNS = ['ma_7', 'ma_20', 'ma_50', 'ema_9', 'ema_21', 'rsi', 'rsi_7', 'macd', 'macd_signal',
+           'bb_upper', 'bb_lower', 'atr', 'atr_percent', 'stoch_k', 'stoch_d']
+
+def history(length, seed):
+    exchange = ReplayExchange({'options': {'symbols': 1, 'history': length, 'seed': seed}})
+    symbol = exchange._symbols()[0]
+    return Candles.from_ohlcv(exchange.fetch_ohlcv(symbol, '15m', limit=length), symbol)
+
+def expected(candles):
+    return TechnicalIndicators.calculate_all(candles).iloc[-1]
+
+def assert_matches(values, row):
+    for name in COLUMNS:
+        assert values[name] == pytest.approx(row[name], rel=1e-8, abs=1e-10, nan_ok=True), name
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_sync_matches_calculate_all(seed):
+    candles = history(250, seed)
+    store = IndicatorStateStore()
+    assert_matches(store.sync('k', candles), expected(candles))
+
+    summary = TechnicalIndicators.summarize(store.get('k'))
+    assert summary == TechnicalIndicators.get_indicator_summary(candles)
+
+def test_stream_candles_advance_state():
+    candles = history(260, 4)
+    store = IndicatorStateStore()
+    rows = np.column_stack([candles.timestamp, candles.open, candles.high, candles.low,
+                            candles.close, candles.volume]).tolist()
+    store.sync('k', Candles.from_ohlcv(rows[:220], candles.symbol))
+
+    for i in range(220, 260):
+        row = rows[i]
+        # کندل در حال تشکیل: اول با قیمت دیگر، سپس مقدار نهایی
+        store.apply('k', row[:4] + [row[1]] + row[5:], TIMEFRAME_MS)
+        store.apply('k', row, TIMEFRAME_MS)
+
+    assert_matches(store.get('k'), expected(candles))
+
+def test_gap_drops_state():
+    candles = history(100, 5)
+    store = IndicatorStateStore()
+    store.sync('k', candles)
+    last = int(candles.timestamp[-1])
+    store.apply('k', [last + 2 * TIMEFRAME_MS, 1, 1, 1, 1, 1], TIMEFRAME_MS)
+    assert store.get('k') == {}
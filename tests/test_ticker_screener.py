@@ -0,0 +1,49 @@
+"""
+شتاب حجم اسکرینر تیکر: حالت پایدار حدود 0% و پامپ با حجم 1.5 برابر تشخیص داده میشود
+"""
+import numpy as np
+from ticker_screener import TickerScreener
+
+INTERVAL = 5
+SYMBOLS = [f"SYN{i:03d}/USDT:USDT" for i in range(20)]
+
+def feed(screener, steps, rate, price, start=0, pumped=None, pump_from=None, pump_volume=1.0, pump_move=0.0):
+    """
+    snapshot های تیکر با حجم دلاری ثابت rate در ثانیه؛ quoteVolume 24 ساعته هم پنجره لغزان واقعی است
+    (حجم خارج شده از پنجره = حجم پایدار)
+    """
+    volume = rate * 86400
+    alerts = []
+    for step in range(start, start + steps):
+        if pumped is not None and step >= pump_from:
+            column = SYMBOLS.index(pumped)
+            price[column] *= 1 + pump_move
+            # حجم تازه pump_volume برابر، حجم خارج شده همان حجم پایدار
+            volume[column] += (pump_volume - 1) * rate[column] * INTERVAL
+        tickers = {s: {'last': p, 'quoteVolume': v} for s, p, v in zip(SYMBOLS, price, volume)}
+        alerts.extend(screener.update(step * INTERVAL, tickers))
+    return alerts
+
+def test_steady_volume_is_zero_acceleration():
+    rng = np.random.default_rng(1)
+    screener = TickerScreener()
+    rate = rng.uniform(100, 10000, len(SYMBOLS))
+    price = rng.uniform(1, 100, len(SYMBOLS))
+    assert feed(screener, 300, rate, price) == []
+
+    _, volume_change = screener.metrics()
+    assert np.allclose(volume_change, 0, atol=0.5)
+
+def test_pump_with_moderate_volume_is_detected():
+    rng = np.random.default_rng(2)
+    screener = TickerScreener()
+    rate = rng.uniform(100, 10000, len(SYMBOLS))
+    price = rng.uniform(1, 100, len(SYMBOLS))
+    feed(screener, 100, rate, price)
+
+    pumped = SYMBOLS[3]
+    alerts = feed(screener, 40, rate, price, start=100, pumped=pumped, pump_from=100,
+                  pump_volume=1.5, pump_move=0.004)
+    assert [a['symbol'] for a in alerts] == [pumped]
+    assert alerts[0]['type'] == 'PUMP'
+    assert 30 < alerts[0]['volume_change'] < 70
@@ -0,0 +1,206 @@
+"""
+اسکرینر پامپ/دامپ کل بازار از روی fetch_tickers
+هر چند ثانیه یک درخواست برای همه ارزها؛ قیمت آخر و حجم دلاری 24 ساعته در بافر حلقوی (زمان × ارز)
+بازده و شتاب حجم چند افق زمانی برای همه ارزها با عملیات برداری محاسبه میشود
+"""
+from datetime import datetime
+import threading
+import numpy as np
+
+# (افق به ثانیه، حداقل تغییر قیمت %)
+HORIZONS = ((60, 2.0), (300, 4.0), (900, 6.0))
+
+class TickerScreener:
+    """
+    بافر حلقوی snapshot های تیکر و تشخیص پامپ/دامپ
+    شتاب حجم: حجم معامله شده در افق نسبت به میانگین 24 ساعته همان مدت (%)
+    حجم معامله شده از مجموع تجمعی حجم تازه هر snapshot خوانده میشود: تغییر quoteVolume 24 ساعته
+    به علاوه حجمی که از پنجره 24 ساعته خارج شده (با فرض توزیع یکنواخت)؛ در حالت پایدار حدود 0%
+    """
+
+    def __init__(self, capacity=360, horizons=HORIZONS, min_volume_change=30, cooldown=300):
+        self.capacity = capacity
+        self.horizons = np.array([h for h, _ in horizons], dtype=np.float64)
+        self.thresholds = np.array([t for _, t in horizons], dtype=np.float64)
+        self.min_volume_change = min_volume_change
+        self.cooldown = cooldown
+
+        self.columns = {}   # symbol -> ستون
+        self.symbols = []
+        self.times = np.zeros(capacity)
+        self.price = np.full((capacity, 0), np.nan)
+        self.quote_volume = np.full((capacity, 0), np.nan)
+        self.flow = np.full((capacity, 0), np.nan)   # حجم معامله شده تجمعی
+        self.start = 0
+        self.count = 0
+
+        self.last_alert = {}   # (symbol, type) -> زمان آخرین هشدار
+        self.lock = threading.Lock()
+        self.snapshots = 0
+        self.alerts = 0
+
+    def _grow(self, symbols):
+        """اضافه کردن ستون برای ارزهای جدید (ظرفیت ستونها دو برابر میشود)"""
+        for symbol in symbols:
+            self.columns[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+
+        width = self.price.shape[1]
+        if len(self.symbols) > width:
+            extra = max(len(self.symbols), 2 * width) - width
+            pad = np.full((self.capacity, extra), np.nan)
+            self.price = np.hstack([self.price, pad])
+            self.quote_volume = np.hstack([self.quote_volume, pad])
+            self.flow = np.hstack([self.flow, pad])
+
+    def _ordered(self):
+        """اندیس snapshot ها از قدیم به جدید"""
+        return (self.start + np.arange(self.count)) % self.capacity
+
+    def update(self, timestamp, tickers, symbols=None):
+        """
+        افزودن یک snapshot (timestamp به ثانیه) و برگرداندن هشدارهای جدید
+        symbols: فقط همین ارزها (مثلا ارزهای فیوچرز بارگذاری شده)
+        """
+        if symbols is not None:
+            allowed = set(symbols)
+            tickers = {s: t for s, t in tickers.items() if s in allowed}
+
+        with self.lock:
+            new = [symbol for symbol in tickers if symbol not in self.columns]
+            if new:
+                self._grow(new)
+
+            previous = (self.start + self.count - 1) % self.capacity if self.count else None
+            if self.count < self.capacity:
+                pos = (self.start + self.count) % self.capacity
+                self.count += 1
+            else:
+                pos = self.start
+                self.start = (self.start + 1) % self.capacity
+
+            columns = np.fromiter((self.columns[s] for s in tickers), dtype=np.int64, count=len(tickers))
+            self.times[pos] = timestamp
+            self.price[pos] = np.nan
+            self.quote_volume[pos] = np.nan
+            self.price[pos, columns] = np.fromiter(
+                (t.get('last') or np.nan for t in tickers.values()), dtype=np.float64, count=len(tickers))
+            self.quote_volume[pos, columns] = np.fromiter(
+                (t.get('quoteVolume') or np.nan for t in tickers.values()), dtype=np.float64, count=len(tickers))
+            self._accumulate(pos, previous, timestamp)
+            self.snapshots += 1
+
+            return self._screen(timestamp)
+
+    def _accumulate(self, pos, previous, timestamp):
+        """حجم تازه بین دو snapshot = تغییر حجم 24 ساعته + حجم خارج شده از پنجره در همین مدت"""
+        if previous is None:
+            self.flow[pos] = 0.0
+            return
+        elapsed = timestamp - self.times[previous]
+        before = self.quote_volume[previous]
+        with np.errstate(invalid='ignore'):
+            traded = np.maximum(self.quote_volume[pos] - before + before * elapsed / 86400, 0)
+        self.flow[pos] = np.nan_to_num(self.flow[previous]) + np.nan_to_num(traded)
+
+    def metrics(self):
+        """
+        بازده (%) و شتاب حجم (%) هر افق برای همه ارزها: آرایههای (افق، ارز)
+        افقی که هنوز تاریخچه کافی ندارد NaN است
+        """
+        order = self._ordered()
+        times = self.times[order]
+        now = order[-1]
+        width = len(self.symbols)
+
+        returns = np.full((len(self.horizons), width), np.nan)
+        volume_change = np.full((len(self.horizons), width), np.nan)
+        # آخرین snapshot در زمان now - h یا قبل از آن
+        back = np.searchsorted(times, times[-1] - self.horizons, side='right') - 1
+        for k, b in enumerate(back):
+            if b < 0 or b == len(order) - 1:
+                continue
+            then = order[b]
+            elapsed = times[-1] - times[b]
+            price_then = self.price[then, :width]
+            returns[k] = (self.price[now, :width] - price_then) / price_then * 100
+
+            current = self.quote_volume[now, :width]
+            traded = self.flow[now, :width] - self.flow[then, :width]
+            expected = current * elapsed / 86400
+            volume_change[k] = (traded - expected) / expected * 100
+
+        return returns, volume_change
+
+    def _screen(self, timestamp):
+        if self.count < 2:
+            return []
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns, volume_change = self.metrics()
+            active = volume_change > self.min_volume_change
+            thresholds = self.thresholds[:, None]
+            pump = active & (returns >= thresholds)
+            dump = active & (returns <= -thresholds)
+
+        alerts = []
+        for direction, passed, move in (('PUMP', pump, returns), ('DUMP', dump, -returns)):
+            flagged = np.flatnonzero(passed.any(axis=0))
+            if not len(flagged):
+                continue
+            # قویترین افق هر ارز
+            best = np.argmax(np.where(passed[:, flagged], move[:, flagged], -np.inf), axis=0)
+            for column, k in zip(flagged, best):
+                symbol = self.symbols[column]
+                key = (symbol, direction)
+                if timestamp - self.last_alert.get(key, -np.inf) < self.cooldown:
+                    continue
+                self.last_alert[key] = timestamp
+                alerts.append(self._alert(symbol, direction, column, k, returns, volume_change, timestamp))
+
+        self.alerts += len(alerts)
+        return alerts
+
+    def _alert(self, symbol, direction, column, k, returns, volume_change, timestamp):
+        change, volume = returns[k, column], volume_change[k, column]
+        horizon = int(self.horizons[k])
+        if direction == 'PUMP':
+            reason = f'🚀 PUMP! +{change:.1f}% in {horizon}s | Vol +{volume:.0f}%'
+        else:
+            reason = f'📉 DUMP! {change:.1f}% in {horizon}s | Vol +{volume:.0f}%'
+
+        return {
+            'symbol': symbol,
+            'type': direction,
+            'alert_type': direction,
+            'signal': 'BUY' if direction == 'PUMP' else 'SELL',
+            'price': float(self.price[self._ordered()[-1], column]),
+            'price_change': round(float(change), 2),
+            'volume_change': round(float(volume), 2),
+            'strength': min(70 + int(abs(change) * 2), 95),
+            'reason': reason,
+            'horizon': horizon,
+            'timeframe': 'ticker',
+            # کلید طبیعی: هر بازه cooldown یک هشدار
+            'candle_ts': int(timestamp // self.cooldown * self.cooldown * 1000),
+            'timestamp': datetime.utcfromtimestamp(timestamp)
+        }
+
+    def reset(self):
+        with self.lock:
+            self.columns = {}
+            self.symbols = []
+            self.price = np.full((self.capacity, 0), np.nan)
+            self.quote_volume = np.full((self.capacity, 0), np.nan)
+            self.flow = np.full((self.capacity, 0), np.nan)
+            self.start = 0
+            self.count = 0
+            self.last_alert = {}
+
+    def stats(self):
+        with self.lock:
+            return {'symbols': len(self.symbols), 'snapshots': self.snapshots, 'buffered': self.count,
+                    'alerts': self.alerts, 'horizons': self.horizons.astype(int).tolist()}
+
+# نمونه گلوبال
+ticker_screener = TickerScreener()